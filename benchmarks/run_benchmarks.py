@@ -0,0 +1,275 @@
+#!/usr/bin/python
+
+'''
+Reproducible benchmarks of the parameter-search pipeline.
+
+Every benchmark of CONFIGS runs a pinned search of binfhe_params.select_parameters (one per bootstrapping technique)
+or a pinned sweep of the max log Q table of generate_std_tables.py, on empty estimator and noise caches in a
+temporary directory, without security grids, paramfit.json, journal or search index from earlier runs. It measures
+    - estimator_calls: calls of call_estimator, estimator_runs: the ones that ran the estimator (cache misses)
+    - sampler_requests: requests to the noise sampler (boolean_noise_estimate_script), noise_samples: their samples
+    - probes: noise comparisons of the searches for n
+    - wall_time_s: wall clock time of the benchmark
+    - result: the final parameter sets (or table entries)
+
+By default the lattice-estimator is replaced by the closed-form stub_estimator.py and the sampler by a simulation
+that draws the samples from the noise model (noise_model.py) with a fixed seed per benchmark, so a run needs neither
+Sage nor OpenFHE and gives the same counts and results on every machine. --estimator lattice and --sampler cpp use
+the real ones; their counts and results vary with the estimator version and the sampled noise.
+
+The measurements are compared with a baseline (default benchmarks/baseline.json): a count or the wall time above
+the baseline by more than the tolerance is a regression, a different result is a change; either makes the exit
+code 1. --update_baseline writes the measurements as the new baseline.
+
+usage:
+    > python3 benchmarks/run_benchmarks.py
+    > python3 benchmarks/run_benchmarks.py -b ginx_std128 lmkcdey_std128q --sampler cpp --build_dir build
+    > python3 benchmarks/run_benchmarks.py --update_baseline
+'''
+
+from math import log2
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import zlib
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCHMARK_DIR), "scripts", "paramsestimator"))
+
+import binfhe_params
+import binfhe_params_helper as helperfncs
+import generate_std_tables
+import key_size_model
+import noise_cache
+import noise_model
+import numpy
+import paramstable as stdparams
+import profiler
+import stub_estimator
+
+FORMAT_VERSION = 1
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, "baseline.json")
+COUNTS = ("estimator_calls", "estimator_runs", "sampler_requests", "noise_samples", "probes")
+# wall time increases below this many seconds are never a regression, stub runs take fractions of a second
+MIN_TIME_INCREASE = 0.5
+# true noise stddev of the simulated sampler relative to the uncalibrated noise model, and the spread of the
+# difference between parameter sets
+STUB_NOISE_SCALE = 1.3
+STUB_NOISE_SPREAD = 0.03
+
+CONFIGS = [
+    {"name": "ap_std128", "kind": "search", "seed": 1,
+     "args": {"bootstrapping_tech": 1, "secret_dist": 1, "exp_sec_level": "STD128", "exp_decryption_failure": -32, "num_of_inputs": 2, "lower": 2, "upper": 2}},
+    {"name": "ginx_std128", "kind": "search", "seed": 2,
+     "args": {"bootstrapping_tech": 2, "secret_dist": 1, "exp_sec_level": "STD128", "exp_decryption_failure": -32, "num_of_inputs": 2, "lower": 2, "upper": 3}},
+    {"name": "ginx_std192q_3in", "kind": "search", "seed": 3,
+     "args": {"bootstrapping_tech": 2, "secret_dist": 1, "exp_sec_level": "STD192Q", "exp_decryption_failure": -32, "num_of_inputs": 3, "lower": 3, "upper": 3}},
+    {"name": "lmkcdey_std128q", "kind": "search", "seed": 4,
+     "args": {"bootstrapping_tech": 3, "secret_dist": 0, "exp_sec_level": "STD128Q", "exp_decryption_failure": -32, "num_of_inputs": 2, "lower": 2, "upper": 3}},
+    {"name": "std_tables", "kind": "tables", "seed": 5,
+     "args": {"sec_levels": ["STD128", "STD128Q"], "secret_dists": ["error", "ternary"], "ring_dims": [512, 1024, 2048]}},
+]
+
+# counts the requests to the noise sampler (and their samples) of a benchmark; with stub = True the samples are
+# drawn from the noise model instead: the stddev of a parameter set is the model's times STUB_NOISE_SCALE, perturbed
+# by a factor that depends only on the parameter set, the samples come from the random generator of the benchmark
+class SamplerCounter:
+    def __init__(self, stub):
+        self.stub = stub
+        self.sample_noise = helperfncs.sample_noise
+        self.sample_noise_gates = helperfncs.sample_noise_gates
+        self.reset(0)
+
+    def reset(self, seed):
+        self.rng = numpy.random.default_rng(seed)
+        self.requests = 0
+        self.samples = 0
+
+    def install(self):
+        helperfncs.sample_noise = self.measure
+        helperfncs.sample_noise_gates = self.measure_gates
+
+    def get_stdev(self, request):
+        key = json.dumps({k: v for k, v in request.items() if k not in ("num_of_samples", "gates")}, sort_keys=True)
+        spread = numpy.random.default_rng(zlib.crc32(key.encode())).standard_normal()
+        return (noise_model.get_noise_variance(request)**0.5)*STUB_NOISE_SCALE*(1 + STUB_NOISE_SPREAD*spread)
+
+    def get_info(self, request):
+        info = {"BootstrapKeyGenTime": 0, "EvalBinGateTime": 0, "ctmodq": request["q"], "KeysReused": False, "KeysLoaded": False}
+        info.update(key_size_model.get_key_sizes(request))
+        return info
+
+    def measure(self, request, num_of_samples):
+        self.requests += 1
+        self.samples += num_of_samples
+        if not self.stub:
+            return self.sample_noise(request, num_of_samples)
+        samples = self.rng.normal(0, self.get_stdev(request), num_of_samples)
+        return noise_cache.NoiseMoments.from_samples(samples), self.get_info(request)
+
+    def measure_gates(self, request, gates, num_of_samples):
+        self.requests += 1
+        self.samples += num_of_samples*len(gates)
+        if not self.stub:
+            return self.sample_noise_gates(request, gates, num_of_samples)
+        return {gate: (noise_cache.NoiseMoments.from_samples(self.rng.normal(0, self.get_stdev(request), num_of_samples)),
+                       dict(self.get_info(request), Gate=gate)) for gate in gates}
+
+# fresh caches in cache_dir and the default configuration of the command line, without the security grids and the
+# paramfit.json of the default cache directory
+def configure_pipeline(cache_dir, build_dir):
+    helperfncs.configure_estimator(True)
+    helperfncs.configure_security_grid(enabled=False)
+    helperfncs.configure_estimator_cache(cache_dir)
+    helperfncs.configure_noise_cache(cache_dir)
+    helperfncs.configure_noise_test()
+    helperfncs.configure_noise_worker(build_dir=build_dir)
+    helperfncs.configure_noise_model()
+    helperfncs.configure_max_key_size(None)
+    helperfncs.configure_search_index(enabled=False)
+    helperfncs.configure_journal(None)
+    # get_mod starts from paramlinear instead of a fit
+    for exp_sec_level in stdparams.paramlinear:
+        for secret_dist in ("error", "ternary"):
+            helperfncs.PARAM_FITS[(exp_sec_level, secret_dist)] = None
+    profiler.configure_profiler()
+
+def run_search(args):
+    results = binfhe_params.select_parameters(**args)
+    return [dict(vars(r.param_set), d_g=r.d_g) for r in results]
+
+def run_tables(args):
+    tables = {}
+    for sl in args["sec_levels"]:
+        for sd in args["secret_dists"]:
+            for N in args["ring_dims"]:
+                dim, mod = generate_std_tables.generate_dim_mod(sl, N, sd, 1, True, sl[-1] == "Q")
+                tables["_".join((sl, sd, str(N)))] = int(log2(mod)) if ((dim != 0) and (mod != 0)) else None
+    return tables
+
+def run_benchmark(config, sampler, build_dir, verbose):
+    cache_dir = tempfile.mkdtemp(prefix="benchmark_")
+    try:
+        configure_pipeline(cache_dir, build_dir)
+        sampler.reset(config["seed"])
+        probes = helperfncs.get_probe_count()
+        start = time.perf_counter()
+        if (config["kind"] == "search"):
+            result = run_search(dict(config["args"], verbose=verbose))
+        else:
+            result = run_tables(config["args"])
+        wall_time = time.perf_counter() - start
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    prof = profiler.get_profiler()
+    return {"config": config, "wall_time_s": round(wall_time, 3),
+            "estimator_calls": len(prof.durations.get("call_estimator", [])),
+            "estimator_runs": prof.counters.get("estimator cache misses", 0),
+            "sampler_requests": sampler.requests, "noise_samples": sampler.samples,
+            "probes": helperfncs.get_probe_count() - probes, "result": result}
+
+# (status, change) of a measurement against its baseline value: a regression if it is above the baseline by more
+# than tolerance (and by more than min_increase), an improvement if it is below by more than tolerance
+def compare_value(value, base, tolerance, min_increase = 0):
+    if (base == 0):
+        return ("regression" if (value > min_increase) else "ok"), None
+    change = value/base - 1
+    if ((change > tolerance) and (value - base > min_increase)):
+        return "regression", change
+    if (change < -tolerance):
+        return "improved", change
+    return "ok", change
+
+# compares the measurements of a run with a baseline, prints a table and returns the number of regressions and changes
+def compare(measurements, baseline, tolerance, time_tolerance):
+    failures = 0
+    print("{:<20}{:<18}{:>12}{:>12}{:>10}  {}".format("benchmark", "metric", "baseline", "current", "change", "status"))
+    for name, current in measurements.items():
+        base = baseline["benchmarks"].get(name)
+        if base is None:
+            print("{:<20}{:<18}{:>12}{:>12}{:>10}  {}".format(name, "-", "-", "-", "-", "new, not in the baseline"))
+            continue
+        if (base["config"] != current["config"]):
+            print("{:<20}{:<18}{:>12}{:>12}{:>10}  {}".format(name, "config", "-", "-", "-", "CHANGED, update the baseline"))
+            failures += 1
+            continue
+        for metric in COUNTS + ("wall_time_s",):
+            if (metric == "wall_time_s"):
+                status, change = compare_value(current[metric], base[metric], time_tolerance, MIN_TIME_INCREASE)
+            else:
+                status, change = compare_value(current[metric], base[metric], tolerance)
+            failures += (status == "regression")
+            print("{:<20}{:<18}{:>12}{:>12}{:>10}  {}".format(name, metric, base[metric], current[metric],
+                  "-" if change is None else "{:+.1%}".format(change), status.upper() if (status == "regression") else status))
+        changed = (base["result"] != current["result"])
+        failures += changed
+        print("{:<20}{:<18}{:>12}{:>12}{:>10}  {}".format(name, "result", "-", "-", "-", "CHANGED" if changed else "same"))
+        if changed:
+            print("    baseline: " + json.dumps(base["result"], sort_keys=True))
+            print("    current:  " + json.dumps(current["result"], sort_keys=True))
+    return failures
+
+def write_json(path, data):
+    with open(path + ".tmp", "w") as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+        f.write("\n")
+    os.replace(path + ".tmp", path)
+
+if __name__ == '__main__':
+    names = [config["name"] for config in CONFIGS]
+    parser = argparse.ArgumentParser(prog='run_benchmarks', description='Benchmarks of the parameter-search pipeline')
+    parser.add_argument('-b', '--benchmarks', action='store', nargs='+', choices=names, default=names)
+    parser.add_argument('--estimator', action='store', choices=('stub', 'lattice'), default='stub', help='closed-form stub or the lattice-estimator')
+    parser.add_argument('--sampler', action='store', choices=('stub', 'cpp'), default='stub', help='noise simulated from the noise model or measured by boolean_noise_estimate_script')
+    parser.add_argument('--build_dir', action='store', default=None, help='build directory with bin/boolean_noise_estimate_script for --sampler cpp')
+    parser.add_argument('--baseline', action='store', default=DEFAULT_BASELINE)
+    parser.add_argument('--update_baseline', action='store_true', help='write the measurements to the baseline instead of comparing')
+    parser.add_argument('-o', '--output', action='store', default=None, help='also write the measurements to this file')
+    parser.add_argument('--tolerance', action='store', default=0.1, type=float, help='relative increase of a count that is a regression')
+    parser.add_argument('--time_tolerance', action='store', default=1.0, type=float, help='relative increase of the wall time that is a regression')
+    parser.add_argument('-v', '--verbose', action='store_true', help='print the output of the searches')
+    a = parser.parse_args()
+
+    if (a.estimator == 'stub'):
+        helperfncs.ESTIMATOR = stub_estimator
+        helperfncs.ESTIMATOR_VERSION = stub_estimator.VERSION
+    sampler = SamplerCounter(a.sampler == 'stub')
+    sampler.install()
+    mode = {"estimator": a.estimator, "sampler": a.sampler}
+
+    measurements = {}
+    for config in CONFIGS:
+        if config["name"] in a.benchmarks:
+            measurements[config["name"]] = run_benchmark(config, sampler, a.build_dir, a.verbose)
+            m = measurements[config["name"]]
+            print(config["name"] + ": " + ", ".join(metric + " " + str(m[metric]) for metric in COUNTS + ("wall_time_s",)), file=sys.stderr)
+
+    run = {"format": FORMAT_VERSION, "mode": mode, "benchmarks": measurements}
+    if a.output is not None:
+        write_json(a.output, run)
+    if a.update_baseline:
+        if os.path.isfile(a.baseline):
+            with open(a.baseline) as f:
+                baseline = json.load(f)
+            # benchmarks that were not run keep their baseline
+            if ((baseline.get("format") == FORMAT_VERSION) and (baseline["mode"] == mode)):
+                run["benchmarks"] = dict(baseline["benchmarks"], **measurements)
+        write_json(a.baseline, run)
+        print("wrote " + a.baseline, file=sys.stderr)
+        sys.exit(0)
+
+    if not os.path.isfile(a.baseline):
+        sys.exit("no baseline " + a.baseline + ", create it with --update_baseline")
+    with open(a.baseline) as f:
+        baseline = json.load(f)
+    if ((baseline.get("format") != FORMAT_VERSION) or (baseline["mode"] != mode)):
+        sys.exit("the baseline " + a.baseline + " was recorded with " + json.dumps(baseline.get("mode")) + ", not " + json.dumps(mode))
+    failures = compare(measurements, baseline, a.tolerance, a.time_tolerance)
+    print(str(failures) + " regressions or changes" if failures else "no regressions")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,58 @@
+#!/usr/bin/python
+
+'''
+Offline stand-in for the lattice-estimator module, for hermetic benchmark runs without Sage.
+
+It has the parts of the estimator interface that binfhe_params_helper uses (LWE.Parameters, LWE.primal_usvp,
+LWE.dual, LWE.primal_bdd, LWE.estimate, ND and RC) and answers in closed form: the security in bits of an LWE
+instance is a line in n/log2(q) per cost model, fitted to the boundaries of paramlinear in paramstable.py (log2(q)
+of the boundary at n = 1000 for 128 and 256 bits), so that the searches find the moduli that the real estimator finds
+to within a few bits. The attacks differ by a constant number of bits, usvp being the cheapest. Moduli below
+MIN_LOG_MODULUS bits fail like the estimator does for a modulus that is too small.
+
+Install it with binfhe_params_helper.ESTIMATOR = stub_estimator (and ESTIMATOR_VERSION = stub_estimator.VERSION so
+that stub results do not mix with real ones in an estimator cache).
+'''
+
+from math import log2
+from types import SimpleNamespace
+
+VERSION = "stub-1"
+MIN_LOG_MODULUS = 4
+# security in bits = slope*n/log2(q) + offset per reduction cost model
+COST_MODELS = {"BDGL16": (3.507, -6.7), "LaaMosPol14": (3.759, -26.3)}
+# bits added to the cost of usvp for the other attacks
+ATTACK_OFFSETS = {"usvp": 0, "bdd": 1, "dual": 3}
+# rop is a float, costs are capped to stay finite
+MAX_BITS = 1000
+
+class Parameters:
+    def __init__(self, n, q, Xs = None, Xe = None):
+        self.n = n
+        self.q = q
+        self.Xs = Xs
+        self.Xe = Xe
+
+def get_cost(attack, params, red_cost_model):
+    if (log2(params.q) < MIN_LOG_MODULUS):
+        raise ValueError("modulus too small for n = " + str(params.n) + ", q = " + str(params.q))
+    slope, offset = COST_MODELS[red_cost_model]
+    bits = slope*params.n/log2(params.q) + offset + ATTACK_OFFSETS[attack]
+    return {"rop": 2.0**min(max(bits, 1), MAX_BITS)}
+
+def primal_usvp(params, red_cost_model = "BDGL16", **kwargs):
+    return get_cost("usvp", params, red_cost_model)
+
+def dual(params, red_cost_model = "BDGL16", **kwargs):
+    return get_cost("dual", params, red_cost_model)
+
+def primal_bdd(params, red_cost_model = "BDGL16", **kwargs):
+    return get_cost("bdd", params, red_cost_model)
+
+def estimate(params, red_cost_model = "BDGL16", deny_list = (), jobs = 1, **kwargs):
+    return {attack: get_cost(attack, params, red_cost_model) for attack in ATTACK_OFFSETS if attack not in deny_list}
+
+LWE = SimpleNamespace(Parameters=Parameters, primal_usvp=primal_usvp, dual=dual, primal_bdd=primal_bdd, estimate=estimate)
+ND = SimpleNamespace(DiscreteGaussian=lambda stddev, *args: ("DiscreteGaussian", stddev),
+                     Uniform=lambda a, b, n = None: ("Uniform", a, b))
+RC = SimpleNamespace(BDGL16="BDGL16", LaaMosPol14="LaaMosPol14")
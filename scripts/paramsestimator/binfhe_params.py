@@ -9,6 +9,11 @@ usage (2): With any of {t, d, p, f, I, i, k, n} arguments to bypass the prompts.
 
 usage (3): with the --all flag to iterate through all valid combinations of {p, I, d} arguments for a given t argument.
     > python3 scripts/paramsestimator/binfhe_params.py --all -t 3 -f -30 -i 800 -n 16
+
+usage (4): as a library, select_parameters returns the final parameter sets as ParamResult objects.
+    >>> import binfhe_params
+    >>> results = binfhe_params.select_parameters(bootstrapping_tech=2, exp_sec_level='STD128', exp_decryption_failure=-32)
+    >>> [(r.d_g, r.param_set.n, r.perf['EvalBinGateTime']) for r in results]
 '''
 
 from itertools import product
@@ -16,16 +21,81 @@ from math import log2, floor, sqrt, ceil
 
 import argparse
 import binfhe_params_helper as helperfncs
+import contextlib
+import io
+import job_scheduler
+import noise_worker
 import paramstable as stdparams
+import profiler
+import search_index
 import os
 import sys
 
 FORCE_q_eq_2N = False
 FORCE_openfhe32 = False
+# first gallop step of a search warm-started from a different configuration (see warm_search_n)
+WARM_START_STEP = 8
+
+# final parameter set of a d_g iteration; perf holds the performance numbers of its 1000-sample measurement (times in
+# milliseconds, sizes in bytes)
+class ParamResult:
+    def __init__(self, param_set, exp_sec_level, exp_decryption_failure, num_of_inputs, d_g, d_ks, noise, decryption_failure, perf):
+        self.param_set = param_set
+        self.exp_sec_level = exp_sec_level
+        self.exp_decryption_failure = exp_decryption_failure
+        self.num_of_inputs = num_of_inputs
+        self.d_g = d_g
+        self.d_ks = d_ks
+        self.noise = noise
+        self.decryption_failure = decryption_failure
+        self.perf = perf
+
+    # arguments of boolean_noise_estimate_script for this parameter set
+    def command_args(self):
+        p = self.param_set
+        return ' '.join([ "-n " + str(p.n),
+                          "-N " + str(p.N),
+                          "-q " + str(p.q),
+                          "-Q " + str(int(p.logQ)),
+                          "-k " + str(int(p.Qks)),
+                          "-g " + str(p.B_g),
+                          "-r " + str(p.B_rk),
+                          "-b " + str(p.B_ks),
+                          "-s " + str(p.sigma),
+                          "-t " + str(p.bootstrapping_tech),
+                          "-d " + str(p.secret_dist),
+                          "-I " + str(self.num_of_inputs),
+                          "-i 1000",
+                        ])
+
+    # entry for the table of named parameter sets in OpenFHE
+    def table_entry(self):
+        p = self.param_set
+        return '{ ' + ', '.join(( str(int(p.logQ)), str(2*p.N), str(p.n), str(p.q), str(int(p.Qks)), str(p.B_ks),
+            str(p.B_g), str(p.B_rk), str(10), ('GAUSSIAN', 'UNIFORM_TERNARY')[p.secret_dist], str(p.sigma))) + ' }'
+
+def parameter_selector(bootstrapping_tech, secret_dist, exp_sec_level, exp_decryption_failure, num_of_inputs, num_of_samples, d_ks, lower, upper, num_threads, jobs = 1):
+    job_scheduler.run_jobs(parameter_selector_jobs(bootstrapping_tech, secret_dist, exp_sec_level, exp_decryption_failure, num_of_inputs, num_of_samples, d_ks, lower, upper, num_threads), jobs, journal=helperfncs.get_journal())
+
+# library entry point: the ParamResult of every d_g iteration in [lower, upper] that finds a parameter set, in the
+# order of d_g; the output of the searches is discarded unless verbose. Caches, noise model, key size limit and sampler
+# are configured with the configure_* functions of binfhe_params_helper beforehand (the defaults are those of the
+# command line). The journal is not used, a replayed search has no result. A search that fails raises its exception
+# (with jobs > 1 once the other searches are done).
+def select_parameters(bootstrapping_tech = 2, secret_dist = 1, exp_sec_level = "STD128", exp_decryption_failure = -40, num_of_inputs = 2, num_of_samples = 200, d_ks = 3, lower = 2, upper = 4, num_threads = 1, jobs = 1, verbose = False):
+    selector_jobs = parameter_selector_jobs(bootstrapping_tech, secret_dist, exp_sec_level, exp_decryption_failure, num_of_inputs, num_of_samples, d_ks, lower, upper, num_threads)[1:]
+    with contextlib.redirect_stdout(sys.stdout if verbose else io.StringIO()):
+        results = job_scheduler.run_jobs(selector_jobs, jobs, raise_errors=True)
+    return [result for result in results if result is not None]
+
+# the d_g iterations are independent searches, each one is a job for the job scheduler
+def parameter_selector_jobs(bootstrapping_tech, secret_dist, exp_sec_level, exp_decryption_failure, num_of_inputs, num_of_samples, d_ks, lower, upper, num_threads):
+    selector_jobs = [(print_input_parameters, (bootstrapping_tech, secret_dist, exp_sec_level, exp_decryption_failure, num_of_inputs, num_of_samples, d_ks, lower, upper, num_threads))]
+    for d_g in range(lower, upper + 1):
+        selector_jobs.append((search_d_g, (bootstrapping_tech, secret_dist, exp_sec_level, exp_decryption_failure, num_of_inputs, num_of_samples, d_ks, d_g, num_threads)))
+    return selector_jobs
 
-def parameter_selector(bootstrapping_tech, secret_dist, exp_sec_level, exp_decryption_failure, num_of_inputs, num_of_samples, d_ks, lower, upper, num_threads):
-    # processing parameters based on the inputs
-    is_quantum = (exp_sec_level[-1] == "Q")
+def print_input_parameters(bootstrapping_tech, secret_dist, exp_sec_level, exp_decryption_failure, num_of_inputs, num_of_samples, d_ks, lower, upper, num_threads):
     secret_dist_des = ("error", "ternary")[secret_dist]
 
     print("input parameters")
@@ -53,143 +123,187 @@ def parameter_selector(bootstrapping_tech, secret_dist, exp_sec_level, exp_decry
                            ])
     print("command args: ", command_arg)
 
+# returns the ParamResult of the d_g iteration, None if it finds no parameter set
+def search_d_g(bootstrapping_tech, secret_dist, exp_sec_level, exp_decryption_failure, num_of_inputs, num_of_samples, d_ks, d_g, num_threads):
+    # processing parameters based on the inputs
+    secret_dist_des = ("error", "ternary")[secret_dist]
+
     ########################################################
     # set ptmod based on num of inputs
     ptmod = 2*num_of_inputs
 
     sigma = 3.19
-    d_ks_input = d_ks
 
-    for d_g in range(lower, upper + 1):
-        # Set ringsize n, Qks, N, Q based on the security level
-        print("\nd_g loop: ", d_g)
-        ringsize_N = 2048 if exp_sec_level in ('STD256Q',) else 1024
-        opt_n = 0
-        while (ringsize_N <= (1024 if FORCE_openfhe32 else 2048)):
-            modulus_q = 2*ringsize_N if FORCE_q_eq_2N else ringsize_N
-            loopq2N = False
-            while (modulus_q <= 2*ringsize_N):
-                print("(q, N): (" + str(modulus_q) + ", " + str(ringsize_N) + ")")
-
-                d_ks = d_ks_input
-                B_rk = 32 if (modulus_q == 1024) else 64
-
-                # for stdnum security, could set to ringsize_N/2
-                # start with this value and binary search on n to find optimal parameter set
-                lattice_n = 100
-
-                # find analytical estimate for starting point of Qks
-                logmodQksu = helperfncs.get_mod(lattice_n, exp_sec_level)
-                logmodQu = helperfncs.get_mod(ringsize_N, exp_sec_level)
-
-                # check security by running the estimator and adjust modulus if needed
-                dimn, modulus_Qks = helperfncs.optimize_params_security(stdparams.paramlinear[exp_sec_level][0], lattice_n, 2**logmodQksu, secret_dist_des, num_threads, False, True, False, is_quantum)
-                dimN, modulus_Q = helperfncs.optimize_params_security(stdparams.paramlinear[exp_sec_level][0], ringsize_N, 2**logmodQu, secret_dist_des, num_threads, False, True, False, is_quantum)
-
-                while ((dimn == 0) or (modulus_Qks == 0)):
-                    print("lattice dimension " + str(lattice_n) + " too small to run estimator for this security level, increasing value")
-                    lattice_n = lattice_n + 25
-                    logmodQksu = helperfncs.get_mod(lattice_n, exp_sec_level)
-                    dimn, modulus_Qks = helperfncs.optimize_params_security(stdparams.paramlinear[exp_sec_level][0], lattice_n, 2**logmodQksu, secret_dist_des, num_threads, False, True, False, is_quantum)
-
-                if ((dimn > dimN) or (dimn == 0) or (modulus_Qks == 0)):
-                    print("lattice dimension is 0 or greater than large N")
-                    break
-
-                logmodQks = log2(modulus_Qks)
-                logmodQ = log2(modulus_Q)
-
-                # set logQ upperbound to 28 for lattice dimension 1024
-                if ((dimN <= 1024) and (logmodQ > 28)):
-                    logmodQ = 28
-
-                # this is added since Qks is declared as usint in openfhe
-                if (logmodQks >= 32):
-                    logmodQks = 30
-                while(logmodQks > logmodQ):
-                    logmodQks -= 1
-
-                modulus_Qks = 2**logmodQks
-                B_g = 2**ceil(logmodQ/d_g)
-                B_ks = 2**ceil(logmodQks/d_ks)
-
-                while (B_ks >= 128):
-                    d_ks += 1
-                    B_ks = 2**ceil(logmodQks/d_ks)
-
-                # create paramset object
-                param_set_opt = stdparams.paramsetvars(lattice_n, modulus_q, ringsize_N, logmodQ, modulus_Qks, B_g, B_ks, B_rk, sigma, secret_dist, bootstrapping_tech)
-
-                # optimize n, Qks to reduce the noise
-                # compute target noise level for the expected decryption failure rate
-                target_noise_level = helperfncs.get_target_noise(exp_decryption_failure, ptmod, modulus_q, num_of_inputs)
-                print("target noise for this iteration: ", target_noise_level)
-
-                opt_n, optlogmodQks, optB_ks = binary_search_n(lattice_n, ringsize_N, target_noise_level + 1, exp_sec_level, target_noise_level, num_of_samples, d_ks, param_set_opt, secret_dist_des, is_quantum, num_threads, num_of_inputs)
-
-                if ((opt_n != 0) and (optlogmodQks != 0) and (optB_ks != 0)):
-                    break
-                if (((opt_n == 0) or (optlogmodQks == 0) or (optB_ks == 0)) and loopq2N):
-                    break
-
-                modulus_q = 2*modulus_q
-                print("increasing q to " + str(modulus_q))
-                loopq2N = True
+    # Set ringsize n, Qks, N, Q based on the security level
+    print("\nd_g loop: ", d_g)
+    model = helperfncs.get_noise_model()
+    if model is not None:
+        model.reset_stats()
+    ringsize_N = 2048 if exp_sec_level in ('STD256Q',) else 1024
+    opt_n = 0
+    while (ringsize_N <= (1024 if FORCE_openfhe32 else 2048)):
+        modulus_q = 2*ringsize_N if FORCE_q_eq_2N else ringsize_N
+        loopq2N = False
+        while (modulus_q <= 2*ringsize_N):
+            print("(q, N): (" + str(modulus_q) + ", " + str(ringsize_N) + ")")
+
+            B_rk = 32 if (modulus_q == 1024) else 64
+            result = search_n(bootstrapping_tech, secret_dist, exp_sec_level, exp_decryption_failure, num_of_inputs, num_of_samples, d_ks, d_g, B_rk, ringsize_N, modulus_q, num_threads)
+            if result is None:
+                break
+            opt_n, optlogmodQks, optB_ks, logmodQ = result
 
             if ((opt_n != 0) and (optlogmodQks != 0) and (optB_ks != 0)):
                 break
+            if (((opt_n == 0) or (optlogmodQks == 0) or (optB_ks == 0)) and loopq2N):
+                break
 
-            ringsize_N *= 2
-            print("increasing N to " + str(ringsize_N))
+            modulus_q = 2*modulus_q
+            print("increasing q to " + str(modulus_q))
+            loopq2N = True
 
-        if ((opt_n == 0) or (optlogmodQks == 0) or (optB_ks == 0)):
-            print("cannot find parameters for d_g: ", d_g)
-        else:
-            optQks = 2**optlogmodQks
-            optd_ks = ceil(optlogmodQks/log2(optB_ks))
-            B_g = 2**ceil(logmodQ/d_g)
-
-            param_set_final = stdparams.paramsetvars(opt_n, modulus_q, ringsize_N, logmodQ, optQks, B_g, optB_ks, B_rk, sigma, secret_dist, bootstrapping_tech)
-            finalnoise, perf = helperfncs.get_noise_from_cpp_code(param_set_final, 1000, num_of_inputs, True)
-            final_dec_fail_rate = helperfncs.get_decryption_failure(finalnoise, ptmod, modulus_q, num_of_inputs)
-
-            print("final parameters")
-            print("dist_type: ",secret_dist_des)
-            print("bootstrapping_tech: ",bootstrapping_tech)
-            print("sec_level: ", exp_sec_level)
-            print("expected decryption failure rate: ", exp_decryption_failure)
-            print("actual decryption failure rate: ", final_dec_fail_rate)
-            print("num_of_inputs: ", num_of_inputs)
-            print("num_of_samples: ", num_of_samples)
-            print("lattice dimension n: ", opt_n)
-            print("ringsize N: ", ringsize_N)
-            print("lattice modulus n: ", modulus_q)
-            print("size of ring modulus Q: ", logmodQ)
-            print("optimal key switching modulus  Qks: ", optQks)
-            print("gadget digit base B_g: ", B_g)
-            print("key switching digit base B_ks: ", optB_ks)
-            print("key switching digit size B_ks: ", optd_ks)
-            for k, v in perf.items():
-                print(': '.join((k, v.split()[0])))
-
-            command_arg = ' '.join([ "-n " + str(opt_n),
-                                     "-N " + str(ringsize_N),
-                                     "-q " + str(modulus_q),
-                                     "-Q " + str(int(logmodQ)),
-                                     "-k " + str(int(optQks)),
-                                     "-g " + str(B_g),
-                                     "-r " + str(B_rk),
-                                     "-b " + str(optB_ks),
-                                     "-s " + str(sigma),
-                                     "-t " + str(bootstrapping_tech),
-                                     "-d " + str(secret_dist),
-                                     "-I " + str(num_of_inputs),
-                                     "-i 1000",
-                                   ])
-            print("command args: ", command_arg)
-
-            print("table entry: ", '{ ' + ', '.join(( str(int(logmodQ)), str(2*ringsize_N), str(opt_n), str(modulus_q), str(int(optQks)), str(optB_ks),
-                str(B_g), str(B_rk), str(10), ('GAUSSIAN', 'UNIFORM_TERNARY')[secret_dist], str(sigma))) + ' }')
+        if ((opt_n != 0) and (optlogmodQks != 0) and (optB_ks != 0)):
+            break
+
+        ringsize_N *= 2
+        print("increasing N to " + str(ringsize_N))
+
+    result = None
+    if ((opt_n == 0) or (optlogmodQks == 0) or (optB_ks == 0)):
+        print("cannot find parameters for d_g: ", d_g)
+    else:
+        optQks = 2**optlogmodQks
+        optd_ks = ceil(optlogmodQks/log2(optB_ks))
+        B_g = 2**ceil(logmodQ/d_g)
+
+        param_set_final = stdparams.paramsetvars(opt_n, modulus_q, ringsize_N, logmodQ, optQks, B_g, optB_ks, B_rk, sigma, secret_dist, bootstrapping_tech)
+        finalnoise, perf = helperfncs.get_noise_from_cpp_code(param_set_final, 1000, num_of_inputs, True)
+        final_dec_fail_rate = helperfncs.get_decryption_failure(finalnoise, ptmod, modulus_q, num_of_inputs)
+        result = ParamResult(param_set_final, exp_sec_level, exp_decryption_failure, num_of_inputs, d_g, optd_ks, finalnoise, final_dec_fail_rate,
+                             {k: float(v.split()[0]) for k, v in perf.items()})
+
+        print("final parameters")
+        print("dist_type: ",secret_dist_des)
+        print("bootstrapping_tech: ",bootstrapping_tech)
+        print("sec_level: ", exp_sec_level)
+        print("expected decryption failure rate: ", exp_decryption_failure)
+        print("actual decryption failure rate: ", final_dec_fail_rate)
+        print("num_of_inputs: ", num_of_inputs)
+        print("num_of_samples: ", num_of_samples)
+        print("lattice dimension n: ", opt_n)
+        print("ringsize N: ", ringsize_N)
+        print("lattice modulus n: ", modulus_q)
+        print("size of ring modulus Q: ", logmodQ)
+        print("optimal key switching modulus  Qks: ", optQks)
+        print("gadget digit base B_g: ", B_g)
+        print("key switching digit base B_ks: ", optB_ks)
+        print("key switching digit size B_ks: ", optd_ks)
+        for k, v in perf.items():
+            print(': '.join((k, v.split()[0])))
+
+        print("command args: ", result.command_args())
+
+        print("table entry: ", result.table_entry())
+
+    if model is not None:
+        print(model.stats())
+    return result
+
+# searches the smallest lattice dimension n whose noise is below the target for fixed N, q, d_g, d_ks and B_rk (one
+# (q, N) iteration of search_d_g); returns (n, log2 Qks, B_ks, log2 Q) with n = 0 if no n up to N reaches the target,
+# None if the smallest secure lattice dimension is 0 or greater than N
+def search_n(bootstrapping_tech, secret_dist, exp_sec_level, exp_decryption_failure, num_of_inputs, num_of_samples, d_ks, d_g, B_rk, ringsize_N, modulus_q, num_threads):
+    is_quantum = (exp_sec_level[-1] == "Q")
+    secret_dist_des = ("error", "ternary")[secret_dist]
+    ptmod = 2*num_of_inputs
+    sigma = 3.19
+
+    # for stdnum security, could set to ringsize_N/2
+    # start with this value and binary search on n to find optimal parameter set
+    lattice_n = 100
+
+    # find analytical estimate for starting point of Qks
+    logmodQksu = helperfncs.get_mod(lattice_n, exp_sec_level, secret_dist_des)
+    logmodQu = helperfncs.get_mod(ringsize_N, exp_sec_level, secret_dist_des)
+
+    # check security by running the estimator and adjust modulus if needed
+    dimn, modulus_Qks = helperfncs.optimize_params_security(stdparams.paramlinear[exp_sec_level][0], lattice_n, 2**logmodQksu, secret_dist_des, num_threads, False, True, False, is_quantum)
+    dimN, modulus_Q = helperfncs.optimize_params_security(stdparams.paramlinear[exp_sec_level][0], ringsize_N, 2**logmodQu, secret_dist_des, num_threads, False, True, False, is_quantum)
+
+    while ((dimn == 0) or (modulus_Qks == 0)):
+        print("lattice dimension " + str(lattice_n) + " too small to run estimator for this security level, increasing value")
+        lattice_n = lattice_n + 25
+        logmodQksu = helperfncs.get_mod(lattice_n, exp_sec_level, secret_dist_des)
+        dimn, modulus_Qks = helperfncs.optimize_params_security(stdparams.paramlinear[exp_sec_level][0], lattice_n, 2**logmodQksu, secret_dist_des, num_threads, False, True, False, is_quantum)
+
+    if ((dimn > dimN) or (dimn == 0) or (modulus_Qks == 0)):
+        print("lattice dimension is 0 or greater than large N")
+        return None
+
+    logmodQks = log2(modulus_Qks)
+    logmodQ = log2(modulus_Q)
+
+    # set logQ upperbound to 28 for lattice dimension 1024
+    if ((dimN <= 1024) and (logmodQ > 28)):
+        logmodQ = 28
+
+    # this is added since Qks is declared as usint in openfhe
+    if (logmodQks >= 32):
+        logmodQks = 30
+    while(logmodQks > logmodQ):
+        logmodQks -= 1
+
+    modulus_Qks = 2**logmodQks
+    B_g = 2**ceil(logmodQ/d_g)
+    B_ks = 2**ceil(logmodQks/d_ks)
+
+    while (B_ks >= 128):
+        d_ks += 1
+        B_ks = 2**ceil(logmodQks/d_ks)
+
+    # create paramset object
+    param_set_opt = stdparams.paramsetvars(lattice_n, modulus_q, ringsize_N, logmodQ, modulus_Qks, B_g, B_ks, B_rk, sigma, secret_dist, bootstrapping_tech)
+
+    # optimize n, Qks to reduce the noise
+    # compute target noise level for the expected decryption failure rate
+    target_noise_level = helperfncs.get_target_noise(exp_decryption_failure, ptmod, modulus_q, num_of_inputs)
+    print("target noise for this iteration: ", target_noise_level)
+
+    # start from the n of the nearest solved configuration if there is one
+    index = helperfncs.get_search_index()
+    search = search_index.make_search(bootstrapping_tech, secret_dist, exp_sec_level, ringsize_N, modulus_q, logmodQ, d_g, d_ks, B_rk, num_of_inputs, exp_decryption_failure)
+    seed = index.nearest(search) if index is not None else None
+    probes = helperfncs.get_probe_count()
+    if seed is None:
+        opt_n, optlogmodQks, optB_ks = binary_search_n(lattice_n, ringsize_N, target_noise_level + 1, exp_sec_level, target_noise_level, num_of_samples, d_ks, param_set_opt, secret_dist_des, is_quantum, num_threads, num_of_inputs)
+    else:
+        seed_n, distance, neighbor = seed
+        # shift the seed by the difference of the n at which the noise model reaches the targets of both configurations;
+        # no shift if the model reaches one of them only past N, the noise is not monotone in n there (Qks grows with n)
+        shift = 0
+        if (distance > 0):
+            model_n = get_model_n(search, lattice_n)
+            neighbor_model_n = get_model_n(neighbor, lattice_n) if (model_n is not None) else None
+            if (neighbor_model_n is not None) and (max(model_n, neighbor_model_n) <= ringsize_N):
+                shift = model_n - neighbor_model_n
+        print("warm start from n = " + str(seed_n) + (" + " + str(shift) if shift else "") + " of a configuration at distance " + str(distance))
+        seed_n += shift
+        step = 1 if (distance == 0) else WARM_START_STEP
+        opt_n, optlogmodQks, optB_ks = warm_search_n(seed_n, step, lattice_n, ringsize_N, exp_sec_level, target_noise_level, num_of_samples, d_ks, param_set_opt, secret_dist_des, is_quantum, num_threads, num_of_inputs)
+    if index is not None:
+        index.count(seed is not None, helperfncs.get_probe_count() - probes)
+        if (opt_n != 0):
+            index.record(search, opt_n)
+
+    if (opt_n != 0):
+        param_set_opt.n = opt_n
+        param_set_opt.Qks = 2**optlogmodQks
+        param_set_opt.B_ks = optB_ks
+        if helperfncs.exceeds_max_key_size(noise_worker.make_request(param_set_opt, 0, num_of_inputs)):
+            print("evaluation keys of lattice dimension " + str(opt_n) + " above the limit")
+            opt_n = 0
+
+    return opt_n, optlogmodQks, optB_ks, logmodQ
 
 def binary_search_n(start_n, end_N, prev_noise, exp_sec_level, target_noise_level, num_of_samples, d_ks, params, secret_dist_des, is_quantum, num_threads, num_of_inputs):
     n = 0
@@ -204,7 +318,7 @@ def binary_search_n(start_n, end_N, prev_noise, exp_sec_level, target_noise_leve
         d_ks = d_ks_reset_loop
         new_n = end_N if early_exit_tst else floor((start_n + end_N)/2)
 
-        logmodQks = helperfncs.get_mod(new_n, exp_sec_level)
+        logmodQks = helperfncs.get_mod(new_n, exp_sec_level, secret_dist_des)
         new_n, modQks = helperfncs.optimize_params_security(stdparams.paramlinear[exp_sec_level][0], new_n, 2**logmodQks, secret_dist_des, num_threads, False, True, False, is_quantum)
         if (modQks > 0):
             logmodQks = log2(modQks)
@@ -223,8 +337,11 @@ def binary_search_n(start_n, end_N, prev_noise, exp_sec_level, target_noise_leve
             B_ks = 2**ceil(logmodQks/d_ks)
 
         params.B_ks = B_ks
-        new_noise, perf = helperfncs.get_noise_from_cpp_code(params, num_of_samples, num_of_inputs, True)
-        print("(actual noise, EvalBinGate time) (" +  str(new_noise) + ", " + perf['EvalBinGateTime'].split()[0] + ")")
+        new_noise, perf = helperfncs.compare_noise_from_cpp_code(params, num_of_samples, num_of_inputs, target_noise_level)
+        if perf is None:
+            print("(predicted noise) (" + str(new_noise) + ")")
+        else:
+            print("(actual noise, EvalBinGate time) (" +  str(new_noise) + ", " + perf['EvalBinGateTime'].split()[0] + ")")
 
         if (early_exit_tst):
             if ((new_noise - target_noise_level) > 8):
@@ -259,6 +376,81 @@ def binary_search_n(start_n, end_N, prev_noise, exp_sec_level, target_noise_leve
 
     return n, retlogmodQks, retBks
 
+# smallest n in [start_n, N] whose noise the calibrated noise model predicts below the target of a search configuration
+# (see search_index.make_search), with the Qks of the analytic fit of the security level; None without a calibrated model
+def get_model_n(search, start_n):
+    model = helperfncs.get_noise_model()
+    if model is None:
+        return None
+    secret_dist_des = ("error", "ternary")[search["secret_dist"]]
+    N, q, logQ = search["N"], search["q"], search["logQ"]
+    target_noise_level = helperfncs.get_target_noise(search["exp_decryption_failure"], 2*search["num_of_inputs"], q, search["num_of_inputs"])
+
+    def predict(n):
+        logmodQks = min(helperfncs.get_mod(n, search["exp_sec_level"], secret_dist_des), 30, logQ)
+        d_ks = search["d_ks"]
+        B_ks = 2**ceil(logmodQks/d_ks)
+        while (B_ks >= 128):
+            d_ks += 1
+            B_ks = 2**ceil(logmodQks/d_ks)
+        param_set = stdparams.paramsetvars(n, q, N, logQ, 2**logmodQks, 2**ceil(logQ/search["d_g"]), B_ks, search["B_rk"], 3.19, search["secret_dist"], search["bootstrapping_tech"])
+        return model.predict(noise_worker.make_request(param_set, 0, search["num_of_inputs"]))
+
+    if predict(start_n) is None:
+        return None
+    return helperfncs.gallop_search(lambda n: (predict(n)[0] < target_noise_level), start_n, start_n, N)
+
+# noise of the parameter set with lattice dimension n and the largest secure Qks for n, the probe of binary_search_n;
+# returns (noise, log2 Qks, B_ks)
+def probe_n(n, exp_sec_level, target_noise_level, num_of_samples, d_ks, params, secret_dist_des, is_quantum, num_threads, num_of_inputs):
+    logmodQks = helperfncs.get_mod(n, exp_sec_level, secret_dist_des)
+    _, modQks = helperfncs.optimize_params_security(stdparams.paramlinear[exp_sec_level][0], n, 2**logmodQks, secret_dist_des, num_threads, False, True, False, is_quantum)
+    if (modQks > 0):
+        logmodQks = log2(modQks)
+
+    if (logmodQks >= 32):
+        logmodQks = 30
+
+    while(logmodQks > params.logQ):
+        logmodQks -= 1
+
+    params.n = n
+    params.Qks = 2**logmodQks
+    B_ks = 2**ceil(logmodQks/d_ks)
+    while (B_ks >= 128):
+        d_ks += 1
+        B_ks = 2**ceil(logmodQks/d_ks)
+
+    params.B_ks = B_ks
+    new_noise, perf = helperfncs.compare_noise_from_cpp_code(params, num_of_samples, num_of_inputs, target_noise_level)
+    if perf is None:
+        print("(predicted noise) (" + str(new_noise) + ")")
+    else:
+        print("(actual noise, EvalBinGate time) (" +  str(new_noise) + ", " + perf['EvalBinGateTime'].split()[0] + ")")
+    return new_noise, logmodQks, B_ks
+
+# binary_search_n for a search with a solved neighboring configuration: an n in [start_n, end_N] whose noise is below
+# the target with the noise of n - 1 above it, found by galloping away from the n of the neighbor (seed_n) with steps step, 2*step, ... until
+# the answer is bracketed by a probe above and a probe below the target, and bisecting the bracket; with step = 1 a seed
+# that is the answer takes two probes. Returns (n, log2 Qks, B_ks), (0, 0, 0) if no n up to end_N reaches the target
+def warm_search_n(seed_n, step, start_n, end_N, exp_sec_level, target_noise_level, num_of_samples, d_ks, params, secret_dist_des, is_quantum, num_threads, num_of_inputs):
+    probes = {}
+    def below_target(n):
+        if n not in probes:
+            probes[n] = probe_n(n, exp_sec_level, target_noise_level, num_of_samples, d_ks, params, secret_dist_des, is_quantum, num_threads, num_of_inputs)
+        return (probes[n][0] < target_noise_level)
+
+    # as in binary_search_n, a seed above the target is followed by a probe of end_N, which ends the search if the noise
+    # of end_N is far above the target (the usual outcome for a (q, N) that is too small)
+    seed_n = min(max(seed_n, start_n), end_N)
+    if ((not below_target(seed_n)) and (not below_target(end_N)) and ((probes[end_N][0] - target_noise_level) > 8)):
+        return 0, 0, 0
+    n = helperfncs.gallop_search(below_target, seed_n, start_n, end_N, step)
+    if (n > end_N):
+        return 0, 0, 0
+    _, logmodQks, B_ks = probes[n]
+    return n, logmodQks, B_ks
+
 def find_opt_n(start_n, end_n, exp_sec_level, target_noise_level, num_of_samples, d_ks, params, secret_dist_des, is_quantum, num_threads, num_of_inputs):
     opt_n = end_n
     optlogmodQks = log2(params.Qks)
@@ -268,7 +460,7 @@ def find_opt_n(start_n, end_n, exp_sec_level, target_noise_level, num_of_samples
         d_ks = d_ks_reset_loop
         newopt_n = floor((start_n + end_n)/2)
 
-        logmodQks = helperfncs.get_mod(newopt_n, exp_sec_level)
+        logmodQks = helperfncs.get_mod(newopt_n, exp_sec_level, secret_dist_des)
         newopt_n, modQks = helperfncs.optimize_params_security(stdparams.paramlinear[exp_sec_level][0], newopt_n, 2**logmodQks, secret_dist_des, num_threads, False, True, False, is_quantum)
         logmodQks = log2(modQks)
 
@@ -287,8 +479,11 @@ def find_opt_n(start_n, end_n, exp_sec_level, target_noise_level, num_of_samples
             B_ks = 2**ceil(logmodQks/d_ks)
 
         params.B_ks = B_ks
-        new_noise, perf = helperfncs.get_noise_from_cpp_code(params, num_of_samples, num_of_inputs, True)
-        print("(actual noise, EvalBinGate time) (" +  str(new_noise) + ", " + perf['EvalBinGateTime'].split()[0] + ")")
+        new_noise, perf = helperfncs.compare_noise_from_cpp_code(params, num_of_samples, num_of_inputs, target_noise_level)
+        if perf is None:
+            print("(predicted noise) (" + str(new_noise) + ")")
+        else:
+            print("(actual noise, EvalBinGate time) (" +  str(new_noise) + ", " + perf['EvalBinGateTime'].split()[0] + ")")
 
         if (new_noise < target_noise_level):
             opt_n = newopt_n
@@ -403,6 +598,8 @@ def binary_search_n_Qks(start_n, end_N, prev_noise, exp_sec_level, target_noise_
 
 
 if __name__ == '__main__':
+    jobs = 1
+    profile = None
     if (len(sys.argv) == 1):
         '''
         Approach for determining parameters for binfhe
@@ -486,22 +683,79 @@ if __name__ == '__main__':
         parser.add_argument('-u', '--upper', action='store', default=4, type=int)
         parser.add_argument('-n', '--num_threads', action='store', default=1, type=int)
         parser.add_argument('-a', '--all', action='store_true')
+        parser.add_argument('--cache_dir', action='store', default=None, help='directory of the persistent estimator and noise caches')
+        parser.add_argument('--cache_size', action='store', default=None, type=int, help='max number of cached estimator results')
+        parser.add_argument('--no_cache', action='store_true', help='always run the lattice-estimator and take fresh noise samples')
+        parser.add_argument('--grid_dir', action='store', default=None, help='directory of the security grids built by security_grid.py (default: the cache directory)')
+        parser.add_argument('--no_grid', action='store_true', help='always run the lattice-estimator instead of answering from a security grid')
+        parser.add_argument('--eager_estimator', action='store_true', help='always evaluate all attacks (on num_threads jobs) instead of stopping at the first one below the security level')
+        parser.add_argument('--error_budget', action='store', default=0.01, type=float, help='probability of a wrong above/below target decision for a noise comparison')
+        parser.add_argument('--batch_size', action='store', default=25, type=int, help='samples per batch of a noise comparison (0 = always take num_of_samples samples)')
+        parser.add_argument('-j', '--jobs', action='store', default=1, type=int, help='number of searches to run concurrently')
+        parser.add_argument('--noise_model_margin', action='store', default=1.25, type=float, help='factor between predicted and target noise beyond which a probe is not measured')
+        parser.add_argument('--no_noise_model', action='store_true', help='measure the noise of every probe')
+        parser.add_argument('--sampling_threads', action='store', default=1, type=int, help='number of threads the noise sampler uses for bootstrapping')
+        parser.add_argument('--key_cache_size', action='store', default=1, type=int, help='number of parameter sets whose keys a noise sampler process keeps in memory')
+        parser.add_argument('--journal', action='store', default=None, help='record finished searches and noise comparisons in this file')
+        parser.add_argument('--resume', action='store_true', help='replay the journal (default binfhe_params_journal.jsonl) and skip finished work')
+        parser.add_argument('--new_journal', action='store_true', help='overwrite an existing journal instead of refusing to start')
+        parser.add_argument('--build_dir', action='store', default=None, help='build directory with bin/boolean_noise_estimate_script (default: build at the top of the repository)')
+        parser.add_argument('--key_dir', action='store', default=None, help='directory to save the keys of the noise sampler in and load them from')
+        parser.add_argument('--warm_start', action='store_true', help='start every search for n from the nearest solved configuration instead of from scratch (fewer probes, the n found can differ)')
+        parser.add_argument('--max_key_size', action='store', default=None, type=int, help='max size in bytes of the bootstrapping plus key switching key, larger parameter sets are rejected before key generation')
+        parser.add_argument('--profile', action='store', default=None, help='write a Chrome trace of the estimator calls and noise measurements to this file and print a summary of their times')
         a = parser.parse_args()
 
+        profile = a.profile
+        profiler.configure_profiler(profile is not None)
+
+        helperfncs.configure_estimator(not a.eager_estimator)
+        helperfncs.configure_security_grid(a.grid_dir or a.cache_dir, enabled=not a.no_grid)
+        helperfncs.configure_estimator_cache(a.cache_dir, a.cache_size, not a.no_cache)
+        helperfncs.configure_noise_cache(a.cache_dir, not a.no_cache)
+        helperfncs.configure_noise_test(a.error_budget, a.batch_size)
+        helperfncs.configure_noise_worker(a.sampling_threads, a.key_cache_size, a.key_dir, a.build_dir)
+        helperfncs.configure_noise_model(a.noise_model_margin, not a.no_noise_model)
+        helperfncs.configure_max_key_size(a.max_key_size)
+        helperfncs.configure_search_index(a.cache_dir, a.warm_start or (os.environ.get("OPENFHE_WARM_START", "0") != "0"))
+        if (a.resume and (a.journal is None)):
+            a.journal = "binfhe_params_journal.jsonl"
+        if (a.resume and a.new_journal):
+            parser.error("--resume and --new_journal exclude each other")
+        try:
+            helperfncs.configure_journal(a.journal, a.resume, a.new_journal)
+        except FileExistsError as e:
+            parser.error(str(e) + ", use --resume or --new_journal")
+
         if a.all:
+            # all combinations and their d_g iterations go to one job list so that --jobs can run them concurrently
+            all_jobs = []
 #            for sl, gi, bt in product(sec_levels, gate_inputs, boot_techs.keys()):
             for sl, gi, bt in product(sec_levels, gate_inputs, [a.bootstrapping_tech,]):
-                print('_'.join((sl, str(gi), boot_techs[bt])), '##########################################################################################\n')
+                all_jobs.append((print, ('_'.join((sl, str(gi), boot_techs[bt])), '##########################################################################################\n')))
 
                 secret_dist = 0 if (bt == 3) else 1
-                parameter_selector(bt, secret_dist, sl, a.exp_decryption_failure, gi, a.num_of_samples, a.d_ks, a.lower, a.upper, a.num_threads)
-
-                helperfncs.rm_out_files("out_file_")
-                helperfncs.rm_out_files("noise_file_")
+                all_jobs += parameter_selector_jobs(bt, secret_dist, sl, a.exp_decryption_failure, gi, a.num_of_samples, a.d_ks, a.lower, a.upper, a.num_threads)
 
-                print('_'.join((sl, str(gi), boot_techs[bt])), '##########################################################################################\n')
+                all_jobs.append((print, ('_'.join((sl, str(gi), boot_techs[bt])), '##########################################################################################\n')))
+            job_scheduler.run_jobs(all_jobs, a.jobs, journal=helperfncs.get_journal())
         else:
-            parameter_selector(a.bootstrapping_tech, a.secret_dist, a.exp_sec_level, a.exp_decryption_failure, a.num_of_inputs, a.num_of_samples, a.d_ks, a.lower, a.upper, a.num_threads)
-
-    helperfncs.rm_out_files("out_file_")
-    helperfncs.rm_out_files("noise_file_")
+            parameter_selector(a.bootstrapping_tech, a.secret_dist, a.exp_sec_level, a.exp_decryption_failure, a.num_of_inputs, a.num_of_samples, a.d_ks, a.lower, a.upper, a.num_threads, a.jobs)
+        jobs = a.jobs
+
+    # with --jobs the estimator calls happen in the worker processes, their hits and misses are not counted here
+    if (helperfncs.get_estimator_cache() is not None) and (jobs <= 1):
+        print(helperfncs.get_estimator_cache().stats())
+    if (helperfncs.get_noise_cache() is not None) and (jobs <= 1):
+        print(helperfncs.get_noise_cache().stats())
+    if (helperfncs.get_journal() is not None) and (jobs <= 1):
+        print(helperfncs.get_journal().stats())
+    if (helperfncs.get_search_index() is not None) and (jobs <= 1):
+        print(helperfncs.get_search_index().stats())
+    for grid in helperfncs.SECURITY_GRIDS.values():
+        if (grid is not None) and (jobs <= 1):
+            print(grid.stats())
+    # the profile covers the worker processes of --jobs as well
+    if profile is not None:
+        profiler.get_profiler().write_trace(profile)
+        print(profiler.get_profiler().summary())
@@ -1,27 +1,76 @@
 #!/usr/bin/python
 
-from estimator import *
 from math import log2, floor, sqrt, ceil, erfc
-from scipy.special import erfcinv
-from statistics import stdev
 
+import atexit
+import estimator_cache
+import importlib.util
 import io
+import json
+import journal
+import key_size_model
+import multiprocessing.util
+import noise_cache
+import noise_model
+import noise_worker
 import os
 import paramstable as stdparams
-import random
+import profiler
+import refit_paramlinear
+import search_index
+import security_grid
+import subprocess
 import sys
 
+# cheapest attack first, see call_estimator
+ATTACKS = ("usvp", "dual", "bdd")
+ESTIMATOR = None
+ESTIMATOR_LAZY = True
+ESTIMATOR_CACHE = None
+ESTIMATOR_VERSION = None
+SECURITY_GRIDS = {}
+PARAM_FITS = {}
+SECURITY_GRID_CONFIG = {"grid_dir": None, "margin": 1, "enabled": True}
+NOISE_WORKER = None
+NOISE_WORKER_CONFIG = {"sampling_threads": 1, "key_cache_size": 1, "key_dir": None, "build_dir": None}
+NOISE_CACHE = None
+NOISE_MODEL = None
+JOURNAL = None
+SAVED_STDOUT = []
+NOISE_TEST = {"error_budget": 0.01, "batch_size": 25}
+MAX_KEY_SIZE = None
+SEARCH_INDEX = None
+PROBES = 0
+
 def restore_print():
-    # restore stdout
-    sys.stdout = sys.__stdout__
+    # restore stdout (which is not sys.__stdout__ when the output of a job is captured)
+    sys.stdout = SAVED_STDOUT.pop()
     #text_trap.getvalue()
 
 def block_print():
     text_trap = io.StringIO()
+    SAVED_STDOUT.append(sys.stdout)
     sys.stdout = text_trap
 
+# the cores this process may run on; os.sched_getaffinity does not exist on every platform (e.g. macOS)
+def get_available_cores():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
 # find analytical estimate for starting point of modulus for the estimator
-def get_mod(dim, exp_sec_level):
+# with a secret distribution the fit written by refit_paramlinear.py (paramfit.json in the estimator cache directory)
+# is used if it has one
+def get_mod(dim, exp_sec_level, secret_dist = None):
+    if secret_dist is not None:
+        if (exp_sec_level, secret_dist) not in PARAM_FITS:
+            cache = get_estimator_cache()
+            path = refit_paramlinear.get_fit_path(cache.cache_dir if cache is not None else None)
+            PARAM_FITS[(exp_sec_level, secret_dist)] = refit_paramlinear.load_fit(exp_sec_level, secret_dist, path)
+        fit = PARAM_FITS[(exp_sec_level, secret_dist)]
+        if fit is not None:
+            return round(refit_paramlinear.fit_logmod(fit, dim))
+
     # get linear relation coefficients for log(modulus) and dimension for the input security level
     a = stdparams.paramlinear[exp_sec_level][1]
     b = stdparams.paramlinear[exp_sec_level][2]
@@ -30,154 +79,519 @@ def get_mod(dim, exp_sec_level):
     mod = ceil(modapp)
     return mod
 
-# calls lattice-estimator to get the work factor for known attacks
-# TODO: add other secret distributions
-def call_estimator(dim, mod, secret_dist="ternary", num_threads = 1, is_quantum = True):
+# set up the persistent estimator cache (cache_dir/max_entries default to the OPENFHE_ESTIMATOR_CACHE_* environment variables)
+def configure_estimator_cache(cache_dir = None, max_entries = None, enabled = True):
+    global ESTIMATOR_CACHE
+    # False (not None) when disabled, so that get_estimator_cache does not set up the default cache
+    ESTIMATOR_CACHE = estimator_cache.EstimatorCache(cache_dir, max_entries) if enabled else False
+    return ESTIMATOR_CACHE or None
+
+def get_estimator_cache():
+    if ESTIMATOR_CACHE is None:
+        configure_estimator_cache(enabled=(os.environ.get("OPENFHE_ESTIMATOR_CACHE", "1") != "0"))
+    return ESTIMATOR_CACHE or None
+
+# the lattice-estimator module, imported on the first estimate: importing it loads Sage, which takes seconds and is not
+# needed by runs that answer every security check from the caches and grids, nor by the validator
+def get_estimator():
+    global ESTIMATOR
+    if ESTIMATOR is None:
+        import estimator
+        ESTIMATOR = estimator
+    return ESTIMATOR
+
+# version of the lattice-estimator, part of the cache key so that an estimator update invalidates old results
+# the lattice-estimator is usually used from a git checkout on the PYTHONPATH, whose commit is found without importing
+# it; otherwise the version is its __version__
+def get_estimator_version():
+    global ESTIMATOR_VERSION
+    if ESTIMATOR_VERSION is None:
+        spec = importlib.util.find_spec("estimator")
+        try:
+            if (spec is None) or (spec.origin is None):
+                raise OSError("lattice-estimator not found")
+            estimator_dir = os.path.dirname(os.path.abspath(spec.origin))
+            ESTIMATOR_VERSION = subprocess.run(["git", "-C", estimator_dir, "rev-parse", "HEAD"], capture_output=True,
+                                               text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            ESTIMATOR_VERSION = getattr(get_estimator(), "__version__", None) if (spec is not None) else None
+            ESTIMATOR_VERSION = ESTIMATOR_VERSION or "unknown"
+    return ESTIMATOR_VERSION
+
+# lazy = True lets call_estimator stop at the first attack below the target security level, lazy = False always
+# evaluates all attacks together with LWE.estimate
+def configure_estimator(lazy = True):
+    global ESTIMATOR_LAZY
+    ESTIMATOR_LAZY = lazy
+
+def get_lwe_params(dim, mod, secret_dist):
+    LWE, ND = get_estimator().LWE, get_estimator().ND
     if secret_dist == "error":
-        params = LWE.Parameters(n=dim, q=mod, Xs=ND.DiscreteGaussian(3.19), Xe=ND.DiscreteGaussian(3.19))
+        return LWE.Parameters(n=dim, q=mod, Xs=ND.DiscreteGaussian(3.19), Xe=ND.DiscreteGaussian(3.19))
     elif secret_dist == "ternary":
-        params = LWE.Parameters(n=dim, q=mod, Xs=ND.Uniform(-1, 1, dim), Xe=ND.DiscreteGaussian(3.19))
+        return LWE.Parameters(n=dim, q=mod, Xs=ND.Uniform(-1, 1, dim), Xe=ND.DiscreteGaussian(3.19))
     else:
         print("Invalid distribution for secret")
 
-    block_print()
-    estimateval = LWE.estimate(params, red_cost_model=(RC.LaaMosPol14 if is_quantum else RC.BDGL16),
-                               deny_list=["bkw", "bdd_hybrid", "bdd_mitm_hybrid", "dual_hybrid", "dual_mitm_hybrid", "arora-gb"], jobs=num_threads)
-    restore_print()
+# estimates the given attacks one at a time in the order of ATTACKS and stops at the first one below target;
+# returns {attack: log2 of the cost} of the evaluated attacks
+def estimate_attacks(params, attacks, red_cost_model, target):
+    LWE = get_estimator().LWE
+    functions = {"usvp": LWE.primal_usvp, "dual": LWE.dual, "bdd": LWE.primal_bdd}
+    values = {}
+    for attack in attacks:
+        values[attack] = floor(log2(functions[attack](params, red_cost_model=red_cost_model)['rop']))
+        if (values[attack] < target):
+            break
+    return values
 
-    usvprop = floor(log2(estimateval['usvp']['rop']))
-    dualrop = floor(log2(estimateval['dual']['rop']))
-    decrop = floor(log2(estimateval['bdd']['rop']))
+# calls lattice-estimator to get the work factor for known attacks
+# results are memoized in the estimator cache per attack, including failed estimates which are raised again on a hit
+# with a target security level (and lazy estimation) the attacks are evaluated cheapest first and the evaluation stops
+# at the first attack below the target, so the result is the minimum over all attacks if it is >= target and otherwise
+# just some attack cost below target; comparisons with the target are exact either way. Without a target all attacks
+# are needed and LWE.estimate runs them on num_threads jobs
+# TODO: add other secret distributions
+@profiler.profiled
+def call_estimator(dim, mod, secret_dist="ternary", num_threads = 1, is_quantum = True, target = None):
+    cost_model = "LaaMosPol14" if is_quantum else "BDGL16"
+    lazy = ESTIMATOR_LAZY and (target is not None)
+    cache = get_estimator_cache()
+    values = cache.lookup(dim, mod, secret_dist, cost_model, ATTACKS, get_estimator_version()) if cache is not None else {}
+    if estimator_cache.FAILED in values.values():
+        cache.hits += 1
+        profiler.get_profiler().count("estimator cache hits")
+        raise ValueError("lattice-estimator failed for n = " + str(dim) + ", q = " + str(mod) + " (cached)")
+    missing = [attack for attack in ATTACKS if attack not in values]
+    if ((not missing) or (lazy and min(values.values(), default=target) < target)):
+        if cache is not None:
+            cache.hits += 1
+            profiler.get_profiler().count("estimator cache hits")
+        return min(values.values())
+    if cache is not None:
+        cache.misses += 1
+        profiler.get_profiler().count("estimator cache misses")
+
+    params = get_lwe_params(dim, mod, secret_dist)
+    RC = get_estimator().RC
+    red_cost_model = RC.LaaMosPol14 if is_quantum else RC.BDGL16
 
-    return min(usvprop, dualrop, decrop)
+    block_print()
+    try:
+        if lazy:
+            new_values = estimate_attacks(params, missing, red_cost_model, target)
+        else:
+            deny_list = ["bkw", "bdd_hybrid", "bdd_mitm_hybrid", "dual_hybrid", "dual_mitm_hybrid", "arora-gb"]
+            deny_list += [attack for attack in ATTACKS if attack not in missing]
+            estimateval = get_estimator().LWE.estimate(params, red_cost_model=red_cost_model, deny_list=deny_list, jobs=num_threads)
+            new_values = {attack: floor(log2(estimateval[attack]['rop'])) for attack in missing}
+    except Exception:
+        if cache is not None:
+            cache.store(dim, mod, secret_dist, cost_model, dict.fromkeys(missing, estimator_cache.FAILED), get_estimator_version())
+        raise
+    finally:
+        restore_print()
+
+    if cache is not None:
+        cache.store(dim, mod, secret_dist, cost_model, new_values, get_estimator_version())
+
+    values.update(new_values)
+    return min(values.values())
+
+# security grids (see security_grid.py) default to the estimator cache directory, margin is the distance in bits from
+# the security level below which a grid point is not trusted
+def configure_security_grid(grid_dir = None, margin = 1, enabled = True):
+    SECURITY_GRID_CONFIG.update({"grid_dir": grid_dir, "margin": margin, "enabled": enabled})
+    SECURITY_GRIDS.clear()
+
+def get_security_grid(secret_dist, is_quantum):
+    if (not SECURITY_GRID_CONFIG["enabled"]) or (os.environ.get("OPENFHE_SECURITY_GRID", "1") == "0"):
+        return None
+    if (secret_dist, is_quantum) not in SECURITY_GRIDS:
+        grid_dir = SECURITY_GRID_CONFIG["grid_dir"] or os.environ.get("OPENFHE_ESTIMATOR_CACHE_DIR", estimator_cache.DEFAULT_CACHE_DIR)
+        SECURITY_GRIDS[(secret_dist, is_quantum)] = security_grid.load_grid(grid_dir, secret_dist, is_quantum, get_estimator_version(), SECURITY_GRID_CONFIG["margin"])
+    return SECURITY_GRIDS[(secret_dist, is_quantum)]
+
+# True if dim and mod provide the expected security level; answered from the security grid when the point is clearly
+# inside the secure or insecure region, by the estimator otherwise (which raises if it fails for these parameters)
+def check_security(dim, mod, secret_dist, num_threads, is_quantum, expected_sec_level):
+    grid = get_security_grid(secret_dist, is_quantum)
+    if grid is not None:
+        secure = grid.decide(dim, log2(mod), expected_sec_level)
+        profiler.get_profiler().count("security grid " + ("hits" if secure is not None else "fallbacks"))
+        if secure is not None:
+            return secure
+    return (call_estimator(dim, mod, secret_dist, num_threads, is_quantum, expected_sec_level) >= expected_sec_level)
+
+# find the smallest integer x in [lower, upper] with pred(x) True, for a predicate that is monotone in x (False ... False True ... True)
+# gallops away from start with steps step, 2*step, 4*step, ... until the answer is bracketed and then bisects the bracket, so the
+# number of evaluations is O(log distance) from start instead of O(distance); returns upper + 1 if pred is False on the whole range
+def gallop_search(pred, start, lower = None, upper = None, step = 1):
+    if pred(start):
+        hi = start
+        while ((lower is None) or (hi > lower)):
+            lo = hi - step if lower is None else max(hi - step, lower)
+            if not pred(lo):
+                break
+            hi = lo
+            step *= 2
+        else:
+            return lower
+    else:
+        lo = start
+        while ((upper is None) or (lo < upper)):
+            hi = lo + step if upper is None else min(lo + step, upper)
+            if pred(hi):
+                break
+            lo = hi
+            step *= 2
+        else:
+            return upper + 1
+
+    # invariant: pred(lo) is False and pred(hi) is True
+    while (hi - lo > 1):
+        mid = (lo + hi)//2
+        if pred(mid):
+            hi = mid
+        else:
+            lo = mid
+    return hi
 
 # optimize dim, mod for an expected security level - this is specifically for the dimension n, and key switch modulus Qks in FHEW
 # Increasing Qks helps reduce the bootstrapped noise
+# Security is monotone in log2(mod) for a fixed dim and in dim for a fixed mod, so both searches bracket the answer around the
+# starting point (the paramlinear estimate from get_mod) and bisect instead of walking one estimator call per step
+@profiler.profiled
 def optimize_params_security(expected_sec_level, dim, mod, secret_dist = "ternary", num_threads = 1, optimize_dim = False, optimize_mod = True, is_dim_pow2 = True, is_quantum = True):
-    dim1 = dim
-    dimlog = log2(dim)
-    done = False
+    if (optimize_dim and (not optimize_mod)):
+        return optimize_dim_security(expected_sec_level, dim, mod, secret_dist, num_threads, is_dim_pow2, is_quantum)
+    elif ((not optimize_dim) and optimize_mod):
+        return optimize_mod_security(expected_sec_level, dim, mod, secret_dist, num_threads, is_quantum)
+
+    return dim, mod
 
-    while done is False:
+# largest power of two modulus for which dim provides the expected security level, (0, 0) if there is none
+def optimize_mod_security(expected_sec_level, dim, mod, secret_dist, num_threads, is_quantum):
+    # the estimator fails for moduli that are too small for the dimension, start from the first one it accepts
+    logmod = round(log2(mod))
+    while True:
         try:
-            sec_level_from_estimator = call_estimator(dim, mod, secret_dist, num_threads, is_quantum)
-            done = True
+            secure = check_security(dim, 2**logmod, secret_dist, num_threads, is_quantum, expected_sec_level)
+            break
         except:
-            mod = 2*mod
-    done = False
-    mod1 = mod
-
-    modifieddim = False
-    modifiedmod = False
-    # loop to adjust modulus if given dim, modulus provide less security than target
-    while (sec_level_from_estimator < expected_sec_level or done):
-        if (optimize_dim and (not optimize_mod)):
-            modifieddim = True
-            dim1 = dim1 + 15
-            if ((dim1 >= 2*dim) and (not is_dim_pow2)):
-                done = True
-            elif is_dim_pow2:
-                dim1 = 2*dim
-            sec_level_from_estimator = call_estimator(dim1, mod, secret_dist, num_threads, is_quantum)
-        elif ((not optimize_dim) and optimize_mod):
-            mod1 = mod1/2
-            try:
-                sec_level_from_estimator = call_estimator(dim, mod1, secret_dist, num_threads, is_quantum)
-                modifiedmod = True
-            except:
-                return 0, 0
-
-    # also need to check if starting from a lower than possible mod - when the above condition is satisfied but not optimal
-    # loop to adjust modulus if given dim, modulus provide more security than target
-    prev_sec_estimator = sec_level_from_estimator
-    sec_level_from_estimator_new = sec_level_from_estimator
-    prev_mod = mod1
-    modifieddimmore = False
-    modifiedmodmore = False
-    while True:
-        prev_sec_estimator = sec_level_from_estimator_new
-        if (optimize_dim and (not optimize_mod)):
-            modifieddimmore = True
-            dim1 = dim1 - 15
-            if ((dim1 <= 500) and (not is_dim_pow2)):
-                done = True
-            elif is_dim_pow2:
-                dim1 = dim/2
-            sec_level_from_estimator_new = call_estimator(dim1, mod, secret_dist, num_threads, is_quantum)
-        elif ((not optimize_dim) and optimize_mod):
-            mod1 = 2*mod1
+            logmod = logmod + 1
+
+    # True = secure, False = insecure, None = the estimator failed
+    states = {logmod: secure}
+    def probe(logmod1):
+        if logmod1 not in states:
             try:
-                sec_level_from_estimator_new = call_estimator(dim, mod1, secret_dist, num_threads, is_quantum)
-                modifiedmodmore = True
+                states[logmod1] = check_security(dim, 2**logmod1, secret_dist, num_threads, is_quantum, expected_sec_level)
             except:
-                return 0, 0
-        if (((prev_sec_estimator >= expected_sec_level) and (sec_level_from_estimator_new < expected_sec_level)) or done):
-            break
+                states[logmod1] = None
+        return states[logmod1]
 
-    if (modifiedmodmore and prev_sec_estimator >= expected_sec_level):
-        mod1 = mod1/2
+    # failures below the starting modulus mean the dimension is too small for the estimator, they count as "not insecure" so
+    # that the largest secure modulus is the point just below the smallest insecure one; failures above it end the search
+    def is_insecure(logmod1):
+        state = probe(logmod1)
+        if ((state is None) and (logmod1 > logmod)):
+            raise ValueError("lattice-estimator failed for n = " + str(dim) + ", log2(q) = " + str(logmod1))
+        return (state is False)
 
-    if ((modifieddim or modifiedmod) and sec_level_from_estimator < expected_sec_level):
-        dim1 = 0
-        mod1 = 0
-        print("cannot find optimal params")
+    try:
+        logmod_insecure = gallop_search(is_insecure, logmod, 1)
+    except:
+        return 0, 0
+
+    logmod_opt = logmod_insecure - 1
+    if ((logmod_opt < 1) or (probe(logmod_opt) is not True)):
+        return 0, 0
+
+    return dim, 2**logmod_opt
+
+# smallest dimension for which mod provides the expected security level, (0, 0) if there is none
+# power of two dimensions are searched among dim/2, dim, 2*dim, other dimensions in steps of 15 between 500 and 2*dim
+def optimize_dim_security(expected_sec_level, dim, mod, secret_dist, num_threads, is_dim_pow2, is_quantum):
+    if is_dim_pow2:
+        get_dim = lambda t: int(dim*2**t)
+        lower, upper = -1, 1
+    else:
+        get_dim = lambda t: dim + 15*t
+        lower, upper = ceil((500 - dim)/15), floor(dim/15)
+
+    def is_secure(t):
+        try:
+            return check_security(get_dim(t), mod, secret_dist, num_threads, is_quantum, expected_sec_level)
+        except:
+            return False
 
-    return dim1, mod1
-
-def get_noise_from_cpp_code(param_set, num_of_samples, num_of_inputs, perfNumbers = False):
-    filenamerandom = str(random.randrange(500))
-
-    # TODO: change build folder based on word size
-    bashCommand = ' '.join([ "scripts/run_script.sh",
-                             str(param_set.n),
-                             str(param_set.q),
-                             str(param_set.N),
-                             str(param_set.logQ),
-                             str(param_set.Qks),
-                             str(param_set.B_g),
-                             str(param_set.B_ks),
-                             str(param_set.B_rk),
-                             str(param_set.sigma),
-                             str(num_of_samples),
-                             str(param_set.secret_dist),
-                             str(param_set.bootstrapping_tech),
-                             str(num_of_inputs),
-                             "build",
-                             "> out_file_" + filenamerandom,
-                             "2> noise_file_" + filenamerandom
-                          ])
-
-    print(bashCommand)
-    os.system(bashCommand)
-
-    # parse noise values and compute stddev
-    with open("noise_file_" + filenamerandom) as file:
-        noise = [float(line.rstrip()) for line in file]
+    t = gallop_search(is_secure, min(max(0, lower), upper), lower, upper)
+    if (t > upper):
+        print("cannot find optimal params")
+        return 0, 0
+
+    return get_dim(t), mod
+
+# number of threads the sampler uses for the bootstraps of one request (timings are always taken on one thread),
+# number of parameter sets whose keys a sampler process keeps in memory, the directory for serialized keys and the
+# build directory of the sampler (default: noise_worker.get_build_dir())
+def configure_noise_worker(sampling_threads = 1, key_cache_size = 1, key_dir = None, build_dir = None):
+    global NOISE_WORKER
+    NOISE_WORKER_CONFIG.update({"sampling_threads": max(1, sampling_threads), "key_cache_size": max(1, key_cache_size), "key_dir": key_dir,
+                                "build_dir": build_dir})
+    if NOISE_WORKER is not None:
+        NOISE_WORKER.close()
+        NOISE_WORKER = None
+
+# pool of warm boolean_noise_estimate_script server processes shared by all noise measurements of this process; it is
+# closed at exit, in the worker processes of a process pool (which exit without running atexit) by a finalizer of
+# multiprocessing
+def get_noise_worker():
+    global NOISE_WORKER
+    if NOISE_WORKER is None:
+        NOISE_WORKER = noise_worker.NoiseWorker(**NOISE_WORKER_CONFIG)
+        atexit.register(NOISE_WORKER.close)
+        multiprocessing.util.Finalize(NOISE_WORKER, NOISE_WORKER.close, exitpriority=0)
+    return NOISE_WORKER
+
+# identity of the configured sampler binary, part of the key of the noise cache
+def get_sampler_id():
+    return noise_worker.get_sampler_id(NOISE_WORKER_CONFIG["build_dir"])
+
+def configure_noise_cache(cache_dir = None, enabled = True):
+    global NOISE_CACHE
+    NOISE_CACHE = noise_cache.NoiseCache(cache_dir, get_sampler_id) if enabled else False
+    return NOISE_CACHE or None
+
+def get_noise_cache():
+    if NOISE_CACHE is None:
+        configure_noise_cache(enabled=(os.environ.get("OPENFHE_NOISE_CACHE", "1") != "0"))
+    return NOISE_CACHE or None
+
+def configure_noise_model(margin = 1.25, enabled = True):
+    global NOISE_MODEL
+    NOISE_MODEL = noise_model.NoiseModel(margin) if enabled else False
+    if NOISE_MODEL and get_noise_cache() is not None:
+        NOISE_MODEL.calibrate(get_noise_cache().entries(noise_model.MIN_CALIBRATION_SAMPLES))
+    return NOISE_MODEL or None
+
+def get_noise_model():
+    if NOISE_MODEL is None:
+        configure_noise_model(enabled=(os.environ.get("OPENFHE_NOISE_MODEL", "1") != "0"))
+    return NOISE_MODEL or None
+
+# moments of num_of_samples fresh noise samples and the sampler response (without the samples) for a sampler request
+def sample_noise(request, num_of_samples):
+    response = noise_worker.split_gates(get_noise_worker().request(dict(request, num_of_samples=num_of_samples)))[0]
+    info = {k: v for k, v in response.items() if k != "noise"}
+    return noise_cache.NoiseMoments.from_samples(response["noise"]), info
+
+# like sample_noise for several gates with one set of keys, returns {gate: (NoiseMoments, info)}
+def sample_noise_gates(request, gates, num_of_samples):
+    response = get_noise_worker().request(dict(request, num_of_samples=num_of_samples, gates=",".join(gates)))
+    results = {}
+    for gate_response in noise_worker.split_gates(response):
+        info = {k: v for k, v in gate_response.items() if k != "noise"}
+        results[gate_response["Gate"]] = noise_cache.NoiseMoments.from_samples(gate_response["noise"]), info
+    return results
+
+# noise moments and the sampler response (without the samples) for a sampler request, with at least num_of_samples
+# samples; only the samples that are missing from the noise cache are taken
+def measure_noise(request, num_of_samples):
+    cache = get_noise_cache()
+    moments, info = cache.lookup(request) if cache is not None else (noise_cache.NoiseMoments(), None)
+    if ((info is not None) and (moments.count >= num_of_samples)):
+        cache.hits += 1
+        profiler.get_profiler().count("noise cache hits")
+        return moments, info
+
+    new_moments, info = sample_noise(request, num_of_samples - moments.count)
+    if cache is None:
+        return new_moments, info
+
+    cache.misses += 1
+    profiler.get_profiler().count("noise cache top-ups")
+    return cache.add(request, new_moments, info), info
+
+# measure_noise for several gates with the keys of request: every gate has its own noise cache entry (see
+# make_gate_request), the gates with missing samples are measured together in one sampler request so that their keys
+# are generated once; returns a (NoiseMoments, info) pair per gate
+def measure_noise_gates(request, gates, num_of_samples):
+    cache = get_noise_cache()
+    results = {}
+    missing = []
+    for gate in gates:
+        gate_request = noise_worker.make_gate_request(request, gate)
+        moments, info = cache.lookup(gate_request) if cache is not None else (noise_cache.NoiseMoments(), None)
+        if ((info is not None) and (moments.count >= num_of_samples)):
+            cache.hits += 1
+            profiler.get_profiler().count("noise cache hits")
+            results[gate] = moments, info
+        else:
+            missing.append((gate, gate_request, moments.count))
+
+    if missing:
+        # the gates share one run count, take enough for the gate with the fewest cached samples
+        new_results = sample_noise_gates(request, [gate for gate, _, _ in missing], num_of_samples - min(count for _, _, count in missing))
+        for gate, gate_request, _ in missing:
+            new_moments, info = new_results[gate]
+            if cache is None:
+                results[gate] = new_moments, info
+            else:
+                cache.misses += 1
+                profiler.get_profiler().count("noise cache top-ups")
+                results[gate] = cache.add(gate_request, new_moments, info), info
+    return [results[gate] for gate in gates]
+
+# error budget and batch size of the sequential noise comparison, batch_size = 0 always takes all samples
+def configure_noise_test(error_budget = 0.01, batch_size = 25):
+    NOISE_TEST.update({"error_budget": error_budget, "batch_size": batch_size})
+
+# chi-square confidence interval with confidence 1 - alpha for the standard deviation of normally distributed noise
+def get_stdev_interval(moments, alpha):
+    # scipy is imported on first use, it takes most of the startup time of runs that do not search
+    from scipy.stats import chi2
+    dof = moments.count - 1
+    variance = moments.variance()
+    return sqrt(dof*variance/chi2.ppf(1 - alpha/2, dof)), sqrt(dof*variance/chi2.ppf(alpha/2, dof))
+
+# compares the noise stddev of a sampler request with target_noise_level, taking samples in batches until the
+# confidence interval of the stddev lies entirely above or below the target, or max_samples samples are taken
+# the error budget is split evenly over all looks at the interval (Bonferroni), so the probability that any
+# decision is wrong stays below it; returns the moments, the sampler response and True/False for above/below
+def compare_noise(request, target_noise_level, max_samples):
+    batch_size = NOISE_TEST["batch_size"]
+    if (batch_size <= 0) or (batch_size >= max_samples):
+        moments, info = measure_noise(request, max_samples)
+        return moments, info, (moments.stdev() > target_noise_level)
+
+    alpha = NOISE_TEST["error_budget"]/ceil(max_samples/batch_size)
+    cache = get_noise_cache()
+    moments, info = cache.lookup(request) if cache is not None else (noise_cache.NoiseMoments(), None)
+    while True:
+        if ((info is not None) and (moments.count >= batch_size)):
+            stdev_low, stdev_high = get_stdev_interval(moments, alpha)
+            if (stdev_low > target_noise_level):
+                return moments, info, True
+            if (stdev_high < target_noise_level):
+                return moments, info, False
+            if (moments.count >= max_samples):
+                return moments, info, (moments.stdev() > target_noise_level)
+
+        new_moments, info = sample_noise(request, min(batch_size, max_samples - moments.count))
+        moments = cache.add(request, new_moments, info) if cache is not None else moments.merge(new_moments)
+
+# with gates (a list of gate names, see noise_worker.GATES) all gates are measured with one set of keys and a list
+# with the result of every gate is returned
+@profiler.profiled
+def get_noise_from_cpp_code(param_set, num_of_samples, num_of_inputs, perfNumbers = False, gates = None):
+    request = noise_worker.make_request(param_set, num_of_samples, num_of_inputs)
+    if gates is not None:
+        print("noise sampling request: " + json.dumps(request) + " gates: " + ",".join(gates))
+        results = []
+        for gate, (moments, info) in zip(gates, measure_noise_gates(request, gates, num_of_samples)):
+            if get_noise_model() is not None:
+                get_noise_model().record(noise_worker.make_gate_request(request, gate), moments.stdev(), moments.count)
+            results.append((moments.stdev(), noise_worker.get_performance(info)) if perfNumbers else moments.stdev())
+        return results
+
+    print("noise sampling request: " + json.dumps(request))
+
+    # compute stddev of the noise samples
+    moments, info = measure_noise(request, num_of_samples)
+    if get_noise_model() is not None:
+        get_noise_model().record(request, moments.stdev(), moments.count)
 
     if perfNumbers:
-        return stdev(noise), get_performance("out_file_" + filenamerandom)
+        return moments.stdev(), noise_worker.get_performance(info)
     else:
-        return stdev(noise)
-
-def get_performance(filename):
-    # stdparams.performanceNumbers(bootstrapKeySize, keyswitchKeySize, ciphertextSize, bootstrapKeygenTime, evalbingateTime)
-    perf = {}
-    with open(filename) as file:
-        for line in file:
-            s1 = line.split(":")
-            ### need python 3.10 or higher to use match instead of ifelse
-            if (s1[0] == "BootstrappingKeySize"):
-                perf.update({"BootstrappingKeySize": s1[1] + " bytes"})
-            elif(s1[0] == "KeySwitchingKeySize"):
-                perf.update({"KeySwitchingKeySize": s1[1] + " bytes"})
-            elif(s1[0] == "CiphertextSize"):
-                perf.update({"CiphertextSize": s1[1] + " bytes"})
-            elif(s1[0] == "BootstrapKeyGenTime"):
-                perf.update({"BootstrapKeyGenTime": s1[1]})
-            elif(s1[0] == "EvalBinGateTime"):
-                perf.update({"EvalBinGateTime": s1[1]})
-
-    return perf
+        return moments.stdev()
+
+# index of solved searches for warm-starting the searches of neighboring configurations (see search_index.py), off
+# unless enabled or OPENFHE_WARM_START=1
+def configure_search_index(cache_dir = None, enabled = True):
+    global SEARCH_INDEX
+    SEARCH_INDEX = search_index.SearchIndex(cache_dir) if enabled else False
+    return SEARCH_INDEX or None
+
+def get_search_index():
+    if SEARCH_INDEX is None:
+        configure_search_index(enabled=(os.environ.get("OPENFHE_WARM_START", "0") != "0"))
+    return SEARCH_INDEX or None
+
+# number of noise comparisons of the searches in this process so far (replayed, predicted or measured)
+def get_probe_count():
+    return PROBES
+
+# journal of finished jobs and noise comparisons (see journal.py), resume replays an existing journal and overwrite
+# starts a new one in its place
+def configure_journal(path, resume = False, overwrite = False):
+    global JOURNAL
+    JOURNAL = journal.Journal(path, resume, overwrite) if path is not None else None
+    return JOURNAL
+
+def get_journal():
+    return JOURNAL
+
+# like get_noise_from_cpp_code, but only takes as many samples as needed to tell whether the noise stddev is above or
+# below target_noise_level (see compare_noise); returns the stddev estimate and the performance numbers
+# when the noise model predicts a stddev far from the target no samples are taken and the performance numbers are None
+@profiler.profiled
+def compare_noise_from_cpp_code(param_set, num_of_samples, num_of_inputs, target_noise_level):
+    global PROBES
+    PROBES += 1
+    request = noise_worker.make_request(param_set, num_of_samples, num_of_inputs)
+    # the keys grow with n, so a search that probes a too large n can only return it if no smaller n reaches the
+    # target; such a probe is reported below the target without generating its keys and search_n rejects the result.
+    # The answer depends on the limit of this run, so it is neither replayed from nor recorded in the journal
+    if exceeds_max_key_size(request):
+        profiler.get_profiler().count("key size model rejections")
+        print("key size model: " + str(key_size_model.get_eval_key_size(request)) + " bytes of evaluation keys above the limit, not sampled")
+        return 0, None
+
+    if JOURNAL is not None:
+        replayed = JOURNAL.lookup_probe(request, target_noise_level)
+        if replayed is not None:
+            profiler.get_profiler().count("journal replays")
+            print("journal replay: noise " + str(replayed[0]))
+            return replayed
+
+    noise, perf = compare_noise_with_model(request, num_of_samples, target_noise_level)
+    if JOURNAL is not None:
+        JOURNAL.record_probe(request, target_noise_level, noise, perf)
+    return noise, perf
+
+# limit in bytes on the evaluation keys (bootstrapping and key switching key, see key_size_model) of the parameter sets
+# a search may return, None for no limit
+def configure_max_key_size(max_key_size = None):
+    global MAX_KEY_SIZE
+    MAX_KEY_SIZE = max_key_size
+
+# True if the evaluation keys of a sampler request are larger than the configured limit
+def exceeds_max_key_size(request):
+    if MAX_KEY_SIZE is None:
+        return False
+    key_size = key_size_model.get_eval_key_size(request)
+    return (key_size is not None) and (key_size > MAX_KEY_SIZE)
+
+def compare_noise_with_model(request, num_of_samples, target_noise_level):
+    model = get_noise_model()
+    if model is not None:
+        predicted = model.decide(request, target_noise_level)
+        if predicted is not None:
+            profiler.get_profiler().count("noise model predictions")
+            print("noise model prediction: " + str(predicted) + ", noise " + ("above" if predicted > target_noise_level else "below") + " target")
+            return predicted, None
+
+    print("noise sampling request: " + json.dumps(request))
+
+    moments, info, above = compare_noise(request, target_noise_level, num_of_samples)
+    print("noise samples used: " + str(moments.count) + " of " + str(num_of_samples) + ", noise " + ("above" if above else "below") + " target")
+    if model is not None:
+        model.record(request, moments.stdev(), moments.count)
+
+    return moments.stdev(), noise_worker.get_performance(info)
 
 def get_decryption_failure(noise_stddev, ptmod, ctmod, comp):
     num = ctmod/(2*ptmod)
@@ -193,6 +607,7 @@ def get_target_noise(decryption_failure, ptmod, ctmod, comp):
     num = ctmod/(2*ptmod)
     denom = sqrt(2*comp)
 
+    from scipy.special import erfcinv
     val = erfcinv(2**decryption_failure)
     target_noise = num/(denom*val)
     return target_noise
@@ -214,14 +629,3 @@ def test_range(val, low, hi):
     else:
         msg = f"input not in valid range ({low} - {hi})"
         raise Exception(msg)
-
-def rm_out_files(prefix):
-    try:
-        for filename in os.listdir(os.getcwd()):
-            if filename.startswith(prefix):
-                file_path = os.path.join(os.getcwd(), filename)
-                if os.path.isfile(file_path):
-                    os.remove(file_path)
-        print(prefix + " Cleanup completed.")
-    except OSError as e:
-        print(f"Error: {e}")
@@ -7,17 +7,29 @@ usage (1): With -p ALL to calculate noise std deviation and probability of failu
 usage (2): With a specific p and any of {t, I, i} arguments.
     > python3 scripts/paramsestimator/binfhe_params_validator.py -p STD128_4_LMKCDEY -t 3 -I 4 -i 1000
 
+usage (1b): The same on 8 worker processes, each pinned to its own core with OMP_NUM_THREADS=1.
+    > python3 scripts/paramsestimator/binfhe_params_validator.py -p ALL -j 8
+
+usage (2b): With -G to measure several gates with one set of keys.
+    > python3 scripts/paramsestimator/binfhe_params_validator.py -p STD128 -G OR,NAND,XOR,AND3 -i 1000
+
+usage (2c): With --benchmark for the latencies of KeyGen, BTKeyGen, Encrypt, EvalBinGate and Decrypt instead of the noise.
+    > python3 scripts/paramsestimator/binfhe_params_validator.py -p STD128 -G OR,AND3 -i 1000 --benchmark
+
 usage (3): With no p argument and the output of the binfhe_params.py script.
     > python3 scripts/paramsestimator/binfhe_params_validator.py -n 518 -N 2048 -q 2048 -Q 54 -k 16384 -g 134217728 -r 32 -b 32 -s 3.19 -t 1 -d 1 -I 2 -i 200
 '''
 
+from concurrent.futures import ProcessPoolExecutor
 from math import log2, sqrt, erfc
-from statistics import stdev
 
 import argparse
 import binfhe_params_helper as h
+import json
+import multiprocessing
+import noise_worker
 import os
-import random
+import paramstable
 import sys
 
 PARAM_SETS = [ "TOY", "MEDIUM", "STD128_AP",
@@ -34,48 +46,95 @@ PARAM_SETS = [ "TOY", "MEDIUM", "STD128_AP",
                "SIGNED_MOD_TEST" ]
 BOOT_TECHS = { 1 : "AP", 2 : "GINX", 3 : "LMKCDEY" }
 
-def validator2(param_set, boot_tech, num_input, num_iters):
-    filenamerandom = str(random.randrange(500))
-    bashCommand = ' '.join([ "scripts/run_script2.sh", param_set, str(boot_tech), str(num_input), str(num_iters),
-                             "build", "> out_file_" + filenamerandom, "2> noise_file_" + filenamerandom ])
-    os.system(bashCommand)
-
-    with open("noise_file_" + filenamerandom) as file:
-        noise_stdev = stdev([float(line.rstrip()) for line in file])
-
-    with open("out_file_" + filenamerandom) as file:
-        ofdict = {d[0]: d[1] for d in [line.split(' ', 1) for line in file] if len(d) == 2}
-
-    ctmodq = int(ofdict["ctmodq:"].strip().split(' ')[0])
+# probability of failure and gate time from the noise moments and the sampler response
+def get_failures(moments, info, num_input):
+    ctmodq = int(info["ctmodq"])
     num = ctmodq/(4*num_input)
-    denom = sqrt(2*num_input)*noise_stdev
+    denom = sqrt(2*num_input)*moments.stdev()
     val = erfc(num/denom)
     failures = 0 if (val == 0) else log2(val)
-    gtime = int(ofdict["EvalBinGateTime:"].strip().split(' ')[0])
-
-    print((param_set, BOOT_TECHS[boot_tech], num_input, num_iters), (noise_stdev, failures, str(gtime) + 'ms'))
-
-def validator(dim_n, mod_q, dim_N, mod_logQ, mod_Qks, B_g, B_ks, B_rk, sigma, num_iters, secret_dist, boot_tech, num_input):
-    filenamerandom = str(random.randrange(500))
-    bashCommand = ' '.join([ "scripts/run_script.sh", str(dim_n), str(mod_q), str(dim_N), str(mod_logQ), str(mod_Qks), str(B_g),
-                             str(B_ks), str(B_rk), str(sigma), str(num_iters), str(secret_dist), str(boot_tech), str(num_input),
-                             "build", "> out_file_" + filenamerandom, "2> noise_file_" + filenamerandom ])
-    os.system(bashCommand)
-
-    with open("noise_file_" + filenamerandom) as file:
-        noise_stdev = stdev([float(line.rstrip()) for line in file])
-
-    with open("out_file_" + filenamerandom) as file:
-        ofdict = {d[0]: d[1] for d in [line.split(' ', 1) for line in file] if len(d) == 2}
-
-    ctmodq = int(ofdict["ctmodq:"].strip().split(' ')[0])
-    num = ctmodq/(4*num_input)
-    denom = sqrt(2*num_input)*noise_stdev
-    val = erfc(num/denom)
-    failures = 0 if (val == 0) else log2(val)
-    gtime = int(ofdict["EvalBinGateTime:"].strip().split(' ')[0])
-
-    print(bashCommand, (noise_stdev, failures, str(gtime) + 'ms'))
+    gtime = round(float(info["EvalBinGateTime"]), 3)
+    return failures, gtime
+
+# bootstrapping technique and gate arity of a named parameter set, default_num_input unless the name has one
+def get_named_args(param_set, default_num_input):
+    p = param_set.split('_')
+    boot_tech = 1 if (p[-1] == "AP") else 3 if (p[-1] == "LMKCDEY") else 2
+    num_input = default_num_input
+    if (len(p) >= 2) and (p[1] in ('3', '4')):
+        num_input = int(p[1])
+    return boot_tech, num_input
+
+# one result row per gate; without gates the OR gate with num_input inputs is measured
+def validate_named(param_set, boot_tech, num_input, num_iters, gates = None):
+    request = noise_worker.make_named_request(param_set, boot_tech, num_input, num_iters)
+    if gates is None:
+        moments, info = h.measure_noise(request, num_iters)
+        failures, gtime = get_failures(moments, info, num_input)
+        return [((param_set, BOOT_TECHS[boot_tech], num_input, num_iters), (moments.stdev(), failures, str(gtime) + 'ms'))]
+
+    rows = []
+    for gate, (moments, info) in zip(gates, h.measure_noise_gates(request, gates, num_iters)):
+        failures, gtime = get_failures(moments, info, noise_worker.GATES[gate])
+        rows.append(((param_set, BOOT_TECHS[boot_tech], noise_worker.GATES[gate], num_iters, gate), (moments.stdev(), failures, str(gtime) + 'ms')))
+    return rows
+
+def validator2(param_set, boot_tech, num_input, num_iters, gates = None):
+    for row in validate_named(param_set, boot_tech, num_input, num_iters, gates):
+        print(*row)
+
+# per-operation latency table from the benchmark mode of the sampler, in microseconds
+def print_benchmark(request, num_warmup_runs):
+    response = h.get_noise_worker().request(noise_worker.make_benchmark_request(request, num_warmup_runs))
+    rows = [("KeyGen", response["KeyGen"]), ("BTKeyGen", response["BTKeyGen"])]
+    for gate in response["Gates"]:
+        rows += [(op + " " + gate["Gate"], gate[op]) for op in ("Encrypt", "EvalBinGate", "Decrypt")]
+
+    print(("OPERATION", "COUNT"), ("mean_us", "stddev_us", "p50_us", "p90_us", "p99_us"))
+    for name, stats in rows:
+        print((name, stats["count"]), tuple(round(stats[k]/1000, 1) for k in ("mean_ns", "stddev_ns", "p50_ns", "p90_ns", "p99_ns")))
+
+# runs in every worker process before its first parameter set: the process takes a free core and pins itself to it
+# (where the platform supports it), the sampler it spawns inherits the affinity and OMP_NUM_THREADS=1, so its
+# EvalBinGateTime is a single-core number
+def _pin_worker(cores):
+    core = cores.get()
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, {core})
+    os.environ["OMP_NUM_THREADS"] = "1"
+
+def _validate_named(args):
+    return validate_named(*args)
+
+# validates the named parameter sets on jobs processes and returns the results sorted by bootstrapping technique and name
+def validate_all(param_sets, default_num_input, num_iters, jobs, gates = None):
+    args = [(param_set,) + get_named_args(param_set, default_num_input) + (num_iters, gates) for param_set in param_sets]
+    # every worker takes one core in _pin_worker, so there are never more workers than cores
+    available = h.get_available_cores()[:jobs]
+    jobs = len(available)
+    cores = multiprocessing.Queue()
+    for core in available:
+        cores.put(core)
+    results = []
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_pin_worker, initargs=(cores,)) as executor:
+        # one parameter set per task, so that a worker which finishes early takes the next one
+        for done, rows in enumerate(executor.map(_validate_named, args), 1):
+            print("done " + rows[0][0][0] + " (" + str(done) + "/" + str(len(args)) + ")", file=sys.stderr)
+            results += rows
+    return sorted(results, key=lambda result: (result[0][1], result[0][0]))
+
+def validator(dim_n, mod_q, dim_N, mod_logQ, mod_Qks, B_g, B_ks, B_rk, sigma, num_iters, secret_dist, boot_tech, num_input, gates = None):
+    param_set = paramstable.paramsetvars(dim_n, mod_q, dim_N, mod_logQ, mod_Qks, B_g, B_ks, B_rk, sigma, secret_dist, boot_tech)
+    request = noise_worker.make_request(param_set, num_iters, num_input)
+    if gates is None:
+        moments, info = h.measure_noise(request, num_iters)
+        failures, gtime = get_failures(moments, info, num_input)
+        print(json.dumps(request), (moments.stdev(), failures, str(gtime) + 'ms'))
+        return
+
+    for gate, (moments, info) in zip(gates, h.measure_noise_gates(request, gates, num_iters)):
+        failures, gtime = get_failures(moments, info, noise_worker.GATES[gate])
+        print(json.dumps(noise_worker.make_gate_request(request, gate)), (moments.stdev(), failures, str(gtime) + 'ms'))
 
 
 if __name__ == '__main__':
@@ -85,6 +144,7 @@ if __name__ == '__main__':
     parser.add_argument('-p', '--param_set', action='store', choices=PARAM_SETS + ["ALL"], default=None)
     parser.add_argument('-t', '--boot_tech', action='store', choices=(1, 2, 3), default=2, type=int)
     parser.add_argument('-I', '--num_input', action='store', choices=(2, 3, 4), default=2, type=int)
+    parser.add_argument('-G', '--gates', action='store', default=None, help='comma-separated gates to measure with one set of keys instead of the OR gate of -I inputs, any of ' + ','.join(noise_worker.GATES))
     parser.add_argument('-i', '--num_iters', action='store', default=500, type=int)
     parser.add_argument('-n', '--dim_n', action='store', type=int)
     parser.add_argument('-N', '--dim_N', action='store', type=int)
@@ -96,26 +156,58 @@ if __name__ == '__main__':
     parser.add_argument('-r', '--B_rk', action='store', default=64, type=int)
     parser.add_argument('-s', '--sigma', action='store', default=3.19, type=float)
     parser.add_argument('-d', '--secret_dist', choices=(0, 1), action='store', default=1, type=int)
+    parser.add_argument('--benchmark', action='store_true', help='print the latencies of the operations over num_iters runs instead of the noise')
+    parser.add_argument('-w', '--num_warmup', action='store', default=5, type=int, help='number of untimed warmup runs with --benchmark')
+    parser.add_argument('--cache_dir', action='store', default=None, help='directory of the persistent noise cache')
+    parser.add_argument('--cache', action='store_true', help='reuse and top up the samples of the persistent noise cache; the timings and key sizes of a cached parameter set are those of its last measurement')
+    parser.add_argument('--sampling_threads', action='store', default=1, type=int, help='number of threads the noise sampler uses for bootstrapping')
+    parser.add_argument('--key_cache_size', action='store', default=1, type=int, help='number of parameter sets whose keys a noise sampler process keeps in memory')
+    parser.add_argument('--build_dir', action='store', default=None, help='build directory with bin/boolean_noise_estimate_script (default: build at the top of the repository)')
+    parser.add_argument('--key_dir', action='store', default=None, help='directory to save the keys of the noise sampler in and load them from')
+    parser.add_argument('-j', '--jobs', action='store', default=1, type=int, help='with -p ALL, number of worker processes, each pinned to its own core')
 
     a = parser.parse_args()
 
-    if (a.param_set):
-        print(("PARAM_SET", "BOOT_TECH", "NUM_INPUTS", "NUM_ITERS"), ("noise_stdev", "failure_rate", "EvalBinGateTime"))
+    gates = a.gates.split(',') if a.gates else None
+    if (gates is not None) and not set(gates) <= set(noise_worker.GATES):
+        parser.error("unknown gate in " + a.gates)
+
+    jobs = min(a.jobs, len(h.get_available_cores())) if (a.jobs > 1) else 1
+    if (a.param_set == "ALL") and (jobs > 1) and (a.sampling_threads > 1):
+        print("--jobs pins every worker to one core, ignoring --sampling_threads")
+        a.sampling_threads = 1
+
+    # a validation measures afresh unless asked otherwise
+    h.configure_noise_cache(a.cache_dir, a.cache)
+    h.configure_noise_worker(a.sampling_threads, a.key_cache_size, a.key_dir, a.build_dir)
+
+    if (a.benchmark):
+        if (a.param_set == "ALL"):
+            parser.error("--benchmark needs a single parameter set")
+        if (a.param_set):
+            request = noise_worker.make_named_request(a.param_set, a.boot_tech, a.num_input, a.num_iters)
+        else:
+            param_set = paramstable.paramsetvars(a.dim_n, a.mod_q, a.dim_N, a.mod_logQ, a.mod_Qks, a.B_g, a.B_ks, a.B_rk, a.sigma, a.secret_dist, a.boot_tech)
+            request = noise_worker.make_request(param_set, a.num_iters, a.num_input)
+        if gates is not None:
+            request["gates"] = ",".join(gates)
+        print_benchmark(request, a.num_warmup)
+    elif (a.param_set):
+        print(("PARAM_SET", "BOOT_TECH", "NUM_INPUTS", "NUM_ITERS") + (("GATE",) if gates else ()), ("noise_stdev", "failure_rate", "EvalBinGateTime"))
         if (a.param_set in PARAM_SETS):
-            validator2(a.param_set, a.boot_tech, a.num_input, a.num_iters)
+            validator2(a.param_set, a.boot_tech, a.num_input, a.num_iters, gates)
+        elif (a.param_set == "ALL") and (jobs > 1):
+            for result in validate_all(PARAM_SETS, a.num_input, a.num_iters, jobs, gates):
+                print(*result)
         elif (a.param_set == "ALL"):
             for param_set in PARAM_SETS:
-                p = param_set.split('_')
-                boot_tech = 1 if (p[-1] == "AP") else 3 if (p[-1] == "LMKCDEY") else 2
-                num_input = a.num_input
-                if (len(p) >= 2) and (p[1] in ('3', '4')):
-                    num_input = int(p[1])
-                validator2(param_set, boot_tech, num_input, a.num_iters)
+                boot_tech, num_input = get_named_args(param_set, a.num_input)
+                validator2(param_set, boot_tech, num_input, a.num_iters, gates)
         else:
             print("Invalid Args")
             print(sys.argv)
     else:
-        validator(a.dim_n, a.mod_q, a.dim_N, a.mod_logQ, a.mod_Qks, a.B_g, a.B_ks, a.B_rk, a.sigma, a.num_iters, a.secret_dist, a.boot_tech, a.num_input)
+        validator(a.dim_n, a.mod_q, a.dim_N, a.mod_logQ, a.mod_Qks, a.B_g, a.B_ks, a.B_rk, a.sigma, a.num_iters, a.secret_dist, a.boot_tech, a.num_input, gates)
 
-    h.rm_out_files("out_file_")
-    h.rm_out_files("noise_file_")
+    if h.get_noise_cache() is not None:
+        print(h.get_noise_cache().stats())
@@ -0,0 +1,99 @@
+#!/usr/bin/python
+
+'''
+Persistent memoization of lattice-estimator results.
+
+Every attack cost computed by binfhe_params_helper.call_estimator is stored in an SQLite database
+keyed by a hash of the LWE parameters, the reduction cost model, the attack and the estimator
+version, so repeated and resumed runs do not pay for the same estimate twice. The database is
+capped at max_entries rows; the least recently used rows are evicted first.
+
+The location and size cap default to $OPENFHE_ESTIMATOR_CACHE_DIR and $OPENFHE_ESTIMATOR_CACHE_SIZE.
+'''
+
+from math import log2
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "openfhe-lattice-estimator")
+DEFAULT_MAX_ENTRIES = 200000
+CACHE_FILE = "estimator_cache.sqlite"
+
+# a failed estimate (the estimator raised for these parameters) is stored as NULL
+FAILED = None
+
+def normalize_mod(mod):
+    # the modulus is passed around both as int and as float (e.g. mod/2), use one representation for the key
+    if (float(mod) == int(mod)):
+        return int(mod)
+    return float(mod)
+
+def make_key(dim, mod, secret_dist, cost_model, attack, version):
+    fields = {"n": int(dim), "q": normalize_mod(mod), "Xs": secret_dist, "Xe": 3.19,
+              "cost_model": cost_model, "attack": attack, "version": version}
+    return hashlib.sha256(json.dumps(fields, sort_keys=True).encode()).hexdigest()
+
+class EstimatorCache:
+    def __init__(self, cache_dir = None, max_entries = None):
+        if cache_dir is None:
+            cache_dir = os.environ.get("OPENFHE_ESTIMATOR_CACHE_DIR", DEFAULT_CACHE_DIR)
+        if max_entries is None:
+            max_entries = int(os.environ.get("OPENFHE_ESTIMATOR_CACHE_SIZE", DEFAULT_MAX_ENTRIES))
+        self.cache_dir = cache_dir
+        self.path = os.path.join(cache_dir, CACHE_FILE)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+        self._pid = None
+
+    def _connect(self):
+        # sqlite connections must not be shared with forked children, reconnect in every process
+        if (self._conn is None) or (self._pid != os.getpid()):
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""CREATE TABLE IF NOT EXISTS results (
+                                      key TEXT PRIMARY KEY,
+                                      dim INTEGER, logmod REAL, secret_dist TEXT, cost_model TEXT,
+                                      attack TEXT, version TEXT, value INTEGER, last_used REAL)""")
+            self._pid = os.getpid()
+        return self._conn
+
+    # returns {attack: value} for the attacks that are cached (FAILED for failed estimates), missing attacks are left out
+    def lookup(self, dim, mod, secret_dist, cost_model, attacks, version):
+        conn = self._connect()
+        keys = {make_key(dim, mod, secret_dist, cost_model, attack, version): attack for attack in attacks}
+        rows = conn.execute("SELECT key, value FROM results WHERE key IN (" + ','.join('?'*len(keys)) + ")", tuple(keys)).fetchall()
+        if rows:
+            conn.execute("UPDATE results SET last_used = ? WHERE key IN (" + ','.join('?'*len(rows)) + ")", (time.time(),) + tuple(k for k, v in rows))
+        return {keys[k]: v for k, v in rows}
+
+    def store(self, dim, mod, secret_dist, cost_model, values, version):
+        conn = self._connect()
+        now = time.time()
+        conn.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                         [(make_key(dim, mod, secret_dist, cost_model, attack, version), int(dim), log2(mod),
+                           secret_dist, cost_model, attack, version, value, now) for attack, value in values.items()])
+        self._evict()
+
+    def _evict(self):
+        conn = self._connect()
+        count = conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        if (count > self.max_entries):
+            conn.execute("DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY last_used LIMIT ?)",
+                         (count - self.max_entries,))
+
+    # (dim, log2(mod), secret_dist, cost_model, attack, version, value) of every cached result
+    def results(self):
+        return self._connect().execute("SELECT dim, logmod, secret_dist, cost_model, attack, version, value FROM results").fetchall()
+
+    def clear(self):
+        self._connect().execute("DELETE FROM results")
+
+    def stats(self):
+        return "estimator cache (" + self.path + "): " + str(self.hits) + " hits, " + str(self.misses) + " misses"
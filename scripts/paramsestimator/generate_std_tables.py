@@ -5,11 +5,27 @@
 2) Pick security level
 3) Set number of threads for the lattice-estimator
 4) (optional) specific lattice dimension
+
+usage (1): Without arguments then answer the prompts.
+    > python3 scripts/paramsestimator/generate_std_tables.py
+
+usage (2): With arguments for the batch mode, which sweeps all security levels x secret distributions x ring dimensions
+on a process pool and writes the max log Q table to one JSON file.
+    > python3 scripts/paramsestimator/generate_std_tables.py -j 16 -o std_tables.json
 '''
 
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import product
+from math import log2, floor, sqrt, ceil
+
+import argparse
+import json
+import os
 import paramstable as stdparams
 import binfhe_params_helper as helperfncs
-from math import log2, floor, sqrt, ceil
+import sys
+
+RING_DIMS = (512, 1024, 2048, 4096, 8192, 16384, 32768, 65536)
 
 def parameter_selector():
     print("Generate standard parameter tables for different security levels")
@@ -45,26 +61,79 @@ def parameter_selector():
         secret_dist_des = "ternary"
 
     #set ptmod based on num of inputs
-    dimlist = []
-    modlist = []
+    results = []
     if (ring_dim == 0):
-        for i in [512, 1024, 2048, 4096, 8192, 16384, 32768, 65536]:
-            dim, mod = generate_dim_mod(exp_sec_level, i, secret_dist_des, num_threads, True, is_quantum)
+        for i in RING_DIMS:
+            results.append(generate_dim_mod(exp_sec_level, i, secret_dist_des, num_threads, True, is_quantum))
     else:
-        dim, mod = generate_dim_mod(exp_sec_level, ring_dim, secret_dist_des, num_threads, is_dim_pow2, is_quantum)
+        results.append(generate_dim_mod(exp_sec_level, ring_dim, secret_dist_des, num_threads, is_dim_pow2, is_quantum))
 
-    if ((dim == 0) or (mod == 0)):
-        print("initial lattice dimension too small to run the estimator for this security level, increasing initial value")
-    else:
-        print("Dimension N: ", dim)
-        print("Modulus Q bits: ", log2(mod))
+    for dim, mod in results:
+        if ((dim == 0) or (mod == 0)):
+            print("initial lattice dimension too small to run the estimator for this security level, increasing initial value")
+        else:
+            print("Dimension N: ", dim)
+            print("Modulus Q bits: ", log2(mod))
 
 def generate_dim_mod(exp_sec_level, ringdim, secret_dist, num_threads, is_dim_pow2, is_quantum):
-    logmod = helperfncs.get_mod(ringdim, exp_sec_level) #find analytical estimate for starting point of Qks
+    logmod = helperfncs.get_mod(ringdim, exp_sec_level, secret_dist) #find analytical estimate for starting point of Qks
 
     #check security by running the estimator and adjust modulus if needed
     dim, mod = helperfncs.optimize_params_security(stdparams.paramlinear[exp_sec_level][0], ringdim, 2**logmod, secret_dist, num_threads, False, True, is_dim_pow2, is_quantum)
 
     return dim, mod
 
-parameter_selector()
+# max log2 Q of one (security level, secret distribution, ring dimension), None if the estimator finds no secure modulus
+def _sweep_point(point):
+    exp_sec_level, secret_dist, ring_dim, num_threads = point
+    dim, mod = generate_dim_mod(exp_sec_level, ring_dim, secret_dist, num_threads, True, exp_sec_level[-1] == "Q")
+    return int(log2(mod)) if ((dim != 0) and (mod != 0)) else None
+
+# {sec_level: {secret_dist: {N: max log2 Q}}} for all combinations, computed on jobs processes that each run the
+# lattice-estimator with num_threads jobs; the estimator cache is shared by all processes
+def generate_tables(sec_levels, secret_dists, ring_dims, num_threads, jobs):
+    points = [(sl, sd, N, num_threads) for sl, sd, N in product(sec_levels, secret_dists, ring_dims)]
+    print("estimating " + str(len(points)) + " table entries on " + str(jobs) + " processes", file=sys.stderr)
+
+    tables = {sl: {sd: {} for sd in secret_dists} for sl in sec_levels}
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(_sweep_point, point): point for point in points}
+        for done, future in enumerate(as_completed(futures), 1):
+            sl, sd, N, _ = futures[future]
+            tables[sl][sd][N] = future.result()
+            print("[" + str(done) + "/" + str(len(points)) + "] " + sl + " " + sd + " N = " + str(N) + ": log Q = " + str(tables[sl][sd][N]), file=sys.stderr)
+
+    # entries in the order of the arguments, not in the order they finished
+    return {sl: {sd: {N: tables[sl][sd][N] for N in ring_dims} for sd in secret_dists} for sl in sec_levels}
+
+# writes the tables with the version of the lattice-estimator that computed them; the file is renamed into place, so a
+# reader never sees a partial table
+def write_tables(path, tables):
+    with open(path + ".tmp", "w") as f:
+        json.dump({"estimator_version": helperfncs.get_estimator_version(), "max_logQ": tables}, f, indent=1)
+    os.replace(path + ".tmp", path)
+    print("wrote " + path, file=sys.stderr)
+
+if __name__ == '__main__':
+    if (len(sys.argv) == 1):
+        parameter_selector()
+    else:
+        parser = argparse.ArgumentParser(prog='generate_std_tables', description='Max log Q for every security level, secret distribution and ring dimension')
+        parser.add_argument('-p', '--sec_levels', action='store', nargs='+', choices=tuple(stdparams.paramlinear), default=list(stdparams.paramlinear))
+        parser.add_argument('-d', '--secret_dists', action='store', nargs='+', choices=('error', 'ternary'), default=['error', 'ternary'])
+        parser.add_argument('-N', '--ring_dims', action='store', nargs='+', default=list(RING_DIMS), type=int)
+        parser.add_argument('-n', '--num_threads', action='store', default=1, type=int, help='lattice-estimator jobs per process')
+        parser.add_argument('-j', '--jobs', action='store', default=None, type=int, help='number of processes (default: number of cores / num_threads)')
+        parser.add_argument('-o', '--output', action='store', default='std_tables.json')
+        parser.add_argument('--eager_estimator', action='store_true', help='always evaluate all attacks (on num_threads jobs) instead of stopping at the first one below the security level')
+        parser.add_argument('--cache_dir', action='store', default=None, help='directory of the persistent estimator cache')
+        parser.add_argument('--no_cache', action='store_true', help='always run the lattice-estimator')
+        parser.add_argument('--grid_dir', action='store', default=None, help='directory of the security grids built by security_grid.py (default: the cache directory)')
+        parser.add_argument('--no_grid', action='store_true', help='always run the lattice-estimator instead of answering from a security grid')
+        a = parser.parse_args()
+
+        helperfncs.configure_estimator(not a.eager_estimator)
+        helperfncs.configure_security_grid(a.grid_dir or a.cache_dir, enabled=not a.no_grid)
+        helperfncs.configure_estimator_cache(a.cache_dir, None, not a.no_cache)
+        jobs = a.jobs or max(1, len(helperfncs.get_available_cores())//a.num_threads)
+        write_tables(a.output, generate_tables(a.sec_levels, a.secret_dists, a.ring_dims, a.num_threads, jobs))
@@ -0,0 +1,110 @@
+#!/usr/bin/python
+
+'''
+Process pool scheduler for independent parameter searches (d_g iterations, --all combinations).
+
+A job is a (function, args) tuple of a picklable module level function. With more than one worker every job
+gets its own scratch directory (get_scratch_dir, deleted when the job ends) and runs with its stdout captured,
+and the captured output is printed in the order of the jobs, so the output of a parallel run reads exactly
+like the output of a sequential one. The lattice-estimator cache is an SQLite database shared by all workers.
+The spans and counters of the profiler (see profiler.py) of a job are merged into the profiler of this process.
+
+With a journal (see journal.py) the output of every finished job is recorded, and jobs that finished in an earlier
+run print their recorded output instead of running again.
+'''
+
+from concurrent.futures import ProcessPoolExecutor
+
+import contextlib
+import io
+import journal as jrnl
+import profiler
+import shutil
+import sys
+import tempfile
+
+SCRATCH_DIR = None
+
+# writes to stdout and keeps a copy of the output
+class _Tee(io.StringIO):
+    def __init__(self, stream):
+        super().__init__()
+        self.stream = stream
+
+    def write(self, s):
+        self.stream.write(s)
+        return super().write(s)
+
+    def flush(self):
+        self.stream.flush()
+
+# scratch directory of the running job in a worker process, None outside of a job; for files of the job only, anything
+# that outlives the job (such as the pool of sampler processes of the worker) must keep its files elsewhere
+def get_scratch_dir():
+    return SCRATCH_DIR
+
+# returns the output of the job, the exception it failed with (None if it finished), its return value and its profiler stats
+def _run_job(index, fn, args, scratch_root):
+    global SCRATCH_DIR
+    SCRATCH_DIR = tempfile.mkdtemp(prefix="job_" + str(index) + "_", dir=scratch_root)
+    # a forked worker starts with a copy of the spans of this process
+    profiler.get_profiler().drain()
+    out = io.StringIO()
+    result = None
+    error = None
+    try:
+        with contextlib.redirect_stdout(out):
+            result = fn(*args)
+    except Exception as e:
+        print("job " + str(index) + " failed: " + repr(e), file=out)
+        error = e
+    finally:
+        shutil.rmtree(SCRATCH_DIR, ignore_errors=True)
+        SCRATCH_DIR = None
+    return out.getvalue(), error, result, profiler.get_profiler().drain()
+
+# run jobs on num_jobs worker processes, with num_jobs <= 1 the jobs run in this process with live output;
+# returns the return values of the jobs, None for the jobs that print their recorded output.
+# A failed job raises its exception with num_jobs <= 1; with more workers the other jobs still run and the failure is
+# printed with the output of the job, and with raise_errors = True the exception of the first failed job is raised
+# once all jobs are done
+def run_jobs(jobs, num_jobs = 1, scratch_root = None, journal = None, raise_errors = False):
+    keys = [jrnl.job_key(fn, args) for fn, args in jobs]
+    done = [journal.finished_job(key) if journal is not None else None for key in keys]
+
+    results = [None]*len(jobs)
+    if (num_jobs <= 1):
+        for i, (key, output, (fn, args)) in enumerate(zip(keys, done, jobs)):
+            if output is not None:
+                sys.stdout.write(output)
+            elif journal is None:
+                results[i] = fn(*args)
+            else:
+                out = _Tee(sys.stdout)
+                with contextlib.redirect_stdout(out):
+                    results[i] = fn(*args)
+                journal.record_job(key, out.getvalue())
+        return results
+
+    errors = []
+    scratch = tempfile.mkdtemp(prefix="binfhe_params_", dir=scratch_root)
+    try:
+        with ProcessPoolExecutor(max_workers=num_jobs) as executor:
+            futures = [executor.submit(_run_job, i, fn, args, scratch) if output is None else None
+                       for i, (output, (fn, args)) in enumerate(zip(done, jobs))]
+            # print every job as soon as it and all jobs before it are done
+            for i, (key, output, future) in enumerate(zip(keys, done, futures)):
+                if future is not None:
+                    output, error, results[i], stats = future.result()
+                    profiler.get_profiler().merge(stats)
+                    if error is not None:
+                        errors.append(error)
+                    elif journal is not None:
+                        journal.record_job(key, output)
+                sys.stdout.write(output)
+                sys.stdout.flush()
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    if raise_errors and errors:
+        raise errors[0]
+    return results
@@ -0,0 +1,82 @@
+#!/usr/bin/python
+
+'''
+Append-only journal of a parameter search, for resuming interrupted runs.
+
+Every line is one JSON object:
+    {"type": "job", "job": <job key>, "output": <everything the job printed>}
+        a finished job of the job scheduler (an input parameter header, a d_g search, an --all separator)
+    {"type": "probe", "request": <sampler request>, "target": <target noise>, "noise": <stddev>, "perf": <perf or null>}
+        a noise comparison of binary_search_n/find_opt_n (perf is null when the noise model decided it)
+
+With resume the journal is replayed: finished jobs print their recorded output instead of running, and the probes
+of unfinished searches return their recorded result, so a search walks its recorded probes again without any
+bootstraps (estimates come from the estimator cache) and continues from its last bracket. Lines are appended with a
+single write and fsynced; a line cut off by a crash is ignored. Without resume a new journal is started, but an
+existing non-empty journal is only overwritten with overwrite = True.
+'''
+
+import json
+import os
+
+def job_key(fn, args):
+    return fn.__name__ + json.dumps(args)
+
+def probe_key(request, target_noise_level):
+    return json.dumps({"request": request, "target": target_noise_level}, sort_keys=True)
+
+class Journal:
+    def __init__(self, path, resume = False, overwrite = False):
+        self.path = path
+        self.jobs = {}
+        self.probes = {}
+        self.replayed = 0
+        self._fd = None
+        self._pid = None
+        if resume and os.path.isfile(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if (entry["type"] == "job"):
+                        self.jobs[entry["job"]] = entry["output"]
+                    elif (entry["type"] == "probe"):
+                        self.probes[probe_key(entry["request"], entry["target"])] = entry
+        else:
+            if (not overwrite) and os.path.isfile(path) and (os.path.getsize(path) > 0):
+                raise FileExistsError("journal " + path + " already has entries, not overwriting it")
+            open(path, "w").close()
+
+    def _append(self, entry):
+        # forked job processes append through their own descriptor
+        if (self._fd is None) or (self._pid != os.getpid()):
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            self._pid = os.getpid()
+        os.write(self._fd, (json.dumps(entry) + "\n").encode())
+        os.fsync(self._fd)
+
+    # recorded output of a finished job, None if the job has not finished
+    def finished_job(self, key):
+        return self.jobs.get(key)
+
+    def record_job(self, key, output):
+        self.jobs[key] = output
+        self._append({"type": "job", "job": key, "output": output})
+
+    # (noise stddev, perf) of a recorded probe, None if the probe has not been recorded
+    def lookup_probe(self, request, target_noise_level):
+        entry = self.probes.get(probe_key(request, target_noise_level))
+        if entry is None:
+            return None
+        self.replayed += 1
+        return entry["noise"], entry["perf"]
+
+    def record_probe(self, request, target_noise_level, noise, perf):
+        entry = {"type": "probe", "request": request, "target": target_noise_level, "noise": noise, "perf": perf}
+        self.probes[probe_key(request, target_noise_level)] = entry
+        self._append(entry)
+
+    def stats(self):
+        return "journal (" + self.path + "): " + str(len(self.jobs)) + " finished jobs, " + str(self.replayed) + " probes replayed"
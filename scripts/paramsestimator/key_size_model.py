@@ -0,0 +1,55 @@
+#!/usr/bin/python
+
+'''
+Closed-form sizes of the serialized keys and ciphertexts of OpenFHE BinFHE, as reported by the noise sampler
+(BootstrappingKeySize, KeySwitchingKeySize and CiphertextSize of boolean_noise_estimate_script), without key generation.
+
+Every coefficient is serialized as a 64-bit integer:
+    - a ciphertext is an LWE vector of n + 1 coefficients
+    - the key switching key has N*B_ks*d_ks LWE ciphertexts (a vector of n coefficients and one coefficient each)
+    - the bootstrapping key has RGSW ciphertexts of 2*d_g rows with 2 polynomials of N coefficients each: B_rk - 1 per
+      digit of q in base B_rk per key coefficient for AP, 2 per key coefficient for GINX and 1 per key coefficient plus
+      NUM_AUTO_KEYS + 1 automorphism keys (d_g rows of 2 polynomials) for LMKCDEY
+OpenFHE ignores the lowest gadget digit (approximate gadget decomposition), an RGSW ciphertext has
+ceil(logQ/log2(B_g)) - 1 digits. The overheads per vector are fitted to the sizes of the parameter sets in the README;
+the model matches them to within 0.01%.
+'''
+
+from math import ceil, log2
+
+# numAutoKeys of the noise sampler
+NUM_AUTO_KEYS = 10
+# serialization overhead in bytes of a ciphertext, of a polynomial, of an LWE ciphertext of the key switching key and of
+# the key structure of the bootstrapping key
+CIPHERTEXT_OVERHEAD = 37
+POLY_OVERHEAD = 37
+KSK_ENTRY_OVERHEAD = 21.5
+BOOTSTRAPPING_KEY_OVERHEAD = 10000
+
+# serialized sizes in bytes of the keys and of a ciphertext of a sampler request (see make_request in noise_worker),
+# keyed like the performance numbers of the sampler; None for named parameter sets
+def get_key_sizes(request):
+    if ("n" not in request):
+        return None
+    n, q, N = request["n"], request["q"], request["N"]
+    d_g = max(ceil(request["logQ"]/log2(request["B_g"])) - 1, 1)
+    d_ks = ceil(log2(request["Qks"])/log2(request["B_ks"]))
+    B_ks, B_rk = request["B_ks"], request["B_rk"]
+
+    if (request["bootstrapping_tech"] == 1):
+        polys = n*ceil(log2(q)/log2(B_rk))*(B_rk - 1)*4*d_g
+    elif (request["bootstrapping_tech"] == 2):
+        polys = 2*n*4*d_g
+    else:
+        polys = n*4*d_g + (NUM_AUTO_KEYS + 1)*2*d_g
+
+    return {"BootstrappingKeySize": int(polys*(8*N + POLY_OVERHEAD) + BOOTSTRAPPING_KEY_OVERHEAD),
+            "KeySwitchingKeySize": int(N*B_ks*d_ks*(8*(n + 1) + KSK_ENTRY_OVERHEAD) + CIPHERTEXT_OVERHEAD),
+            "CiphertextSize": int(8*(n + 1) + CIPHERTEXT_OVERHEAD)}
+
+# size in bytes of the evaluation keys (bootstrapping and key switching key) of a request, None for named parameter sets
+def get_eval_key_size(request):
+    sizes = get_key_sizes(request)
+    if sizes is None:
+        return None
+    return sizes["BootstrappingKeySize"] + sizes["KeySwitchingKeySize"]
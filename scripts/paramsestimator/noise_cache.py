@@ -0,0 +1,151 @@
+#!/usr/bin/python
+
+'''
+Persistent cache of noise moments for the noise sampler.
+
+For every sampler request (parameter set, named param set, gate arity, bootstrapping technique) the cache keeps
+the number of samples, their mean and the sum of squared deviations (M2), plus the performance numbers of the
+last measurement. When more samples are needed for a known request only the missing ones are generated and
+merged into the stored moments (Chan et al.), so the final 1000-sample measurement of a search and later
+validator runs build on the samples that were already taken.
+
+Entries are keyed by the sampler binary as well (see noise_worker.get_sampler_id): samples and timings taken with
+another build, e.g. before an OpenFHE upgrade, are neither returned nor merged, nor used to calibrate the noise model.
+
+The database lives next to the estimator cache ($OPENFHE_ESTIMATOR_CACHE_DIR).
+'''
+
+from math import sqrt
+
+import estimator_cache
+import hashlib
+import json
+import noise_worker
+import numpy
+import os
+import sqlite3
+import time
+
+CACHE_FILE = "noise_cache.sqlite"
+# version of the table layout and of the meaning of the cached numbers (2: EvalBinGateTime is the time of the gate
+# alone in fractional ms), part of every key; a new version starts an empty table
+FORMAT_VERSION = 2
+TABLE = "moments_v" + str(FORMAT_VERSION)
+
+class NoiseMoments:
+    def __init__(self, count = 0, mean = 0.0, M2 = 0.0):
+        self.count = count
+        self.mean = mean
+        self.M2 = M2
+
+    # moments of an array (or list) of samples, computed with numpy in two passes
+    @staticmethod
+    def from_samples(samples):
+        samples = numpy.asarray(samples, dtype=numpy.float64)
+        if (samples.size == 0):
+            return NoiseMoments()
+        mean = samples.mean()
+        return NoiseMoments(int(samples.size), float(mean), float(numpy.square(samples - mean).sum()))
+
+    def add_samples(self, samples):
+        return self.merge(NoiseMoments.from_samples(samples))
+
+    # Chan et al. parallel update with the moments of another set of samples
+    def merge(self, other):
+        count = self.count + other.count
+        if (count == 0):
+            return self
+        delta = other.mean - self.mean
+        self.mean += delta*other.count/count
+        self.M2 += other.M2 + delta*delta*self.count*other.count/count
+        self.count = count
+        return self
+
+    def variance(self):
+        return self.M2/(self.count - 1)
+
+    # sample standard deviation, same as statistics.stdev over all samples
+    def stdev(self):
+        return sqrt(self.variance())
+
+# request keys that only control how the samples are taken
+SAMPLING_KEYS = ("num_of_samples", "num_threads", "num_timing_runs")
+
+def _fields(request):
+    return {k: v for k, v in request.items() if k not in SAMPLING_KEYS}
+
+# the sample count is not part of the key, every request for the same parameters and sampler tops up the same entry
+def make_key(request, sampler_id):
+    fields = _fields(request)
+    return hashlib.sha256(json.dumps({"format": FORMAT_VERSION, "request": fields, "sampler": sampler_id}, sort_keys=True).encode()).hexdigest()
+
+class NoiseCache:
+    # sampler_id is a function returning the identity of the sampler the measurements come from (default: the binary
+    # in noise_worker.get_build_dir()), it is called on every access
+    def __init__(self, cache_dir = None, sampler_id = None):
+        if cache_dir is None:
+            cache_dir = os.environ.get("OPENFHE_ESTIMATOR_CACHE_DIR", estimator_cache.DEFAULT_CACHE_DIR)
+        self.cache_dir = cache_dir
+        self.sampler_id = sampler_id or noise_worker.get_sampler_id
+        self.path = os.path.join(cache_dir, CACHE_FILE)
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+        self._pid = None
+
+    def _connect(self):
+        # sqlite connections must not be shared with forked children, reconnect in every process
+        if (self._conn is None) or (self._pid != os.getpid()):
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""CREATE TABLE IF NOT EXISTS """ + TABLE + """ (
+                                      key TEXT PRIMARY KEY, sampler TEXT, request TEXT,
+                                      count INTEGER, mean REAL, M2 REAL, perf TEXT, last_used REAL)""")
+            self._pid = os.getpid()
+        return self._conn
+
+    # returns (NoiseMoments, perf) for the request, (empty moments, None) if nothing is cached
+    def lookup(self, request):
+        row = self._connect().execute("SELECT count, mean, M2, perf FROM " + TABLE + " WHERE key = ?", (make_key(request, self.sampler_id()),)).fetchone()
+        if row is None:
+            return NoiseMoments(), None
+        return NoiseMoments(row[0], row[1], row[2]), json.loads(row[3])
+
+    # merges the moments of newly taken samples into the stored ones and returns the merged moments; the read and
+    # the write are one transaction so that concurrent top-ups of the same entry from other processes are not lost
+    def add(self, request, new_moments, perf):
+        conn = self._connect()
+        sampler_id = self.sampler_id()
+        key = make_key(request, sampler_id)
+        fields = _fields(request)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT count, mean, M2 FROM " + TABLE + " WHERE key = ?", (key,)).fetchone()
+            moments = NoiseMoments(*row) if row else NoiseMoments()
+            moments.merge(new_moments)
+            conn.execute("INSERT OR REPLACE INTO " + TABLE + " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                         (key, sampler_id, json.dumps(fields, sort_keys=True), moments.count, moments.mean, moments.M2,
+                          json.dumps(perf), time.time()))
+            conn.execute("COMMIT")
+        except:
+            conn.execute("ROLLBACK")
+            raise
+        return moments
+
+    # (request without the sampling keys, NoiseMoments) of every entry of the sampler with at least min_count samples
+    def entries(self, min_count = 0):
+        rows = self._connect().execute("SELECT request, count, mean, M2 FROM " + TABLE + " WHERE sampler = ? AND count >= ?",
+                                       (self.sampler_id(), min_count))
+        return [(json.loads(row[0]), NoiseMoments(row[1], row[2], row[3])) for row in rows]
+
+    # (request without the sampling keys, performance numbers of its last measurement) of every entry of the sampler
+    def performance(self):
+        rows = self._connect().execute("SELECT request, perf FROM " + TABLE + " WHERE sampler = ? AND perf IS NOT NULL", (self.sampler_id(),))
+        return [(json.loads(row[0]), json.loads(row[1])) for row in rows]
+
+    def clear(self):
+        self._connect().execute("DELETE FROM " + TABLE)
+
+    def stats(self):
+        return "noise cache (" + self.path + "): " + str(self.hits) + " hits, " + str(self.misses) + " top-ups"
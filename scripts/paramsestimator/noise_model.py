@@ -0,0 +1,121 @@
+#!/usr/bin/python
+
+'''
+Closed-form noise model for FHEW-like bootstrapping (AP, GINX, LMKCDEY), calibrated on measured noise.
+
+The variance of the noise at modulus q after a gate is the sum of
+    - the blind rotation (accumulator) noise, 2*d_g*N*B_g^2/12*sigma^2 per external product with n external
+      products per key coefficient for GINX/LMKCDEY and d_r = log_{B_rk}(q) for AP, scaled by (q/Q)^2
+    - the rounding noise of the modulus switch Q -> Qks, (1 + N*Var(s_N))/12, scaled by (q/Qks)^2
+    - the key switching noise N*d_ks*sigma^2, scaled by (q/Qks)^2
+    - the rounding noise of the modulus switch Qks -> q, (1 + n*Var(s_n))/12
+The constants that the closed form does not capture (gadget digit distribution, automorphism key switching of
+LMKCDEY, the unit of the noise printed by OpenFHE) are folded into one scale factor per bootstrapping technique
+and secret distribution: the model keeps the moments of log(measured/predicted stddev) of every measurement.
+It is calibrated with the measurements in the noise cache and with every new measurement of the run.
+
+The search asks the model first and only runs the sampler when the calibrated prediction is within the
+uncertainty of the model (margin times exp(2*stddev of the log ratios)) of the target noise.
+'''
+
+from math import ceil, exp, log, log2, sqrt
+
+import noise_cache
+
+TERNARY_VARIANCE = 2/3
+MIN_CALIBRATION_SAMPLES = 25
+MIN_CALIBRATION_POINTS = 3
+
+# uncalibrated noise variance at modulus q of a sampler request (see make_request in noise_worker), None for
+# named parameter sets and for gates other than the OR gates
+def get_noise_variance(request):
+    if ("n" not in request) or ("gates" in request):
+        return None
+    n, q, N = request["n"], request["q"], request["N"]
+    logQ, Qks, B_g, B_ks = request["logQ"], request["Qks"], request["B_g"], request["B_ks"]
+    sigma2 = request["sigma"]**2
+    secret_variance = TERNARY_VARIANCE if (request["secret_dist"] == 1) else sigma2
+
+    d_g = ceil(logQ/log2(B_g))
+    d_ks = ceil(log2(Qks)/log2(B_ks))
+    if (request["bootstrapping_tech"] == 1):
+        # AP: one key for every digit of every coefficient of the LWE secret
+        products = ceil(log2(q)/log2(request["B_rk"]))
+    else:
+        # GINX: one CMux per sign of a ternary coefficient, LMKCDEY: one product and one automorphism
+        products = 2
+
+    accumulator = products*n*2*d_g*N*B_g**2/12*sigma2
+    modswitch_Qks = (1 + N*TERNARY_VARIANCE)/12
+    keyswitch = N*d_ks*sigma2
+    modswitch_q = (1 + n*secret_variance)/12
+    return (q/2**logQ)**2*accumulator + (q/Qks)**2*(modswitch_Qks + keyswitch) + modswitch_q
+
+def get_group(request):
+    return (request["bootstrapping_tech"], request["secret_dist"])
+
+class NoiseModel:
+    def __init__(self, margin = 1.25):
+        self.margin = margin
+        self.calibration = {}
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.skipped = 0
+        self.measured = 0
+        self.errors = noise_cache.NoiseMoments()
+        self.max_error = 0.0
+
+    # calibrates the model with (request, NoiseMoments) pairs, e.g. the entries of the noise cache
+    def calibrate(self, entries):
+        for request, moments in entries:
+            if (moments.count >= MIN_CALIBRATION_SAMPLES):
+                self.add(request, moments.stdev())
+        return self
+
+    def add(self, request, stdev):
+        variance = get_noise_variance(request)
+        if (variance is None) or (stdev <= 0):
+            return
+        ratios = self.calibration.setdefault(get_group(request), noise_cache.NoiseMoments())
+        ratios.add_samples([log(stdev/sqrt(variance))])
+
+    # returns the calibrated stddev prediction and the stddev of the log ratios of its group, None while the group
+    # has too few measurements
+    def predict(self, request):
+        variance = get_noise_variance(request)
+        ratios = self.calibration.get(get_group(request)) if variance is not None else None
+        if (ratios is None) or (ratios.count < MIN_CALIBRATION_POINTS):
+            return None
+        return sqrt(variance)*exp(ratios.mean), ratios.stdev()
+
+    # returns the predicted stddev if it is clearly above or below target_noise_level, None if the request has to be
+    # measured
+    def decide(self, request, target_noise_level):
+        prediction = self.predict(request)
+        if prediction is None:
+            return None
+        stdev, spread = prediction
+        factor = self.margin*exp(2*spread)
+        if (stdev > target_noise_level*factor) or (stdev < target_noise_level/factor):
+            self.skipped += 1
+            return stdev
+        return None
+
+    # records a measurement: the relative error of the prediction made before it is added to the statistics, then
+    # the measurement is added to the calibration
+    def record(self, request, stdev, moments_count):
+        prediction = self.predict(request)
+        if prediction is not None:
+            error = abs(prediction[0]/stdev - 1)
+            self.errors.add_samples([error])
+            self.max_error = max(self.max_error, error)
+        self.measured += 1
+        if (moments_count >= MIN_CALIBRATION_SAMPLES):
+            self.add(request, stdev)
+
+    def stats(self):
+        msg = "noise model: " + str(self.skipped) + " probes predicted, " + str(self.measured) + " measured"
+        if (self.errors.count > 0):
+            msg += ", prediction error mean " + str(round(100*self.errors.mean, 1)) + "% max " + str(round(100*self.max_error, 1)) + "%"
+        return msg
@@ -0,0 +1,261 @@
+#!/usr/bin/python
+
+'''
+Pool of long-lived boolean_noise_estimate_script processes running in server mode (-S).
+
+Each process reads one parameter set per line as JSON on stdin and answers with one JSON line on stdout holding
+the key sizes, timings and noise samples, so process startup and library loading are paid once per search
+instead of once per measurement.
+
+By default the noise samples do not travel in the JSON response: every process writes them as raw little-endian
+float64 values to its own file in a private temporary directory, which is read back with numpy in one call. This
+keeps 10^5-10^6 sample measurements cheap to move and reduce.
+
+A request with "gates" (a comma-separated list of gate names) measures all of them with the same keys; the
+response then has a "Gates" list with the timing, failures and samples of every gate.
+'''
+
+from concurrent.futures import ThreadPoolExecutor
+
+import hashlib
+import json
+import numpy
+import os
+import profiler
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+BINARY = "boolean_noise_estimate_script"
+# temporary directory for the noise files, taken at import: a pool lives as long as its process and must not create
+# its files in the scratch directory of the job that happens to start it (see job_scheduler.py)
+TEMP_DIR = tempfile.gettempdir()
+
+# $OPENFHE_ESTIMATOR_BUILD_DIR, or the build directory at the top of the repository independent of the working directory
+def get_build_dir():
+    default = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "build")
+    return os.environ.get("OPENFHE_ESTIMATOR_BUILD_DIR", os.path.normpath(default))
+
+# sha256 of the sampler binary in build_dir (default: get_build_dir()), "missing" if it is not built; the hash is kept
+# per path, modification time and size, so a rebuild during a run is noticed
+SAMPLER_IDS = {}
+def get_sampler_id(build_dir = None):
+    binary = os.path.join(build_dir or get_build_dir(), "bin", BINARY)
+    try:
+        stat = os.stat(binary)
+    except OSError:
+        return "missing"
+    key = (binary, stat.st_mtime_ns, stat.st_size)
+    if key not in SAMPLER_IDS:
+        with open(binary, "rb") as f:
+            SAMPLER_IDS[key] = hashlib.sha256(f.read()).hexdigest()
+    return SAMPLER_IDS[key]
+
+class NoiseWorkerError(Exception):
+    pass
+
+# number of inputs of the gates the sampler can measure
+GATES = {"OR": 2, "AND": 2, "NOR": 2, "NAND": 2, "XOR": 2, "XNOR": 2,
+         "OR3": 3, "AND3": 3, "MAJORITY": 3,
+         "OR4": 4, "AND4": 4}
+# gate measured by a request without "gates"
+DEFAULT_GATES = {2: "OR", 3: "OR3", 4: "OR4"}
+
+# request for one noise measurement of param_set (a paramstable.paramsetvars)
+def make_request(param_set, num_of_samples, num_of_inputs):
+    return {"n": int(param_set.n),
+            "q": int(param_set.q),
+            "N": int(param_set.N),
+            "logQ": int(param_set.logQ),
+            "Qks": int(param_set.Qks),
+            "B_g": int(param_set.B_g),
+            "B_ks": int(param_set.B_ks),
+            "B_rk": int(param_set.B_rk),
+            "sigma": param_set.sigma,
+            "secret_dist": int(param_set.secret_dist),
+            "bootstrapping_tech": int(param_set.bootstrapping_tech),
+            "num_of_inputs": int(num_of_inputs),
+            "num_of_samples": int(num_of_samples)}
+
+# request for one noise measurement of a named BINFHE_PARAMSET in OpenFHE
+def make_named_request(param_set_name, boot_tech, num_of_inputs, num_of_samples):
+    return {"paramset": param_set_name,
+            "bootstrapping_tech": int(boot_tech),
+            "num_of_inputs": int(num_of_inputs),
+            "num_of_samples": int(num_of_samples)}
+
+# request for the benchmark mode of the sampler: latencies of KeyGen, BTKeyGen and of Encrypt, EvalBinGate and Decrypt
+# for every gate of request, over num_of_samples timed runs after num_warmup_runs untimed ones
+def make_benchmark_request(request, num_warmup_runs = 5, num_btkeygen_runs = 1):
+    return dict(request, benchmark=1, num_warmup_runs=int(num_warmup_runs), num_btkeygen_runs=int(num_btkeygen_runs))
+
+# request for measuring a single gate with the keys of request; for the default gate of an arity this is the
+# request without "gates", so that it shares its noise cache entry with the measurements of the searches
+def make_gate_request(request, gate):
+    request = dict(request, num_of_inputs=GATES[gate])
+    request.pop("gates", None)
+    if (DEFAULT_GATES[GATES[gate]] != gate):
+        request["gates"] = gate
+    return request
+
+# one response per gate of a response, with the key sizes and key generation time of the shared keys
+def split_gates(response):
+    if "Gates" not in response:
+        return [response]
+    shared = {k: v for k, v in response.items() if k != "Gates"}
+    return [dict(shared, **gate) for gate in response["Gates"]]
+
+# performance numbers in the "<value> <unit>" format printed by the command line mode of the sampler
+def get_performance(response):
+    return {"BootstrappingKeySize": str(response["BootstrappingKeySize"]) + " bytes",
+            "KeySwitchingKeySize": str(response["KeySwitchingKeySize"]) + " bytes",
+            "CiphertextSize": str(response["CiphertextSize"]) + " bytes",
+            "BootstrapKeyGenTime": str(response["BootstrapKeyGenTime"]) + " milliseconds",
+            "EvalBinGateTime": str(response["EvalBinGateTime"]) + " milliseconds"}
+
+# records a request in the profiler as spans for the key generation (the keys are generated before the bootstraps,
+# unless they were reused or loaded), the rest of the sampler's answer time and the parsing of the response
+def record_request(req, response, start, answered, parsed):
+    prof = profiler.get_profiler()
+    args = {k: req[k] for k in ("n", "q", "N", "num_of_samples") if k in req} if prof.trace else None
+    keygen = 0
+    if response.get("KeysReused") or response.get("KeysLoaded"):
+        prof.count("sampler keys " + ("reused" if response.get("KeysReused") else "loaded"))
+    elif "BootstrapKeyGenTime" in response:
+        keygen = min(response["BootstrapKeyGenTime"]/1000, answered - start)
+        prof.add("sampler keygen", start, keygen, args)
+    prof.add("sampler sampling", start + keygen, answered - start - keygen, args)
+    prof.add("sampler parse", answered, parsed - answered, args)
+
+class NoiseWorker:
+    # sampling_threads > 1 lets every process spread the bootstraps of a request over that many OpenMP threads,
+    # binary_noise = False returns the samples as a JSON list instead of through a float64 file, every process keeps
+    # the keys of key_cache_size parameter sets in memory and saves/loads keys in key_dir if given
+    def __init__(self, build_dir = None, size = 1, sampling_threads = 1, binary_noise = True, key_cache_size = 1, key_dir = None):
+        self.binary = os.path.join(build_dir or get_build_dir(), "bin", BINARY)
+        self.size = size
+        self.sampling_threads = sampling_threads
+        self.key_cache_size = key_cache_size
+        self.key_dir = key_dir
+        self.binary_noise = binary_noise
+        self._idle = queue.Queue()
+        self._procs = []
+        self._noise_files = {}
+        self._noise_dir = None
+        self._lock = threading.Lock()
+
+    def _spawn(self):
+        if not os.path.isfile(self.binary):
+            raise NoiseWorkerError(self.binary + " not found, build the project first")
+        args = [self.binary, "-S", "-c", str(self.key_cache_size)]
+        if self.key_dir is not None:
+            os.makedirs(self.key_dir, exist_ok=True)
+            args += ["-K", self.key_dir]
+        proc = subprocess.Popen(args, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1)
+        if self.binary_noise:
+            # mkdtemp creates the directory readable by this user only
+            if self._noise_dir is None:
+                self._noise_dir = tempfile.mkdtemp(prefix="noise_", dir=TEMP_DIR)
+            self._noise_files[proc] = os.path.join(self._noise_dir, str(proc.pid) + ".f64")
+        return proc
+
+    # take an idle process, start a new one while the pool is not full, otherwise wait for one to become idle; a None
+    # on the idle queue (see _discard) means a slot was freed and the pool may start a new process
+    def _acquire(self):
+        while True:
+            try:
+                proc = self._idle.get_nowait()
+            except queue.Empty:
+                proc = None
+            if proc is not None:
+                return proc
+            with self._lock:
+                if (len(self._procs) < self.size):
+                    proc = self._spawn()
+                    self._procs.append(proc)
+                    return proc
+            proc = self._idle.get()
+            if proc is not None:
+                return proc
+
+    def _release(self, proc):
+        self._idle.put(proc)
+
+    def _discard(self, proc):
+        with self._lock:
+            self._procs.remove(proc)
+            noise_file = self._noise_files.pop(proc, None)
+        proc.kill()
+        proc.wait()
+        if noise_file is not None and os.path.exists(noise_file):
+            os.remove(noise_file)
+        # wake a thread waiting in _acquire for an idle process, it can start a new one now
+        self._idle.put(None)
+
+    def request(self, req):
+        if (self.sampling_threads > 1) and ("num_threads" not in req):
+            req = dict(req, num_threads=self.sampling_threads)
+        proc = self._acquire()
+        noise_file = self._noise_files.get(proc)
+        if noise_file is not None:
+            req = dict(req, noise_file=noise_file)
+        try:
+            start = time.perf_counter()
+            proc.stdin.write(json.dumps(req) + "\n")
+            proc.stdin.flush()
+            # the server echoes its command line options before the first response, skip everything that is not JSON
+            for line in proc.stdout:
+                if line.startswith("{"):
+                    break
+            else:
+                raise NoiseWorkerError(self.binary + " exited with code " + str(proc.wait()))
+            answered = time.perf_counter()
+            response = json.loads(line)
+            # read the samples before the process is released and overwrites the file with the next request
+            if ("noise_count" in response):
+                response["noise"] = numpy.fromfile(noise_file, dtype="<f8", count=response.pop("noise_count"))
+            elif ("Gates" in response) and response["Gates"] and ("noise_count" in response["Gates"][0]):
+                counts = [gate.pop("noise_count") for gate in response["Gates"]]
+                noise = numpy.fromfile(noise_file, dtype="<f8", count=sum(counts))
+                for gate, samples in zip(response["Gates"], numpy.split(noise, numpy.cumsum(counts)[:-1])):
+                    gate["noise"] = samples
+        except:
+            self._discard(proc)
+            raise
+        self._release(proc)
+        record_request(req, response, start, answered, time.perf_counter())
+
+        if "error" in response:
+            raise NoiseWorkerError(response["error"])
+        return response
+
+    # returns (noise samples as a numpy array, performance numbers) for param_set
+    def measure(self, param_set, num_of_samples, num_of_inputs):
+        response = self.request(make_request(param_set, num_of_samples, num_of_inputs))
+        return numpy.asarray(response["noise"], dtype=numpy.float64), get_performance(response)
+
+    # runs the requests concurrently on the pool and returns the responses in the order of the requests
+    def map(self, requests):
+        with ThreadPoolExecutor(max_workers=self.size) as executor:
+            return list(executor.map(self.request, requests))
+
+    def close(self):
+        with self._lock:
+            procs, self._procs = self._procs, []
+            noise_dir, self._noise_dir = self._noise_dir, None
+            self._noise_files = {}
+        for proc in procs:
+            proc.stdin.close()
+            proc.wait()
+        if noise_dir is not None:
+            shutil.rmtree(noise_dir, ignore_errors=True)
+        self._idle = queue.Queue()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,283 @@
+#!/usr/bin/python
+
+'''
+Multi-objective parameter search: the Pareto front over EvalBinGate latency, bootstrapping key size and key switching
+key size of the parameter sets that reach a decryption failure rate at a security level.
+
+usage: search N, q, d_g, d_ks (and B_rk for AP) together, print the front and its minimum-latency parameter set
+    > python3 scripts/paramsestimator/pareto_search.py -t 2 -p STD128 -f -32 -l 2 -u 4 -k 2 3 4
+
+usage: only the minimum-latency parameter set, which prunes far more candidates
+    > python3 scripts/paramsestimator/pareto_search.py -t 3 -d 0 -p STD128Q -f -40 --objective latency
+
+Every candidate (N, q, d_g, d_ks, B_rk) is a search_n of binfhe_params.py (the smallest n whose noise is below the
+target noise) followed by the final 1000-sample measurement that gives its latency and key sizes. Before a candidate
+is searched its objectives are bounded from below:
+    - the noise model (calibrated from the noise cache) gives the smallest n that can reach the target noise within
+      the uncertainty of the model; a candidate without such an n up to N is infeasible
+    - the latency is bounded by a cost model in n, N, q, d_g and B_rk (external products times gadget digits times
+      N log N), scaled by the smallest measured/model ratio of the parameter sets in the noise cache
+    - the key sizes are those of the closed-form model of key_size_model.py at that n; a candidate whose keys exceed
+      --max_key_size is infeasible
+Candidates are searched in the order of their latency bound and skipped when a parameter set on the front is at least
+as good in all three bounds (with --objective latency, when the best latency found is not above the latency bound).
+Without cached measurements the latency bounds are 0 and only the key sizes prune.
+'''
+
+from itertools import product
+from math import ceil, exp, log2
+
+import argparse
+import binfhe_params
+import binfhe_params_helper as helperfncs
+import key_size_model
+import noise_worker
+import paramstable as stdparams
+
+MIN_N = 100
+# bits by which the largest secure Qks of the search may exceed the analytic fit of the security level
+QKS_SLACK_BITS = 2
+SIGMA = 3.19
+OBJECTIVES = ("EvalBinGateTime", "BootstrappingKeySize", "KeySwitchingKeySize")
+
+class ParetoPoint:
+    def __init__(self, param_set, d_g, d_ks, noise, failure_rate, perf):
+        self.param_set = param_set
+        self.d_g = d_g
+        self.d_ks = d_ks
+        self.noise = noise
+        self.failure_rate = failure_rate
+        self.perf = perf
+        self.objectives = tuple(perf[k] for k in OBJECTIVES)
+
+# B_ks and d_ks for log2 Qks, d_ks is increased until B_ks < 128 (as in binfhe_params)
+def get_B_ks(logmodQks, d_ks):
+    B_ks = 2**ceil(logmodQks/d_ks)
+    while (B_ks >= 128):
+        d_ks += 1
+        B_ks = 2**ceil(logmodQks/d_ks)
+    return B_ks, d_ks
+
+# external products of a blind rotation per coefficient of the LWE secret (as in noise_model.get_noise_variance)
+def get_products(bootstrapping_tech, q, B_rk):
+    if (bootstrapping_tech == 1):
+        return ceil(log2(q)/log2(B_rk))
+    return 2
+
+def get_costs(bootstrapping_tech, n, N, q, logQ, d_g, B_rk, logQks, B_ks, d_ks):
+    products = n*get_products(bootstrapping_tech, q, B_rk)
+    # AP keeps B_rk - 1 RGSW ciphertexts per digit
+    keys = products*(B_rk - 1) if (bootstrapping_tech == 1) else products
+    return (products*d_g*N*log2(N),
+            keys*d_g*N*logQ,
+            (n + 1)*N*d_ks*B_ks*logQks)
+
+# costs of a sampler request (see noise_worker.make_request)
+def get_request_costs(request):
+    logQks = log2(request["Qks"])
+    d_g = ceil(request["logQ"]/log2(request["B_g"]))
+    d_ks = ceil(logQks/log2(request["B_ks"]))
+    return get_costs(request["bootstrapping_tech"], request["n"], request["N"], request["q"], request["logQ"], d_g,
+                     request["B_rk"], logQks, request["B_ks"], d_ks)
+
+# smallest measured/model ratio of every objective over the parameter sets of a bootstrapping technique in the noise
+# cache, 0 for an objective without measurements
+def get_scales(bootstrapping_tech):
+    scales = [None]*len(OBJECTIVES)
+    cache = helperfncs.get_noise_cache()
+    for request, perf in (cache.performance() if cache is not None else []):
+        if ("n" not in request) or ("gates" in request) or (request["bootstrapping_tech"] != bootstrapping_tech):
+            continue
+        for i, (k, cost) in enumerate(zip(OBJECTIVES, get_request_costs(request))):
+            if (k in perf) and (cost > 0):
+                ratio = float(perf[k])/cost
+                scales[i] = ratio if scales[i] is None else min(scales[i], ratio)
+    return [scale or 0 for scale in scales]
+
+# key switching modulus of the search for n, from the analytic fit of the security level plus slack bits
+def get_logmodQks(n, logQ, exp_sec_level, secret_dist_des, slack = 0):
+    return min(helperfncs.get_mod(n, exp_sec_level, secret_dist_des) + slack, 30, logQ)
+
+def get_request(bootstrapping_tech, secret_dist, n, N, q, logQ, d_g, d_ks, B_rk, logmodQks, num_of_inputs):
+    B_ks, _ = get_B_ks(logmodQks, d_ks)
+    param_set = stdparams.paramsetvars(n, q, N, logQ, 2**logmodQks, 2**ceil(logQ/d_g), B_ks, B_rk, SIGMA, secret_dist, bootstrapping_tech)
+    return noise_worker.make_request(param_set, 0, num_of_inputs)
+
+# smallest n whose noise the noise model does not rule out (prediction below the target within the uncertainty of
+# the model), MIN_N without a calibrated model, None if even n = N is ruled out; assumes the noise decreases with n.
+# The search takes the largest secure Qks for n, the prediction uses QKS_SLACK_BITS more than the analytic fit of the
+# security level, which gives a smaller key switching noise.
+def get_min_n(bootstrapping_tech, secret_dist, N, q, logQ, d_g, d_ks, B_rk, exp_sec_level, num_of_inputs, target_noise_level):
+    model = helperfncs.get_noise_model()
+    if model is None:
+        return MIN_N
+    secret_dist_des = ("error", "ternary")[secret_dist]
+
+    def possible(n):
+        logmodQks = get_logmodQks(n, logQ, exp_sec_level, secret_dist_des, QKS_SLACK_BITS)
+        prediction = model.predict(get_request(bootstrapping_tech, secret_dist, n, N, q, logQ, d_g, d_ks, B_rk, logmodQks, num_of_inputs))
+        if prediction is None:
+            return True
+        stdev, spread = prediction
+        return (stdev/(model.margin*exp(2*spread)) < target_noise_level)
+
+    if not possible(N):
+        return None
+    lo, hi = MIN_N, N
+    while (lo < hi):
+        mid = (lo + hi)//2
+        if possible(mid):
+            hi = mid
+        else:
+            lo = mid + 1
+    return lo
+
+# lower bounds of the objectives of a candidate, None if the candidate is infeasible
+def get_bounds(candidate, bootstrapping_tech, secret_dist, exp_sec_level, exp_decryption_failure, num_of_inputs, scales):
+    N, q, d_g, d_ks, B_rk = candidate
+    secret_dist_des = ("error", "ternary")[secret_dist]
+    logQ = helperfncs.get_mod(N, exp_sec_level, secret_dist_des)
+    if (N <= 1024):
+        logQ = min(logQ, 28)
+    target_noise_level = helperfncs.get_target_noise(exp_decryption_failure, 2*num_of_inputs, q, num_of_inputs)
+
+    n = get_min_n(bootstrapping_tech, secret_dist, N, q, logQ, d_g, d_ks, B_rk, exp_sec_level, num_of_inputs, target_noise_level)
+    if n is None:
+        return None
+    logmodQks = get_logmodQks(n, logQ, exp_sec_level, secret_dist_des, -QKS_SLACK_BITS)
+    B_ks, d_ks = get_B_ks(logmodQks, d_ks)
+    request = get_request(bootstrapping_tech, secret_dist, n, N, q, logQ, d_g, d_ks, B_rk, logmodQks, num_of_inputs)
+    if helperfncs.exceeds_max_key_size(request):
+        return None
+    costs = get_costs(bootstrapping_tech, n, N, q, logQ, d_g, B_rk, logmodQks, B_ks, d_ks)
+    sizes = key_size_model.get_key_sizes(request)
+    return (scales[0]*costs[0], sizes["BootstrappingKeySize"], sizes["KeySwitchingKeySize"])
+
+def dominates(objectives, bounds):
+    return all(o <= b for o, b in zip(objectives, bounds))
+
+# search n for a candidate and measure the final parameter set, None if the candidate has no parameter set
+def evaluate(candidate, bootstrapping_tech, secret_dist, exp_sec_level, exp_decryption_failure, num_of_inputs, num_of_samples, num_threads):
+    N, q, d_g, d_ks, B_rk = candidate
+    result = binfhe_params.search_n(bootstrapping_tech, secret_dist, exp_sec_level, exp_decryption_failure, num_of_inputs, num_of_samples, d_ks, d_g, B_rk, N, q, num_threads)
+    if (result is None) or (0 in result[:3]):
+        return None
+    n, logmodQks, B_ks, logQ = result
+    param_set = stdparams.paramsetvars(n, q, N, logQ, 2**logmodQks, 2**ceil(logQ/d_g), B_ks, B_rk, SIGMA, secret_dist, bootstrapping_tech)
+    noise, perf = helperfncs.get_noise_from_cpp_code(param_set, 1000, num_of_inputs, True)
+    perf = {k: float(v.split()[0]) for k, v in perf.items()}
+    failure_rate = helperfncs.get_decryption_failure(noise, 2*num_of_inputs, q, num_of_inputs)
+    return ParetoPoint(param_set, d_g, ceil(logmodQks/log2(B_ks)), noise, failure_rate, perf)
+
+def get_candidates(bootstrapping_tech, exp_sec_level, lower, upper, d_ks_values, B_rk_values):
+    ring_dims = (2048,) if (exp_sec_level == 'STD256Q') else (1024, 2048)
+    if binfhe_params.FORCE_openfhe32:
+        ring_dims = tuple(N for N in ring_dims if (N <= 1024))
+    candidates = []
+    for N, d_g, d_ks in product(ring_dims, range(lower, upper + 1), d_ks_values):
+        for q in ((2*N,) if binfhe_params.FORCE_q_eq_2N else (N, 2*N)):
+            # B_rk only matters for AP, the other techniques use the default of search_d_g
+            for B_rk in (B_rk_values if (bootstrapping_tech == 1) else (32 if (q == 1024) else 64,)):
+                candidates.append((N, q, d_g, d_ks, B_rk))
+    return candidates
+
+# returns the Pareto front (sorted by latency) of the parameter sets of all candidates; with objective = "latency" only
+# the minimum-latency parameter set is searched for and the front may miss parameter sets with smaller keys
+def pareto_search(bootstrapping_tech, secret_dist, exp_sec_level, exp_decryption_failure, num_of_inputs, num_of_samples, lower, upper, d_ks_values, B_rk_values, num_threads, objective = "pareto"):
+    scales = get_scales(bootstrapping_tech)
+    bounded = []
+    infeasible = 0
+    for candidate in get_candidates(bootstrapping_tech, exp_sec_level, lower, upper, d_ks_values, B_rk_values):
+        bounds = get_bounds(candidate, bootstrapping_tech, secret_dist, exp_sec_level, exp_decryption_failure, num_of_inputs, scales)
+        if bounds is None:
+            infeasible += 1
+        else:
+            bounded.append((bounds, candidate))
+    bounded.sort()
+
+    front = []
+    pruned = 0
+    evaluated = 0
+    for bounds, candidate in bounded:
+        if (objective == "latency"):
+            skip = any(point.objectives[0] <= bounds[0] for point in front)
+        else:
+            skip = any(dominates(point.objectives, bounds) for point in front)
+        print("\n(N, q, d_g, d_ks, B_rk): " + str(candidate) + ", lower bounds: " + str(bounds) + (", pruned" if skip else ""))
+        if skip:
+            pruned += 1
+            continue
+
+        evaluated += 1
+        point = evaluate(candidate, bootstrapping_tech, secret_dist, exp_sec_level, exp_decryption_failure, num_of_inputs, num_of_samples, num_threads)
+        if point is None:
+            print("cannot find parameters for " + str(candidate))
+            continue
+        print("(n, latency, bootstrapping key size, key switching key size): " + str((point.param_set.n,) + point.objectives))
+        if not any(dominates(other.objectives, point.objectives) for other in front):
+            front = [other for other in front if not dominates(point.objectives, other.objectives)] + [point]
+
+    print("\ncandidates: " + str(len(bounded) + infeasible) + ", infeasible by the noise or key size model: " + str(infeasible) +
+          ", pruned: " + str(pruned) + ", searched: " + str(evaluated))
+    return sorted(front, key=lambda point: point.objectives)
+
+def print_point(point, num_of_inputs):
+    p = point.param_set
+    print("(latency ms, bootstrapping key bytes, key switching key bytes): " + str(point.objectives))
+    print("(n, N, q, logQ, Qks, B_g, B_ks, B_rk, d_g, d_ks): " + str((p.n, p.N, p.q, int(p.logQ), int(p.Qks), p.B_g, p.B_ks, p.B_rk, point.d_g, point.d_ks)))
+    print("noise, decryption failure rate: " + str((point.noise, point.failure_rate)))
+    print("command args: ", ' '.join(["-n " + str(p.n), "-N " + str(p.N), "-q " + str(p.q), "-Q " + str(int(p.logQ)),
+                                      "-k " + str(int(p.Qks)), "-g " + str(p.B_g), "-r " + str(p.B_rk), "-b " + str(p.B_ks),
+                                      "-s " + str(p.sigma), "-t " + str(p.bootstrapping_tech), "-d " + str(p.secret_dist),
+                                      "-I " + str(num_of_inputs), "-i 1000"]))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='pareto_search', description='Pareto front of latency and key sizes over N, q, d_g, d_ks and B_rk')
+    parser.add_argument('-t', '--bootstrapping_tech', action='store', choices=(1, 2, 3), default=2, type=int)
+    parser.add_argument('-d', '--secret_dist', choices=(0, 1), action='store', default=1, type=int)
+    parser.add_argument('-p', '--exp_sec_level', action='store', choices=tuple(stdparams.paramlinear), default='STD128')
+    parser.add_argument('-f', '--exp_decryption_failure', action='store', default=-40, type=int)
+    parser.add_argument('-I', '--num_of_inputs', action='store', choices=(2, 3, 4), default=2, type=int)
+    parser.add_argument('-i', '--num_of_samples', action='store', default=200, type=int)
+    parser.add_argument('-l', '--lower', action='store', default=2, type=int, help='smallest d_g')
+    parser.add_argument('-u', '--upper', action='store', default=4, type=int, help='largest d_g')
+    parser.add_argument('-k', '--d_ks', action='store', nargs='+', default=[2, 3, 4], type=int, help='values of d_ks')
+    parser.add_argument('-r', '--B_rk', action='store', nargs='+', default=[16, 32, 64], type=int, help='values of B_rk (AP only)')
+    parser.add_argument('-n', '--num_threads', action='store', default=1, type=int)
+    parser.add_argument('--objective', action='store', choices=('pareto', 'latency'), default='pareto', help='full front or only the minimum-latency parameter set')
+    parser.add_argument('--max_key_size', action='store', default=None, type=int, help='max size in bytes of the bootstrapping plus key switching key')
+    parser.add_argument('--cache_dir', action='store', default=None, help='directory of the persistent estimator and noise caches')
+    parser.add_argument('--no_cache', action='store_true', help='always run the lattice-estimator and take fresh noise samples')
+    parser.add_argument('--grid_dir', action='store', default=None, help='directory of the security grids built by security_grid.py (default: the cache directory)')
+    parser.add_argument('--no_grid', action='store_true', help='always run the lattice-estimator instead of answering from a security grid')
+    parser.add_argument('--noise_model_margin', action='store', default=1.25, type=float, help='factor between predicted and target noise beyond which a probe is not measured')
+    parser.add_argument('--no_noise_model', action='store_true', help='measure the noise of every probe and do not bound n with the noise model')
+    parser.add_argument('--sampling_threads', action='store', default=1, type=int, help='number of threads the noise sampler uses for bootstrapping')
+    parser.add_argument('--key_cache_size', action='store', default=1, type=int, help='number of parameter sets whose keys a noise sampler process keeps in memory')
+    parser.add_argument('--build_dir', action='store', default=None, help='build directory with bin/boolean_noise_estimate_script (default: build at the top of the repository)')
+    parser.add_argument('--key_dir', action='store', default=None, help='directory to save the keys of the noise sampler in and load them from')
+    a = parser.parse_args()
+
+    helperfncs.configure_security_grid(a.grid_dir or a.cache_dir, enabled=not a.no_grid)
+    helperfncs.configure_estimator_cache(a.cache_dir, None, not a.no_cache)
+    helperfncs.configure_noise_cache(a.cache_dir, not a.no_cache)
+    helperfncs.configure_noise_worker(a.sampling_threads, a.key_cache_size, a.key_dir, a.build_dir)
+    helperfncs.configure_noise_model(a.noise_model_margin, not a.no_noise_model)
+    helperfncs.configure_max_key_size(a.max_key_size)
+
+    front = pareto_search(a.bootstrapping_tech, a.secret_dist, a.exp_sec_level, a.exp_decryption_failure, a.num_of_inputs, a.num_of_samples,
+                          a.lower, a.upper, a.d_ks, a.B_rk, a.num_threads, a.objective)
+    if not front:
+        print("cannot find parameters")
+    else:
+        print("\npareto front (" + str(len(front)) + " parameter sets)")
+        for point in front:
+            print()
+            print_point(point, a.num_of_inputs)
+        print("\nminimum-latency parameter set")
+        print_point(front[0], a.num_of_inputs)
+
+    if helperfncs.get_noise_model() is not None:
+        print(helperfncs.get_noise_model().stats())
+    if helperfncs.get_noise_cache() is not None:
+        print(helperfncs.get_noise_cache().stats())
@@ -0,0 +1,117 @@
+#!/usr/bin/python
+
+'''
+Wall-clock instrumentation of the hot paths of the parameter searches.
+
+The profiler of a process records the duration of every span (a call of call_estimator, optimize_params_security or
+get_noise_from_cpp_code, and the key generation, sampling and parsing part of every request to the noise sampler) and
+a set of counters (cache hits and misses, reused and loaded sampler keys). The summary reports every span with its
+count, total time and the percentiles of its durations, and every counter.
+
+With trace = True every span is also kept as a complete event of the Chrome trace event format, and write_trace writes
+them to a JSON file that chrome://tracing and https://ui.perfetto.dev open, one row per process and thread.
+
+Worker processes of job_scheduler.py hand their spans and counters to the parent with drain and merge, so the summary
+and the trace of a run with --jobs cover all processes.
+'''
+
+from math import ceil
+
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+
+PROFILER = None
+
+class Profiler:
+    def __init__(self, trace = False):
+        self.trace = trace
+        self.start = time.perf_counter()
+        self.durations = {}
+        self.counters = {}
+        self.events = []
+        self._lock = threading.Lock()
+
+    def count(self, name, n = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    # records a span that started at the time.perf_counter() value start and took duration seconds
+    def add(self, name, start, duration, args = None):
+        with self._lock:
+            self.durations.setdefault(name, []).append(duration)
+            if self.trace:
+                event = {"name": name, "ph": "X", "ts": round(start*1e6, 3), "dur": round(duration*1e6, 3),
+                         "pid": os.getpid(), "tid": threading.get_native_id()}
+                if args:
+                    event["args"] = args
+                self.events.append(event)
+
+    @contextlib.contextmanager
+    def span(self, name, args = None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, start, time.perf_counter() - start, args)
+
+    # returns the spans and counters recorded since the last drain and forgets them
+    def drain(self):
+        with self._lock:
+            stats = {"durations": self.durations, "counters": self.counters, "events": self.events}
+            self.durations, self.counters, self.events = {}, {}, []
+        return stats
+
+    # adds the stats of drain in another process
+    def merge(self, stats):
+        with self._lock:
+            for name, durations in stats["durations"].items():
+                self.durations.setdefault(name, []).extend(durations)
+            for name, n in stats["counters"].items():
+                self.counters[name] = self.counters.get(name, 0) + n
+            self.events += stats["events"]
+
+    def summary(self):
+        def percentile(durations, p):
+            return durations[max(ceil(p*len(durations)) - 1, 0)]
+
+        lines = ["profile (" + str(round(time.perf_counter() - self.start, 1)) + " s wall clock, times of spans in all processes):",
+                 "{:<32}{:>8}{:>12}{:>12}{:>12}{:>12}{:>12}{:>12}".format("span", "count", "total s", "mean ms", "p50 ms", "p90 ms", "p99 ms", "max ms")]
+        for name, durations in sorted(self.durations.items(), key=lambda item: -sum(item[1])):
+            durations = sorted(durations)
+            total = sum(durations)
+            lines.append("{:<32}{:>8}{:>12.1f}{:>12.1f}{:>12.1f}{:>12.1f}{:>12.1f}{:>12.1f}".format(
+                name, len(durations), total, 1e3*total/len(durations), 1e3*percentile(durations, 0.5),
+                1e3*percentile(durations, 0.9), 1e3*percentile(durations, 0.99), 1e3*durations[-1]))
+        for name, n in sorted(self.counters.items()):
+            lines.append("{:<32}{:>8}".format(name, n))
+        return "\n".join(lines)
+
+    # writes the spans in the Chrome trace event format (times in microseconds), the counters go to otherData
+    def write_trace(self, path):
+        with open(path + ".tmp", "w") as f:
+            json.dump({"traceEvents": sorted(self.events, key=lambda event: event["ts"]), "displayTimeUnit": "ms",
+                       "otherData": self.counters}, f)
+        os.replace(path + ".tmp", path)
+
+# profiler of this process, trace = True keeps the spans for write_trace
+def configure_profiler(trace = False):
+    global PROFILER
+    PROFILER = Profiler(trace)
+    return PROFILER
+
+def get_profiler():
+    if PROFILER is None:
+        configure_profiler()
+    return PROFILER
+
+# records every call of the decorated function as a span named after it
+def profiled(fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with get_profiler().span(fn.__name__):
+            return fn(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,135 @@
+#!/usr/bin/python
+
+'''
+Refit the starting point of the modulus search (paramlinear in paramstable.py) from the estimator cache.
+
+usage:
+    > python3 scripts/paramsestimator/refit_paramlinear.py [--cache_dir DIR] [--output FILE]
+
+For every security level and secret distribution the cached results give, for each dimension that was searched, the
+largest power of two modulus that is known to be secure (all attacks at or above the level) while the next one is
+known to be insecure (any attack below the level). These boundary points are written to paramfit.json in the
+estimator cache directory ($OPENFHE_ESTIMATOR_CACHE_DIR or --cache_dir), together with a least-squares line through
+them. get_mod interpolates between the boundary points and
+extrapolates with the line, and falls back to paramlinear for security levels and secret distributions without a fit.
+'''
+
+from math import ceil
+
+import argparse
+import datetime
+import estimator_cache
+import json
+import os
+import paramstable as stdparams
+
+FORMAT_VERSION = 1
+FIT_FILE = "paramfit.json"
+ATTACKS = ("usvp", "dual", "bdd")
+
+def cost_model_name(exp_sec_level):
+    return "LaaMosPol14" if (exp_sec_level[-1] == "Q") else "BDGL16"
+
+# paramfit.json in the estimator cache directory (default: $OPENFHE_ESTIMATOR_CACHE_DIR)
+def get_fit_path(cache_dir = None):
+    if cache_dir is None:
+        cache_dir = os.environ.get("OPENFHE_ESTIMATOR_CACHE_DIR", estimator_cache.DEFAULT_CACHE_DIR)
+    return os.path.join(cache_dir, FIT_FILE)
+
+# the fit of paramfit.json (default: get_fit_path()) for a security level and secret distribution, None if there is none
+def load_fit(exp_sec_level, secret_dist, path = None):
+    if path is None:
+        path = get_fit_path()
+    if not os.path.isfile(path):
+        return None
+    with open(path) as f:
+        data = json.load(f)
+    if (data.get("format") != FORMAT_VERSION):
+        return None
+    return data["fits"].get(secret_dist, {}).get(exp_sec_level)
+
+# log2 of the starting modulus for dim from a fit: interpolated between the boundary points, the line outside of them
+def fit_logmod(fit, dim):
+    points = fit["points"]
+    if (points[0][0] <= dim <= points[-1][0]):
+        for (dim0, logmod0), (dim1, logmod1) in zip(points, points[1:]):
+            if (dim <= dim1):
+                if (dim1 == dim0):
+                    return logmod1
+                return logmod0 + (logmod1 - logmod0)*(dim - dim0)/(dim1 - dim0)
+    return fit["a"]*dim + fit["b"]
+
+# (dim, largest secure log2(mod)) for every dimension where the boundary is bracketed by cached results
+def get_boundary_points(results, sec_level):
+    # per (dim, logmod): the attack costs that are known
+    costs = {}
+    for dim, logmod, value in results:
+        costs.setdefault((dim, logmod), []).append(value)
+
+    def is_secure(dim, logmod):
+        values = costs.get((dim, logmod))
+        if (values is None) or (None in values):
+            return None
+        if (min(values) < sec_level):
+            return False
+        return True if (len(values) == len(ATTACKS)) else None
+
+    points = []
+    for dim in sorted({dim for dim, logmod in costs}):
+        secure = [logmod for d, logmod in costs if (d == dim) and is_secure(dim, logmod)]
+        if secure and (is_secure(dim, max(secure) + 1) is False):
+            points.append((dim, max(secure)))
+    return points
+
+def fit_line(points):
+    count = len(points)
+    mean_dim = sum(dim for dim, logmod in points)/count
+    mean_logmod = sum(logmod for dim, logmod in points)/count
+    var_dim = sum((dim - mean_dim)**2 for dim, logmod in points)
+    if (var_dim == 0):
+        return 0.0, mean_logmod
+    a = sum((dim - mean_dim)*(logmod - mean_logmod) for dim, logmod in points)/var_dim
+    return a, mean_logmod - a*mean_dim
+
+def refit(cache, version = None):
+    rows = [row for row in cache.results() if float(row[1]).is_integer()]
+    if version is None:
+        # the estimator version with the most results
+        versions = [row[5] for row in rows]
+        version = max(set(versions), key=versions.count) if versions else None
+
+    fits = {}
+    for exp_sec_level, (sec_level, a_old, b_old) in stdparams.paramlinear.items():
+        for secret_dist in ("error", "ternary"):
+            results = [(dim, int(logmod), value) for dim, logmod, dist, cost_model, attack, ver, value in rows
+                       if (dist == secret_dist) and (cost_model == cost_model_name(exp_sec_level)) and (ver == version)]
+            points = get_boundary_points(results, sec_level)
+            if (len(points) < 2):
+                continue
+            a, b = fit_line(points)
+            fits.setdefault(secret_dist, {})[exp_sec_level] = {"a": a, "b": b, "points": points}
+
+            # ceil(a*dim + b) as in get_mod, compared with the boundary
+            err_old = sum(abs(ceil(a_old*dim + b_old) - logmod) for dim, logmod in points)/len(points)
+            err_new = sum(abs(round(fit_logmod(fits[secret_dist][exp_sec_level], dim)) - logmod) for dim, logmod in points)/len(points)
+            print(exp_sec_level, secret_dist + ":", len(points), "points, mean distance of the starting point from the boundary",
+                  round(err_old, 2), "(paramlinear) ->", round(err_new, 2))
+
+    return {"format": FORMAT_VERSION, "estimator_version": version,
+            "created": datetime.datetime.now().isoformat(timespec="seconds"), "fits": fits}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Refit the starting point of the modulus search from the estimator cache')
+    parser.add_argument('--cache_dir', action='store', default=None, help='directory of the estimator cache')
+    parser.add_argument('--version', action='store', default=None, help='lattice-estimator version of the results to use (default: the most frequent one)')
+    parser.add_argument('-o', '--output', action='store', default=None, help='output file (default: paramfit.json in the cache directory)')
+    a = parser.parse_args()
+
+    data = refit(estimator_cache.EstimatorCache(a.cache_dir), a.version)
+    if a.output is None:
+        a.output = get_fit_path(a.cache_dir)
+        os.makedirs(os.path.dirname(a.output), exist_ok=True)
+    with open(a.output + ".tmp", "w") as f:
+        json.dump(data, f, indent=1)
+    os.replace(a.output + ".tmp", a.output)
+    print("wrote " + a.output)
@@ -0,0 +1,100 @@
+#!/usr/bin/python
+
+'''
+Persistent index of solved searches for n, for warm-starting the searches of neighboring configurations.
+
+Every search_n of binfhe_params.py that finds a lattice dimension n records it with its configuration (bootstrapping
+technique, secret distribution, security level, N, q, log Q, d_g, d_ks, B_rk, gate inputs, decryption failure rate).
+A later search with the same technique, secret distribution, security level, N, q and log Q starts from the n of the
+nearest solved configuration instead of bracketing [100, N] from scratch: neighbors in the --all sweep (I = 2 -> 3 -> 4,
+d_g = 2 -> 3, d_ks) have optimal n within a few percent of each other. The answer is still bracketed on both sides by
+probes, but the measured noise is not monotone in n (sampling noise, and Qks grows with n), so a search that starts
+from a seed can end at another n than a search from scratch, and the result depends on what the index holds. Warm
+starts are therefore opt-in (--warm_start of binfhe_params.py or OPENFHE_WARM_START=1).
+
+The database lives next to the estimator cache ($OPENFHE_ESTIMATOR_CACHE_DIR) and is shared by the processes of --jobs.
+'''
+
+from math import log2
+
+import estimator_cache
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+CACHE_FILE = "search_index.sqlite"
+# a configuration must agree on these to be a neighbor, the others are compared with get_distance
+SAME_KEYS = ("bootstrapping_tech", "secret_dist", "exp_sec_level", "N", "q", "logQ")
+
+def make_search(bootstrapping_tech, secret_dist, exp_sec_level, N, q, logQ, d_g, d_ks, B_rk, num_of_inputs, exp_decryption_failure):
+    return {"bootstrapping_tech": int(bootstrapping_tech), "secret_dist": int(secret_dist), "exp_sec_level": exp_sec_level,
+            "N": int(N), "q": int(q), "logQ": int(logQ), "d_g": int(d_g), "d_ks": int(d_ks), "B_rk": int(B_rk),
+            "num_of_inputs": int(num_of_inputs), "exp_decryption_failure": int(exp_decryption_failure)}
+
+def make_key(search):
+    return hashlib.sha256(json.dumps(search, sort_keys=True).encode()).hexdigest()
+
+# distance between two configurations that agree on SAME_KEYS, 0 for the same configuration; one gate input, one gadget
+# digit, one key switching digit, a factor of 2 in B_rk and 8 bits of decryption failure rate count the same
+def get_distance(a, b):
+    return (abs(a["num_of_inputs"] - b["num_of_inputs"]) + abs(a["d_g"] - b["d_g"]) + abs(a["d_ks"] - b["d_ks"]) +
+            abs(log2(a["B_rk"]) - log2(b["B_rk"])) + abs(a["exp_decryption_failure"] - b["exp_decryption_failure"])/8)
+
+class SearchIndex:
+    def __init__(self, cache_dir = None):
+        if cache_dir is None:
+            cache_dir = os.environ.get("OPENFHE_ESTIMATOR_CACHE_DIR", estimator_cache.DEFAULT_CACHE_DIR)
+        self.cache_dir = cache_dir
+        self.path = os.path.join(cache_dir, CACHE_FILE)
+        self.warm = 0
+        self.cold = 0
+        self.probes = {"warm": 0, "cold": 0}
+        self._conn = None
+        self._pid = None
+
+    def _connect(self):
+        # sqlite connections must not be shared with forked children, reconnect in every process
+        if (self._conn is None) or (self._pid != os.getpid()):
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""CREATE TABLE IF NOT EXISTS searches (
+                                      key TEXT PRIMARY KEY, search TEXT, n INTEGER, last_used REAL)""")
+            self._pid = os.getpid()
+        return self._conn
+
+    # (n, distance, configuration) of the nearest solved configuration, None if no configuration agrees on SAME_KEYS
+    def nearest(self, search):
+        best = None
+        for row in self._connect().execute("SELECT search, n FROM searches"):
+            other = json.loads(row[0])
+            if any(other[k] != search[k] for k in SAME_KEYS):
+                continue
+            distance = get_distance(search, other)
+            if (best is None) or (distance < best[1]):
+                best = (row[1], distance, other)
+        return best
+
+    def record(self, search, n):
+        self._connect().execute("INSERT OR REPLACE INTO searches VALUES (?, ?, ?, ?)",
+                                (make_key(search), json.dumps(search, sort_keys=True), int(n), time.time()))
+
+    # counts the probes of a finished search, warm = True if it started from a solved neighbor
+    def count(self, warm, probes):
+        if warm:
+            self.warm += 1
+        else:
+            self.cold += 1
+        self.probes["warm" if warm else "cold"] += probes
+
+    def clear(self):
+        self._connect().execute("DELETE FROM searches")
+
+    def stats(self):
+        def per_search(searches, probes):
+            return (str(round(probes/searches, 1)) if searches else "-") + " probes per search"
+        return ("search index (" + self.path + "): " + str(self.warm) + " warm-started searches (" +
+                per_search(self.warm, self.probes["warm"]) + "), " + str(self.cold) + " cold (" +
+                per_search(self.cold, self.probes["cold"]) + ")")
@@ -0,0 +1,129 @@
+#!/usr/bin/python
+
+'''
+Precomputed lattice-estimator security over a grid of (n, log2 q) values.
+
+usage: build the grid for a secret distribution and a cost model (quantum = LaaMosPol14 for the *Q security levels,
+classical = BDGL16 for the others) on all cores, then binfhe_params.py uses it automatically
+    > sage -python scripts/paramsestimator/security_grid.py -d ternary -c quantum -j 32
+
+The bit security (minimum over the attacks, -1 where the estimator fails) is stored as an int16 table in a .npz file,
+together with the axes and the estimator version, in the estimator cache directory by default. Security increases with n and decreases with log2 q, so for any point inside the grid the entries at the
+surrounding grid points bound its security from both sides: the point is decided from the grid when both bounds are
+at least margin bits on the same side of the target level, and by the estimator otherwise (near the boundary,
+outside the grid, next to failed estimates, or when the grid was built with another estimator version).
+'''
+
+from concurrent.futures import ProcessPoolExecutor
+from math import ceil, floor, log2
+
+import argparse
+import estimator_cache
+import json
+import numpy
+import os
+
+FAILED = -1
+
+def cost_model_name(is_quantum):
+    return "LaaMosPol14" if is_quantum else "BDGL16"
+
+def get_grid_path(grid_dir, secret_dist, is_quantum):
+    return os.path.join(grid_dir, "security_grid_" + secret_dist + "_" + cost_model_name(is_quantum) + ".npz")
+
+class SecurityGrid:
+    def __init__(self, path, margin = 1):
+        with numpy.load(path) as data:
+            self.meta = json.loads(str(data["meta"]))
+            self.table = data["table"]
+        self.path = path
+        self.margin = margin
+        self.hits = 0
+        self.misses = 0
+
+    def _index(self, value, first, step, count):
+        lo = floor((value - first)/step)
+        hi = ceil((value - first)/step)
+        if (lo < 0) or (hi >= count):
+            return None
+        return lo, hi
+
+    # True/False if dim with modulus 2**logmod is clearly above/below expected_sec_level, None if the estimator decides
+    def decide(self, dim, logmod, expected_sec_level):
+        n_index = self._index(dim, self.meta["n_min"], self.meta["n_step"], self.table.shape[0])
+        logq_index = self._index(logmod, self.meta["logq_min"], 1, self.table.shape[1])
+        if (n_index is None) or (logq_index is None):
+            self.misses += 1
+            return None
+
+        # smallest n and largest log q give the lower bound, largest n and smallest log q the upper bound
+        lower = int(self.table[n_index[0], logq_index[1]])
+        upper = int(self.table[n_index[1], logq_index[0]])
+        if (lower != FAILED) and (upper != FAILED):
+            if (lower >= expected_sec_level + self.margin):
+                self.hits += 1
+                return True
+            if (upper < expected_sec_level - self.margin):
+                self.hits += 1
+                return False
+        self.misses += 1
+        return None
+
+    def stats(self):
+        return "security grid (" + self.path + "): " + str(self.hits) + " hits, " + str(self.misses) + " estimator fallbacks"
+
+# the grid for a secret distribution and cost model, None if it has not been built for this estimator version
+def load_grid(grid_dir, secret_dist, is_quantum, version, margin = 1):
+    path = get_grid_path(grid_dir, secret_dist, is_quantum)
+    if not os.path.isfile(path):
+        return None
+    grid = SecurityGrid(path, margin)
+    if (grid.meta["version"] != version):
+        print("ignoring " + path + ", built with lattice-estimator " + grid.meta["version"])
+        return None
+    return grid
+
+def _estimate_point(point):
+    import binfhe_params_helper as helperfncs
+    dim, logmod, secret_dist, is_quantum = point
+    try:
+        return helperfncs.call_estimator(dim, 2**logmod, secret_dist, 1, is_quantum)
+    except Exception:
+        return FAILED
+
+def build_grid(grid_dir, secret_dist, is_quantum, n_min, n_max, n_step, logq_min, logq_max, jobs):
+    import binfhe_params_helper as helperfncs
+    dims = range(n_min, n_max + 1, n_step)
+    logmods = range(logq_min, logq_max + 1)
+    points = [(dim, logmod, secret_dist, is_quantum) for dim in dims for logmod in logmods]
+    print("estimating " + str(len(points)) + " points on " + str(jobs) + " processes")
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        values = list(executor.map(_estimate_point, points, chunksize=max(1, len(points)//(16*jobs))))
+    table = numpy.array(values, dtype=numpy.int16).reshape(len(dims), len(logmods))
+
+    # the table and its axes go to one file under a temporary name, so that a reader never sees a table without its axes
+    os.makedirs(grid_dir, exist_ok=True)
+    path = get_grid_path(grid_dir, secret_dist, is_quantum)
+    meta = {"n_min": n_min, "n_step": n_step, "logq_min": logq_min, "secret_dist": secret_dist,
+            "cost_model": cost_model_name(is_quantum), "version": helperfncs.get_estimator_version()}
+    with open(path + ".tmp", "wb") as f:
+        numpy.savez(f, table=table, meta=numpy.array(json.dumps(meta)))
+    os.replace(path + ".tmp", path)
+    print("wrote " + path)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the security grid for a secret distribution and cost model')
+    parser.add_argument('-d', '--secret_dist', choices=('error', 'ternary'), action='store', default='ternary')
+    parser.add_argument('-c', '--cost_model', choices=('quantum', 'classical'), action='store', default='quantum')
+    parser.add_argument('--n_min', action='store', default=100, type=int)
+    parser.add_argument('--n_max', action='store', default=2048, type=int)
+    parser.add_argument('--n_step', action='store', default=16, type=int)
+    parser.add_argument('--logq_min', action='store', default=1, type=int)
+    parser.add_argument('--logq_max', action='store', default=64, type=int)
+    parser.add_argument('-j', '--jobs', action='store', default=os.cpu_count(), type=int)
+    parser.add_argument('--grid_dir', action='store', default=None, help='output directory (default: the estimator cache directory)')
+    a = parser.parse_args()
+
+    grid_dir = a.grid_dir or os.environ.get("OPENFHE_ESTIMATOR_CACHE_DIR", estimator_cache.DEFAULT_CACHE_DIR)
+    build_grid(grid_dir, a.secret_dist, a.cost_model == 'quantum', a.n_min, a.n_max, a.n_step, a.logq_min, a.logq_max, a.jobs)
@@ -31,6 +31,18 @@
 
 /*
   Example for the FHEW scheme using the default bootstrapping method (GINX)
+
+  With -S the program runs as a noise sampling server: every line on stdin is a flat JSON object with the
+  parameter set (the keys are the names of the command line options below, e.g. {"n": 518, "N": 1024, ...}),
+  and every measurement is answered with one JSON line on stdout that holds the sizes, timings and the noise
+  samples. Process startup and library loading are then paid once per search instead of once per measurement.
+
+  With the request key "noise_file" (or -o on the command line) the noise samples are written to that file as raw
+  little-endian float64 values instead, and the response only holds their count ("noise_count").
+
+  The server keeps the keys of the last -c parameter sets in memory. With -K (request key "key_dir") the keys are
+  also serialized to that directory and loaded instead of generated when the same parameter set comes up again,
+  e.g. in another server process or a later run.
  */
 #define PROFILE
 
@@ -38,8 +50,23 @@
 #include "binfhecontext.h"
 #include "utils/sertype.h"
 #include "utils/serial.h"
+#include <algorithm>
+#include <cctype>
+#include <chrono>
+#include <cmath>
+#include <cstdio>
+#include <cstring>
+#include <fstream>
 #include <getopt.h>
+#include <iomanip>
+#include <limits>
+#include <list>
+#include <memory>
+#include <unistd.h>
 #include <unordered_map>
+#ifdef _OPENMP
+    #include <omp.h>
+#endif
 
 using namespace lbcrypto;
 
@@ -58,8 +85,18 @@ inline std::string usage() {
                        "  -d secret key distribution\n"
                        "  -a number of auto keys\n"
                        "  -I number of gate inputs\n"
+                       "  -G comma-separated list of gates to measure with the same keys, e.g. OR,AND3,XOR [default = OR of -I inputs]\n"
                        "  -i number of iterations\n"
+                       "  -T number of threads for noise sampling (the gate time is always measured on one thread)\n"
+                       "  -m number of single-threaded runs for the gate time when sampling with more than one thread\n"
                        "  -p label for named binfhe param set (overrides other settings)\n"
+                       "  -c number of parameter sets whose keys the server keeps in memory [default = 1]\n"
+                       "  -K directory for serialized keys, loaded instead of generated for known parameter sets\n"
+                       "  -o write the noise samples to this file as raw little-endian float64 values\n"
+                       "  -B benchmark mode: latencies of KeyGen, BTKeyGen, Encrypt, EvalBinGate and Decrypt as JSON\n"
+                       "  -w number of untimed warmup runs in benchmark mode [default = 5]\n"
+                       "  -R number of BTKeyGen runs in benchmark mode [default = 1]\n"
+                       "  -S run as a noise sampling server (line-delimited JSON on stdin/stdout)\n"
                        "  -h display this message\n"
                      );
 }
@@ -86,9 +123,24 @@ static const std::unordered_map<std::string, BINFHE_PARAMSET> ptable = {
     {"SIGNED_MOD_TEST", SIGNED_MOD_TEST}
 };
 
-static const std::unordered_map<uint32_t, BINGATE> gtable = { {2, OR}, {3, OR3}, {4, OR4} };
+// gate, number of inputs and the result of the gate on encryptions of 0 (the expected decryption)
+struct GateInfo {
+    BINGATE gate;
+    uint32_t num_of_inputs;
+    LWEPlaintext expected;
+};
+
+static const std::unordered_map<std::string, GateInfo> gtable = {
+    {"OR", {OR, 2, 0}}, {"AND", {AND, 2, 0}}, {"NOR", {NOR, 2, 1}}, {"NAND", {NAND, 2, 1}},
+    {"XOR", {XOR, 2, 0}}, {"XNOR", {XNOR, 2, 1}},
+    {"OR3", {OR3, 3, 0}}, {"AND3", {AND3, 3, 0}}, {"MAJORITY", {MAJORITY, 3, 0}},
+    {"OR4", {OR4, 4, 0}}, {"AND4", {AND4, 4, 0}}
+};
+
+// gate measured when no gates are given
+static const std::unordered_map<uint32_t, std::string> default_gates = { {2, "OR"}, {3, "OR3"}, {4, "OR4"} };
 
-int main(int argc, char* argv[]) {
+struct NoiseParams {
     uint32_t dim_n                   = 0;
     uint64_t Qks                     = 0;
     uint32_t dim_N                   = 0;
@@ -103,7 +155,796 @@ int main(int argc, char* argv[]) {
     uint32_t numAutoKeys             = 10;
     uint32_t num_of_inputs           = 2;
     uint32_t num_of_runs             = 200;
+    uint32_t num_threads             = 1;
+    uint32_t num_timing_runs         = 20;
+    bool benchmark                   = false;
+    uint32_t num_warmup_runs         = 5;
+    uint32_t num_btkeygen_runs       = 1;
+    std::vector<std::string> gates;
     std::string namedparamset;
+    std::string noise_file;
+    std::string key_dir;
+};
+
+struct GateResult {
+    std::string name;
+    uint32_t num_of_inputs = 2;
+    double gate_time_ms    = 0;
+    uint32_t failures      = 0;
+    std::vector<double> noise;
+};
+
+struct NoiseResult {
+    double keygen_time_ms         = 0;
+    size_t bootstrapping_key_size = 0;
+    size_t key_switching_key_size = 0;
+    size_t ciphertext_size        = 0;
+    NativeInteger ctmodq;
+    std::vector<GateResult> gates;  // one result per measured gate, in the order of the request
+};
+
+// redirects std::cerr into a buffer for its lifetime
+class CerrCapture {
+public:
+    CerrCapture() : oldbuf(std::cerr.rdbuf(buffer.rdbuf())) {}
+    ~CerrCapture() {
+        std::cerr.rdbuf(oldbuf);
+    }
+    std::string str() const {
+        return buffer.str();
+    }
+
+private:
+    std::ostringstream buffer;
+    std::streambuf* oldbuf;
+};
+
+static BINFHE_METHOD get_method(uint32_t bootstrapping_technique) {
+    if (bootstrapping_technique == 1)
+        return AP;
+    if (bootstrapping_technique == 2)
+        return GINX;
+    if (bootstrapping_technique == 3)
+        return LMKCDEY;
+    OPENFHE_THROW("invalid bootstrapping technique");
+}
+
+// splits a comma-separated list of gate names
+static std::vector<std::string> parse_gates(const std::string& list) {
+    std::vector<std::string> gates;
+    std::istringstream in(list);
+    for (std::string gate; std::getline(in, gate, ',');) {
+        if (!gtable.count(gate))
+            OPENFHE_THROW("unknown gate " + gate);
+        gates.push_back(gate);
+    }
+    return gates;
+}
+
+// the gates of a measurement: prm.gates, or the OR gate with prm.num_of_inputs inputs
+static std::vector<std::string> get_gates(const NoiseParams& prm) {
+    if (!prm.gates.empty())
+        return prm.gates;
+    if ((prm.num_of_inputs < 2) || (prm.num_of_inputs > 4))
+        OPENFHE_THROW("num_of_inputs not in [2, 3, 4]");
+    return {default_gates.at(prm.num_of_inputs)};
+}
+
+static void generate_context(BinFHEContext& cc, const NoiseParams& prm) {
+    BinFHEContextParams paramset;
+    paramset.cyclOrder    = 2 * prm.dim_N;
+    paramset.modKS        = prm.Qks;
+    paramset.gadgetBase   = prm.B_g;
+    paramset.baseKS       = prm.B_ks;
+    paramset.baseRK       = prm.B_rk;
+    paramset.mod          = prm.ctmodq;
+    paramset.numberBits   = prm.logQ;
+    paramset.stdDev       = prm.sigma;
+    paramset.latticeParam = prm.dim_n;
+    paramset.numAutoKeys  = prm.numAutoKeys;
+
+    if (prm.secret_dist == 0) {
+        paramset.keyDist = GAUSSIAN;
+    } else if (prm.secret_dist == 1) {
+        paramset.keyDist = UNIFORM_TERNARY;
+    } else {
+        OPENFHE_THROW("invalid secret key distribution");
+    }
+
+    auto bt = get_method(prm.bootstrapping_technique);
+    if (!prm.namedparamset.empty()) {
+        cc.GenerateBinFHEContext(ptable.at(prm.namedparamset), bt);
+    } else {
+        cc.GenerateBinFHEContext(paramset, bt);
+    }
+}
+
+// context and keys of one parameter set, kept alive by the server so that further samples for the same
+// parameters do not pay for key generation again
+struct NoiseSession {
+    NoiseParams prm;
+    BinFHEContext cc;
+    LWEPrivateKey sk;
+    NoiseResult keys;  // key generation time and sizes
+};
+
+// true if both parameter sets use the same context and keys (they may differ in the number of runs and in the
+// gates, every gate is evaluated with the same bootstrapping keys)
+static bool same_keys(const NoiseParams& a, const NoiseParams& b) {
+    return a.dim_n == b.dim_n && a.Qks == b.Qks && a.dim_N == b.dim_N && a.ctmodq == b.ctmodq && a.logQ == b.logQ &&
+           a.B_g == b.B_g && a.B_ks == b.B_ks && a.B_rk == b.B_rk && a.sigma == b.sigma &&
+           a.bootstrapping_technique == b.bootstrapping_technique && a.secret_dist == b.secret_dist &&
+           a.numAutoKeys == b.numAutoKeys && a.namedparamset == b.namedparamset;
+}
+
+// output buffer that discards the bytes written to it and only counts them
+class CountingStreambuf : public std::streambuf {
+public:
+    std::streamsize count() const {
+        return bytes;
+    }
+
+protected:
+    int_type overflow(int_type c) override {
+        if (!traits_type::eq_int_type(c, traits_type::eof()))
+            ++bytes;
+        return traits_type::not_eof(c);
+    }
+    std::streamsize xsputn(const char*, std::streamsize n) override {
+        bytes += n;
+        return n;
+    }
+
+private:
+    std::streamsize bytes = 0;
+};
+
+// size of the binary serialization of obj, without holding the serialized bytes in memory (the key switching key of
+// an STD256 parameter set serializes to almost 1 GB)
+template <typename T>
+static size_t serialized_size(const T& obj) {
+    CountingStreambuf counter;
+    std::ostream out(&counter);
+    lbcrypto::Serial::Serialize(obj, out, lbcrypto::SerType::BINARY);
+    return counter.count();
+}
+
+// size of the serialized bootstrapping and key switching keys and of a ciphertext, ciphertext modulus
+static void set_key_info(NoiseSession& session, bool key_sizes) {
+    auto& cc  = session.cc;
+    auto& res = session.keys;
+
+    if (key_sizes) {
+        res.bootstrapping_key_size = serialized_size(cc.GetRefreshKey());
+        res.key_switching_key_size = serialized_size(cc.GetSwitchKey());
+    }
+
+    res.ciphertext_size = serialized_size(cc.Encrypt(session.sk, 0, SMALL_DIM, 4));
+    res.ctmodq          = cc.GetParams()->GetLWEParams()->Getq();
+}
+
+static std::unique_ptr<NoiseSession> create_session(const NoiseParams& prm) {
+    auto session = std::make_unique<NoiseSession>();
+    session->prm = prm;
+    auto& cc     = session->cc;
+    auto& res    = session->keys;
+
+    // Sample Program: Step 1: Set CryptoContext
+    generate_context(cc, prm);
+
+    // Sample Program: Step 2: Key Generation
+
+    TimeVar t;
+    TIC(t);
+    session->sk = cc.KeyGen();
+    cc.BTKeyGen(session->sk);
+    res.keygen_time_ms = TOC_MS(t);
+
+    set_key_info(*session, true);
+    return session;
+}
+
+// path prefix of the serialized keys of a parameter set, every parameter that affects the keys is part of the name
+static std::string key_file_prefix(const NoiseParams& prm) {
+    std::ostringstream name;
+    name << prm.key_dir << "/";
+    if (!prm.namedparamset.empty())
+        name << prm.namedparamset;
+    else
+        name << "n" << prm.dim_n << "_N" << prm.dim_N << "_q" << prm.ctmodq << "_Q" << prm.logQ << "_Qks" << prm.Qks
+             << "_Bg" << prm.B_g << "_Bks" << prm.B_ks << "_Brk" << prm.B_rk << "_s" << prm.sigma << "_d"
+             << prm.secret_dist << "_a" << prm.numAutoKeys;
+    name << "_t" << prm.bootstrapping_technique;
+    return name.str();
+}
+
+// loads the keys of a parameter set from prm.key_dir, nullptr if they have not been saved
+static std::unique_ptr<NoiseSession> load_session(const NoiseParams& prm) {
+    const auto prefix = key_file_prefix(prm);
+    std::ifstream info(prefix + ".info");
+    if (!info)
+        return nullptr;
+
+    auto session = std::make_unique<NoiseSession>();
+    session->prm = prm;
+    auto& res    = session->keys;
+    std::string tag;
+    if (!(info >> res.keygen_time_ms >> res.bootstrapping_key_size >> res.key_switching_key_size >> tag))
+        return nullptr;
+
+    generate_context(session->cc, prm);
+    RingGSWACCKey bkey;
+    LWESwitchingKey kskey;
+    const auto keys = prefix + "." + tag;
+    if (!Serial::DeserializeFromFile(keys + ".sk", session->sk, SerType::BINARY) ||
+        !Serial::DeserializeFromFile(keys + ".bk", bkey, SerType::BINARY) ||
+        !Serial::DeserializeFromFile(keys + ".ksk", kskey, SerType::BINARY))
+        return nullptr;
+    session->cc.BTKeyLoad({bkey, kskey});
+
+    set_key_info(*session, false);
+    return session;
+}
+
+// saves the keys of a session to prm.key_dir. Every process writes its keys under its own tag (pid and time), and
+// the info file, which names the tag of the complete set, is written to a temporary file and renamed into place last:
+// processes that save the same parameter set concurrently never overwrite each other's keys, and a loader always
+// reads the secret, bootstrapping and key switching key of one set. The keys of a set whose info file was replaced
+// by another process stay behind unused.
+static void save_session(const NoiseSession& session) {
+    const auto prefix = key_file_prefix(session.prm);
+    const auto& res   = session.keys;
+    const auto tag    = std::to_string(getpid()) + "-" +
+                     std::to_string(std::chrono::system_clock::now().time_since_epoch().count());
+    const auto keys = prefix + "." + tag;
+    if (!Serial::SerializeToFile(keys + ".sk", session.sk, SerType::BINARY) ||
+        !Serial::SerializeToFile(keys + ".bk", session.cc.GetRefreshKey(), SerType::BINARY) ||
+        !Serial::SerializeToFile(keys + ".ksk", session.cc.GetSwitchKey(), SerType::BINARY))
+        OPENFHE_THROW("cannot write keys to " + session.prm.key_dir);
+
+    const auto tmp = prefix + ".info." + tag;
+    {
+        std::ofstream info(tmp);
+        info << res.keygen_time_ms << " " << res.bootstrapping_key_size << " " << res.key_switching_key_size << " "
+             << tag << std::endl;
+        if (!info)
+            OPENFHE_THROW("cannot write keys to " + session.prm.key_dir);
+    }
+    if (std::rename(tmp.c_str(), (prefix + ".info").c_str()) != 0)
+        OPENFHE_THROW("cannot write keys to " + session.prm.key_dir);
+}
+
+// keys for a parameter set: loaded from prm.key_dir if saved there, otherwise generated (and saved)
+static std::unique_ptr<NoiseSession> get_session(const NoiseParams& prm, bool& keys_loaded) {
+    keys_loaded = false;
+    if (prm.key_dir.empty())
+        return create_session(prm);
+
+    auto session = load_session(prm);
+    if (session) {
+        keys_loaded = true;
+        return session;
+    }
+    session = create_session(prm);
+    save_session(*session);
+    return session;
+}
+
+// sets the number of OpenMP threads for its lifetime
+class OmpThreads {
+public:
+    explicit OmpThreads(uint32_t num_threads) {
+#ifdef _OPENMP
+        oldthreads = omp_get_max_threads();
+        omp_set_num_threads(num_threads);
+#endif
+    }
+    ~OmpThreads() {
+#ifdef _OPENMP
+        omp_set_num_threads(oldthreads);
+#endif
+    }
+
+private:
+    int oldthreads = 1;
+};
+
+// The noise of every decryption is written to std::cerr by OpenFHE (WITH_NOISE_DEBUG). With capture_noise the
+// samples are collected into the result instead of passing through to stderr.
+//
+// With prm.num_threads > 1 all but prm.num_timing_runs runs are spread over that many threads with one set of
+// ciphertexts per thread; the decryptions are serialized so that the noise lines written by OpenFHE stay intact.
+// EvalBinGateTime always comes from a separate single-threaded pass over the remaining runs, so the reported
+// latency does not depend on the number of sampling threads.
+static GateResult sample_gate_noise(const NoiseSession& session, const NoiseParams& prm, const std::string& name, bool capture_noise) {
+    GateResult res;
+    const auto& cc   = session.cc;
+    const auto& sk   = session.sk;
+    const auto& info = gtable.at(name);
+    res.name          = name;
+    res.num_of_inputs = info.num_of_inputs;
+
+    // Sample Program: Step 3: Encryption
+
+    const auto num_of_inputs = info.num_of_inputs;
+    const auto p             = 2 * num_of_inputs;
+
+    // Sample Program: Step 4: Evaluation
+
+    const auto eq2 = num_of_inputs == 2;
+
+    std::unique_ptr<CerrCapture> capture;
+    if (capture_noise)
+        capture = std::make_unique<CerrCapture>();
+
+    const uint32_t timing_runs   = (prm.num_threads > 1) ? std::min(prm.num_of_runs, prm.num_timing_runs) : prm.num_of_runs;
+    const uint32_t parallel_runs = prm.num_of_runs - timing_runs;
+    if (parallel_runs > 0) {
+        uint32_t failures = 0;
+#pragma omp parallel num_threads(prm.num_threads) reduction(+ : failures)
+        {
+            std::vector<LWECiphertext> cts(num_of_inputs);
+            LWEPlaintext result;
+#pragma omp for schedule(dynamic)
+            for (uint32_t i = 0; i < parallel_runs; ++i) {
+                for (auto&& ct : cts)
+                    ct = cc.Encrypt(sk, 0, SMALL_DIM, p);
+
+                auto ct = eq2 ? cc.EvalBinGate(info.gate, cts[0], cts[1]) : cc.EvalBinGate(info.gate, cts);
+
+#pragma omp critical(decrypt)
+                cc.Decrypt(sk, ct, &result, p);
+
+                if (result != info.expected)
+                    ++failures;
+            }
+        }
+        res.failures += failures;
+    }
+
+    {
+        OmpThreads single(1);
+        std::vector<LWECiphertext> cts(num_of_inputs);
+
+        // only the gate evaluation is timed, in nanoseconds
+        TimeVar t;
+        uint64_t gate_time_ns = 0;
+        LWEPlaintext result;
+        for (uint32_t i = 0; i < timing_runs; ++i) {
+            for (auto&& ct : cts)
+                ct = cc.Encrypt(sk, 0, SMALL_DIM, p);
+
+            TIC(t);
+            auto ct = eq2 ? cc.EvalBinGate(info.gate, cts[0], cts[1]) : cc.EvalBinGate(info.gate, cts);
+            gate_time_ns += TOC_NS(t);
+
+            cc.Decrypt(sk, ct, &result, p);
+
+            if (result != info.expected)
+                ++res.failures;
+        }
+        res.gate_time_ms = timing_runs ? gate_time_ns / 1e6 / timing_runs : 0;
+    }
+
+    if (capture) {
+        std::istringstream samples(capture->str());
+        capture.reset();
+        for (double v; samples >> v;)
+            res.noise.push_back(v);
+    }
+
+    return res;
+}
+
+// measures every gate of the request with the keys of the session, one after the other
+static NoiseResult sample_noise(const NoiseSession& session, const NoiseParams& prm, bool capture_noise) {
+    NoiseResult res = session.keys;
+    for (const auto& gate : get_gates(prm))
+        res.gates.push_back(sample_gate_noise(session, prm, gate, capture_noise));
+    return res;
+}
+
+// latency statistics of a set of timed runs, in nanoseconds
+struct LatencyStats {
+    size_t count  = 0;
+    double mean   = 0;
+    double stddev = 0;
+    uint64_t min  = 0;
+    uint64_t p50  = 0;
+    uint64_t p90  = 0;
+    uint64_t p99  = 0;
+    uint64_t max  = 0;
+};
+
+struct GateBenchmark {
+    std::string name;
+    uint32_t num_of_inputs = 2;
+    uint32_t failures      = 0;
+    LatencyStats encrypt;
+    LatencyStats eval;
+    LatencyStats decrypt;
+};
+
+struct BenchmarkResult {
+    LatencyStats keygen;
+    LatencyStats btkeygen;
+    std::vector<GateBenchmark> gates;
+};
+
+static LatencyStats get_latency_stats(std::vector<uint64_t> times) {
+    LatencyStats stats;
+    stats.count = times.size();
+    if (times.empty())
+        return stats;
+
+    std::sort(times.begin(), times.end());
+    // nearest-rank percentile
+    auto percentile = [&](double p) {
+        return times[std::max<size_t>(1, static_cast<size_t>(std::ceil(p / 100 * times.size()))) - 1];
+    };
+    double sum = 0;
+    for (auto v : times)
+        sum += v;
+    stats.mean = sum / times.size();
+    double M2 = 0;
+    for (auto v : times)
+        M2 += (v - stats.mean) * (v - stats.mean);
+    stats.stddev = (times.size() > 1) ? std::sqrt(M2 / (times.size() - 1)) : 0;
+    stats.min    = times.front();
+    stats.p50    = percentile(50);
+    stats.p90    = percentile(90);
+    stats.p99    = percentile(99);
+    stats.max    = times.back();
+    return stats;
+}
+
+// Times KeyGen, BTKeyGen and, for every gate of the request, Encrypt, EvalBinGate and Decrypt one call at a time on
+// a single thread, after prm.num_warmup_runs untimed runs. BTKeyGen is run prm.num_btkeygen_runs times on the
+// context of the session (regenerating its keys for the same secret key) without warmup, it is too expensive to
+// repeat. The noise that OpenFHE writes for every decryption is captured and dropped, writing it is part of the
+// Decrypt latency of a WITH_NOISE_DEBUG build.
+static BenchmarkResult benchmark(NoiseSession& session, const NoiseParams& prm) {
+    BenchmarkResult res;
+    auto& cc       = session.cc;
+    const auto& sk = session.sk;
+    const auto runs = prm.num_warmup_runs + prm.num_of_runs;
+
+    OmpThreads single(1);
+    CerrCapture capture;
+    TimeVar t;
+
+    std::vector<uint64_t> times;
+    for (uint32_t i = 0; i < runs; ++i) {
+        TIC(t);
+        auto key     = cc.KeyGen();
+        auto elapsed = TOC_NS(t);
+        if (i >= prm.num_warmup_runs)
+            times.push_back(elapsed);
+    }
+    res.keygen = get_latency_stats(times);
+
+    times.clear();
+    for (uint32_t i = 0; i < prm.num_btkeygen_runs; ++i) {
+        TIC(t);
+        cc.BTKeyGen(sk);
+        times.push_back(TOC_NS(t));
+    }
+    res.btkeygen = get_latency_stats(times);
+
+    for (const auto& name : get_gates(prm)) {
+        const auto& info = gtable.at(name);
+        const auto p     = 2 * info.num_of_inputs;
+        GateBenchmark gate;
+        gate.name          = name;
+        gate.num_of_inputs = info.num_of_inputs;
+
+        std::vector<uint64_t> encrypt, eval, decrypt;
+        std::vector<LWECiphertext> cts(info.num_of_inputs);
+        LWEPlaintext result;
+        for (uint32_t i = 0; i < runs; ++i) {
+            const bool timed = i >= prm.num_warmup_runs;
+            for (auto&& ct : cts) {
+                TIC(t);
+                ct           = cc.Encrypt(sk, 0, SMALL_DIM, p);
+                auto elapsed = TOC_NS(t);
+                if (timed)
+                    encrypt.push_back(elapsed);
+            }
+
+            TIC(t);
+            auto ct = (info.num_of_inputs == 2) ? cc.EvalBinGate(info.gate, cts[0], cts[1]) : cc.EvalBinGate(info.gate, cts);
+            auto elapsed = TOC_NS(t);
+            if (timed)
+                eval.push_back(elapsed);
+
+            TIC(t);
+            cc.Decrypt(sk, ct, &result, p);
+            elapsed = TOC_NS(t);
+            if (timed) {
+                decrypt.push_back(elapsed);
+                if (result != info.expected)
+                    ++gate.failures;
+            }
+        }
+        gate.encrypt = get_latency_stats(encrypt);
+        gate.eval    = get_latency_stats(eval);
+        gate.decrypt = get_latency_stats(decrypt);
+        res.gates.push_back(gate);
+    }
+    return res;
+}
+
+// minimal parser for the flat JSON objects of the server protocol: {"key": number or "string", ...}
+static std::unordered_map<std::string, std::string> parse_request(const std::string& line) {
+    std::unordered_map<std::string, std::string> kv;
+    size_t pos = line.find('{');
+    if (pos == std::string::npos)
+        OPENFHE_THROW("request is not a JSON object");
+    ++pos;
+
+    auto skip_ws = [&]() {
+        while (pos < line.size() && std::isspace(static_cast<unsigned char>(line[pos])))
+            ++pos;
+    };
+    auto read_string = [&]() {
+        std::string str;
+        for (++pos; pos < line.size() && line[pos] != '"'; ++pos) {
+            if (line[pos] == '\\')
+                ++pos;
+            str += line[pos];
+        }
+        ++pos;
+        return str;
+    };
+
+    while (true) {
+        skip_ws();
+        if (pos >= line.size())
+            OPENFHE_THROW("unterminated JSON object");
+        if (line[pos] == '}')
+            break;
+        if (line[pos] == ',') {
+            ++pos;
+            continue;
+        }
+        if (line[pos] != '"')
+            OPENFHE_THROW("expected a key in the JSON object");
+        auto key = read_string();
+        skip_ws();
+        if (pos >= line.size() || line[pos] != ':')
+            OPENFHE_THROW("expected ':' after key " + key);
+        ++pos;
+        skip_ws();
+        if (pos < line.size() && line[pos] == '"') {
+            kv[key] = read_string();
+        } else {
+            auto end = line.find_first_of(",}", pos);
+            auto value = line.substr(pos, end - pos);
+            value.erase(value.find_last_not_of(" \t\r\n") + 1);
+            kv[key] = value;
+            pos = end;
+        }
+    }
+    return kv;
+}
+
+static NoiseParams params_from_request(const std::unordered_map<std::string, std::string>& kv) {
+    NoiseParams prm;
+    for (const auto& [key, value] : kv) {
+        if (key == "n")
+            prm.dim_n = std::stoul(value);
+        else if (key == "N")
+            prm.dim_N = std::stoul(value);
+        else if (key == "q")
+            prm.ctmodq = std::stoul(value);
+        else if (key == "logQ")
+            prm.logQ = std::stoul(value);
+        else if (key == "Qks")
+            prm.Qks = std::stoull(value);
+        else if (key == "B_g")
+            prm.B_g = std::stoul(value);
+        else if (key == "B_ks")
+            prm.B_ks = std::stoul(value);
+        else if (key == "B_rk")
+            prm.B_rk = std::stoul(value);
+        else if (key == "sigma")
+            prm.sigma = std::stod(value);
+        else if (key == "bootstrapping_tech")
+            prm.bootstrapping_technique = std::stoul(value);
+        else if (key == "secret_dist")
+            prm.secret_dist = std::stoul(value);
+        else if (key == "num_auto_keys")
+            prm.numAutoKeys = std::stoul(value);
+        else if (key == "num_of_inputs")
+            prm.num_of_inputs = std::stoul(value);
+        else if (key == "gates")
+            prm.gates = parse_gates(value);
+        else if (key == "num_of_samples")
+            prm.num_of_runs = std::stoul(value);
+        else if (key == "num_threads")
+            prm.num_threads = std::stoul(value);
+        else if (key == "num_timing_runs")
+            prm.num_timing_runs = std::stoul(value);
+        else if (key == "paramset")
+            prm.namedparamset = value;
+        else if (key == "benchmark")
+            prm.benchmark = std::stoul(value) != 0;
+        else if (key == "num_warmup_runs")
+            prm.num_warmup_runs = std::stoul(value);
+        else if (key == "num_btkeygen_runs")
+            prm.num_btkeygen_runs = std::stoul(value);
+        else if (key == "noise_file")
+            prm.noise_file = value;
+        else if (key == "key_dir")
+            prm.key_dir = value;
+        else
+            OPENFHE_THROW("unknown request key " + key);
+    }
+    return prm;
+}
+
+static std::string json_escape(const std::string& str) {
+    std::string out;
+    for (auto c : str) {
+        if (c == '"' || c == '\\')
+            out += '\\';
+        out += (c == '\n') ? ' ' : c;
+    }
+    return out;
+}
+
+// writes the noise samples of all gates one after the other as raw little-endian float64 values
+static void write_noise_file(const std::string& path, const std::vector<GateResult>& gates) {
+    std::ofstream out(path, std::ios::binary | std::ios::trunc);
+    if (!out)
+        OPENFHE_THROW("cannot open noise file " + path);
+
+    const uint16_t probe = 1;
+    const bool little    = *reinterpret_cast<const uint8_t*>(&probe) == 1;
+    for (const auto& gate : gates) {
+        const auto& noise = gate.noise;
+        if (little) {
+            out.write(reinterpret_cast<const char*>(noise.data()), noise.size() * sizeof(double));
+        }
+        else {
+            for (double v : noise) {
+                char bytes[sizeof(double)];
+                std::memcpy(bytes, &v, sizeof(double));
+                std::reverse(bytes, bytes + sizeof(double));
+                out.write(bytes, sizeof(double));
+            }
+        }
+    }
+    if (!out.flush())
+        OPENFHE_THROW("cannot write noise file " + path);
+}
+
+// the per-gate fields of a response, without braces
+static void gate_to_json(std::ostream& out, const GateResult& gate, bool noise_in_file) {
+    out << "\"EvalBinGateTime\": " << gate.gate_time_ms
+        << ", \"Gate\": \"" << gate.name << "\""
+        << ", \"num_of_inputs\": " << gate.num_of_inputs
+        << ", \"Failures\": " << gate.failures;
+    if (noise_in_file) {
+        out << ", \"noise_count\": " << gate.noise.size();
+        return;
+    }
+    out << ", \"noise\": [";
+    for (size_t i = 0; i < gate.noise.size(); ++i)
+        out << (i ? ", " : "") << gate.noise[i];
+    out << "]";
+}
+
+// a request without "gates" is answered with the fields of its single gate at the top level, a request with
+// "gates" with a "Gates" list (the samples of the gates follow each other in the noise file)
+static std::string result_to_json(const NoiseResult& res, bool keys_reused, bool keys_loaded, bool noise_in_file, bool gate_list) {
+    std::ostringstream out;
+    out << std::setprecision(std::numeric_limits<double>::max_digits10);
+    out << "{\"BootstrapKeyGenTime\": " << res.keygen_time_ms
+        << ", \"BootstrappingKeySize\": " << res.bootstrapping_key_size
+        << ", \"KeySwitchingKeySize\": " << res.key_switching_key_size
+        << ", \"CiphertextSize\": " << res.ciphertext_size
+        << ", \"ctmodq\": " << res.ctmodq
+        << ", \"KeysReused\": " << (keys_reused ? "true" : "false")
+        << ", \"KeysLoaded\": " << (keys_loaded ? "true" : "false") << ", ";
+    if (!gate_list) {
+        gate_to_json(out, res.gates.front(), noise_in_file);
+        out << "}";
+        return out.str();
+    }
+    out << "\"Gates\": [";
+    for (size_t i = 0; i < res.gates.size(); ++i) {
+        out << (i ? ", {" : "{");
+        gate_to_json(out, res.gates[i], noise_in_file);
+        out << "}";
+    }
+    out << "]}";
+    return out.str();
+}
+
+static void stats_to_json(std::ostream& out, const LatencyStats& stats) {
+    out << "{\"count\": " << stats.count << ", \"mean_ns\": " << stats.mean << ", \"stddev_ns\": " << stats.stddev
+        << ", \"min_ns\": " << stats.min << ", \"p50_ns\": " << stats.p50 << ", \"p90_ns\": " << stats.p90
+        << ", \"p99_ns\": " << stats.p99 << ", \"max_ns\": " << stats.max << "}";
+}
+
+static std::string benchmark_to_json(const NoiseResult& keys, const BenchmarkResult& res, bool keys_reused, bool keys_loaded) {
+    std::ostringstream out;
+    out << std::setprecision(std::numeric_limits<double>::max_digits10);
+    out << "{\"BootstrappingKeySize\": " << keys.bootstrapping_key_size
+        << ", \"KeySwitchingKeySize\": " << keys.key_switching_key_size
+        << ", \"CiphertextSize\": " << keys.ciphertext_size
+        << ", \"ctmodq\": " << keys.ctmodq
+        << ", \"KeysReused\": " << (keys_reused ? "true" : "false")
+        << ", \"KeysLoaded\": " << (keys_loaded ? "true" : "false");
+    out << ", \"KeyGen\": ";
+    stats_to_json(out, res.keygen);
+    out << ", \"BTKeyGen\": ";
+    stats_to_json(out, res.btkeygen);
+    out << ", \"Gates\": [";
+    for (size_t i = 0; i < res.gates.size(); ++i) {
+        const auto& gate = res.gates[i];
+        out << (i ? ", " : "") << "{\"Gate\": \"" << gate.name << "\", \"num_of_inputs\": " << gate.num_of_inputs
+            << ", \"Failures\": " << gate.failures << ", \"Encrypt\": ";
+        stats_to_json(out, gate.encrypt);
+        out << ", \"EvalBinGate\": ";
+        stats_to_json(out, gate.eval);
+        out << ", \"Decrypt\": ";
+        stats_to_json(out, gate.decrypt);
+        out << "}";
+    }
+    out << "]}";
+    return out.str();
+}
+
+// answer one measurement per request line until stdin is closed; the keys of the last session_cache_size parameter
+// sets are kept, so that consecutive requests for the same parameters (e.g. the batches of an adaptive noise
+// comparison) and parameter sets that come up again (e.g. the final measurement of a search) reuse them
+static int run_server(size_t session_cache_size, const std::string& key_dir) {
+    std::list<std::unique_ptr<NoiseSession>> sessions;  // most recently used first
+    for (std::string line; std::getline(std::cin, line);) {
+        if (line.find_first_not_of(" \t\r") == std::string::npos)
+            continue;
+        try {
+            auto prm = params_from_request(parse_request(line));
+            if (prm.key_dir.empty())
+                prm.key_dir = key_dir;
+            auto it  = std::find_if(sessions.begin(), sessions.end(), [&](const auto& session) { return same_keys(session->prm, prm); });
+
+            bool keys_reused = it != sessions.end();
+            bool keys_loaded = false;
+            if (keys_reused) {
+                sessions.splice(sessions.begin(), sessions, it);
+            }
+            else {
+                // drop the least recently used keys before generating new ones
+                while (!sessions.empty() && sessions.size() >= session_cache_size)
+                    sessions.pop_back();
+                sessions.push_front(get_session(prm, keys_loaded));
+            }
+
+            if (prm.benchmark) {
+                auto res = benchmark(*sessions.front(), prm);
+                std::cout << benchmark_to_json(sessions.front()->keys, res, keys_reused, keys_loaded) << std::endl;
+                continue;
+            }
+
+            auto res = sample_noise(*sessions.front(), prm, true);
+            if (!prm.noise_file.empty())
+                write_noise_file(prm.noise_file, res.gates);
+            std::cout << result_to_json(res, keys_reused, keys_loaded, !prm.noise_file.empty(), !prm.gates.empty()) << std::endl;
+        }
+        catch (const std::exception& e) {
+            std::cout << "{\"error\": \"" << json_escape(e.what()) << "\"}" << std::endl;
+        }
+    }
+    return 0;
+}
+
+int main(int argc, char* argv[]) {
+    NoiseParams prm;
+    bool server               = false;
+    size_t session_cache_size = 1;
 
     static struct option long_options[] = {{"lattice dimension", required_argument, NULL, 'n'},
                                            {"ring dimension", required_argument, NULL, 'N'},
@@ -118,61 +959,101 @@ int main(int argc, char* argv[]) {
                                            {"secret key distribution", required_argument, NULL, 'd'},
                                            {"number of auto keys", required_argument, NULL, 'a'},
                                            {"number of gate inputs", required_argument, NULL, 'I'},
+                                           {"gates", required_argument, NULL, 'G'},
                                            {"number of iterations", required_argument, NULL, 'i'},
+                                           {"number of sampling threads", required_argument, NULL, 'T'},
+                                           {"number of timing runs", required_argument, NULL, 'm'},
+                                           {"noise output file", required_argument, NULL, 'o'},
+                                           {"key cache size", required_argument, NULL, 'c'},
+                                           {"key directory", required_argument, NULL, 'K'},
                                            {"label for named binfhe param set (overrides other settings)", required_argument, NULL, 'p'},
+                                           {"benchmark", no_argument, NULL, 'B'},
+                                           {"number of warmup runs", required_argument, NULL, 'w'},
+                                           {"number of BTKeyGen runs", required_argument, NULL, 'R'},
+                                           {"server", no_argument, NULL, 'S'},
                                            {"help", no_argument, NULL, 'h'},
                                            {NULL, 0, NULL, 0}};
 
     char opt(0);
-    const char* optstring = "n:N:q:Q:k:g:r:b:s:t:d:a:I:i:p:h";
+    const char* optstring = "n:N:q:Q:k:g:r:b:s:t:d:a:I:G:i:T:m:o:c:K:p:Bw:R:Sh";
     while ((opt = getopt_long(argc, argv, optstring, long_options, NULL)) != -1) {
-        std::cout << "opt1: " << opt << "; optarg: " << optarg << std::endl;
+        std::cout << "opt1: " << opt << "; optarg: " << (optarg ? optarg : "") << std::endl;
         switch (opt) {
             case 'n':
-                dim_n = atoi(optarg);
+                prm.dim_n = atoi(optarg);
                 break;
             case 'N':
-                dim_N = atoi(optarg);
+                prm.dim_N = atoi(optarg);
                 break;
             case 'Q':
-                logQ = atoi(optarg);
+                prm.logQ = atoi(optarg);
                 break;
             case 'q':
-                ctmodq = atoi(optarg);
+                prm.ctmodq = atoi(optarg);
                 break;
             case 'k':
                 // Qks = atoi(optarg);
-                std::stringstream(optarg) >> Qks;
+                std::stringstream(optarg) >> prm.Qks;
                 break;
             case 'g':
-                B_g = atoi(optarg);
+                prm.B_g = atoi(optarg);
                 break;
             case 'b':
-                B_ks = atoi(optarg);
+                prm.B_ks = atoi(optarg);
                 break;
             case 'r':
-                B_rk = atoi(optarg);
+                prm.B_rk = atoi(optarg);
                 break;
             case 's':
-                sigma = atof(optarg);
+                prm.sigma = atof(optarg);
                 break;
             case 't':
-                bootstrapping_technique = atoi(optarg);
+                prm.bootstrapping_technique = atoi(optarg);
                 break;
             case 'd':
-                secret_dist = atoi(optarg);
+                prm.secret_dist = atoi(optarg);
                 break;
             case 'a':
-                numAutoKeys = atoi(optarg);
+                prm.numAutoKeys = atoi(optarg);
                 break;
             case 'I':
-                num_of_inputs = atoi(optarg);
+                prm.num_of_inputs = atoi(optarg);
+                break;
+            case 'G':
+                prm.gates = parse_gates(optarg);
                 break;
             case 'i':
-                num_of_runs = atoi(optarg);
+                prm.num_of_runs = atoi(optarg);
+                break;
+            case 'T':
+                prm.num_threads = atoi(optarg);
+                break;
+            case 'm':
+                prm.num_timing_runs = atoi(optarg);
+                break;
+            case 'o':
+                prm.noise_file = optarg;
+                break;
+            case 'c':
+                session_cache_size = std::max(1, atoi(optarg));
+                break;
+            case 'K':
+                prm.key_dir = optarg;
                 break;
             case 'p':
-                std::stringstream(optarg) >> namedparamset;
+                std::stringstream(optarg) >> prm.namedparamset;
+                break;
+            case 'B':
+                prm.benchmark = true;
+                break;
+            case 'w':
+                prm.num_warmup_runs = atoi(optarg);
+                break;
+            case 'R':
+                prm.num_btkeygen_runs = atoi(optarg);
+                break;
+            case 'S':
+                server = true;
                 break;
             case 'h':
             default:
@@ -180,29 +1061,8 @@ int main(int argc, char* argv[]) {
         }
     }
 
-    if ((num_of_inputs < 2) || (num_of_inputs > 4))
-        OPENFHE_THROW("num_of_inputs not in [2, 3, 4]");
-
-    BinFHEContextParams paramset;
-    paramset.cyclOrder    = 2 * dim_N;
-    paramset.modKS        = Qks;
-    paramset.gadgetBase   = B_g;
-    paramset.baseKS       = B_ks;
-    paramset.baseRK       = B_rk;
-    paramset.mod          = ctmodq;
-    paramset.numberBits   = logQ;
-    paramset.stdDev       = sigma;
-    paramset.latticeParam = dim_n;
-    paramset.numAutoKeys = numAutoKeys;
-
-    if (secret_dist == 0) {
-        paramset.keyDist = GAUSSIAN;
-    } else if (secret_dist == 1) {
-        paramset.keyDist = UNIFORM_TERNARY;
-    } else {
-        OPENFHE_THROW("invalid secret key distribution");
-    }
-
+    if (server)
+        return run_server(session_cache_size, prm.key_dir);
 
     // ********************
     // STD128 is the security level of 128 bits of security based on LWE Estimator
@@ -212,94 +1072,37 @@ int main(int argc, char* argv[]) {
     // cc.GenerateBinFHEContext(STD128_AP_3, AP);
 
     std::cout << "parameters from commandline dim_n, dim_N, logQ, q, Qks, B_g, B_ks: "
-              << " " << dim_n << " " << dim_N << " " << logQ << " " << ctmodq << " " << Qks << " " << B_g << " " << B_ks
+              << " " << prm.dim_n << " " << prm.dim_N << " " << prm.logQ << " " << prm.ctmodq << " " << prm.Qks << " " << prm.B_g << " " << prm.B_ks
               << std::endl;
 
     std::cout << "parameters from commandline secret_dist, bootstrapping technique: "
-              << secret_dist << " " <<  bootstrapping_technique
+              << prm.secret_dist << " " <<  prm.bootstrapping_technique
               << std::endl;
 
-    BINFHE_METHOD bt;
-    if (bootstrapping_technique == 1) {
-        bt = AP;
-    } else if (bootstrapping_technique == 2) {
-        bt = GINX;
-    } else if (bootstrapping_technique == 3) {
-        bt = LMKCDEY;
-    } else {
-        OPENFHE_THROW("invalid bootstrapping technique");
-    }
-
-    // Sample Program: Step 1: Set CryptoContext
-    auto cc = BinFHEContext();
-    if (!namedparamset.empty()) {
-        std::cout << "parameters from commandline overridden with: " << namedparamset << std::endl;
-        cc.GenerateBinFHEContext(ptable.at(namedparamset), bt);
-    } else {
-        cc.GenerateBinFHEContext(paramset, bt);
-    }
-
-    // Sample Program: Step 2: Key Generation
+    if (!prm.namedparamset.empty())
+        std::cout << "parameters from commandline overridden with: " << prm.namedparamset << std::endl;
 
-    TimeVar t;
-    TIC(t);
-    auto sk = cc.KeyGen();
-    cc.BTKeyGen(sk);
-    std::cout << "BootstrapKeyGenTime: " << TOC_MS(t) << " milliseconds" << std::endl;
-
-    {
-        auto bkey  = cc.GetRefreshKey();
-        std::ostringstream bkeystring;
-        lbcrypto::Serial::Serialize(bkey, bkeystring, lbcrypto::SerType::BINARY);
-        std::cout << "BootstrappingKeySize: " << bkeystring.str().size() << std::endl;
+    bool keys_loaded = false;
+    auto session     = get_session(prm, keys_loaded);
+    if (prm.benchmark) {
+        std::cout << benchmark_to_json(session->keys, benchmark(*session, prm), false, keys_loaded) << std::endl;
+        return 0;
     }
 
-    {
-        auto kskey = cc.GetSwitchKey();
-        std::ostringstream kskeystring;
-        lbcrypto::Serial::Serialize(kskey, kskeystring, lbcrypto::SerType::BINARY);
-        std::cout << "KeySwitchingKeySize: " << kskeystring.str().size() << std::endl;
-    }
-
-
-    // Sample Program: Step 3: Encryption
-
-    auto p   = 2 * num_of_inputs;
-    std::vector<LWECiphertext> cts(num_of_inputs);
-    for (auto&& ct : cts)
-        ct = cc.Encrypt(sk, 0, SMALL_DIM, p);
-
-    {
-        std::ostringstream ctstring;
-        lbcrypto::Serial::Serialize(cts.front(), ctstring, lbcrypto::SerType::BINARY);
-        std::cout << "CiphertextSize: " << ctstring.str().size() << std::endl;
-    }
-
-
-    // Sample Program: Step 4: Evaluation
-
-    const auto eq2  = num_of_inputs == 2;
-    const auto gate = gtable.at(num_of_inputs);
-
-    TIC(t);
-    LWEPlaintext result;
-    auto fcnt = 0;
-    for (uint32_t i = 0; i < num_of_runs; ++i) {
-        for (auto&& ct : cts)
-            ct = cc.Encrypt(sk, 0, SMALL_DIM, p);
-
-        auto ct = eq2 ? cc.EvalBinGate(gate, cts[0], cts[1]) : cc.EvalBinGate(gate, cts);
-
-        cc.Decrypt(sk, ct, &result, p);
-
-        if (result != 0)
-            ++fcnt;
+    auto res = sample_noise(*session, prm, !prm.noise_file.empty());
+    if (!prm.noise_file.empty())
+        write_noise_file(prm.noise_file, res.gates);
 
+    std::cout << "BootstrapKeyGenTime: " << res.keygen_time_ms << " milliseconds" << std::endl;
+    std::cout << "BootstrappingKeySize: " << res.bootstrapping_key_size << std::endl;
+    std::cout << "KeySwitchingKeySize: " << res.key_switching_key_size << std::endl;
+    std::cout << "CiphertextSize: " << res.ciphertext_size << std::endl;
+    for (const auto& gate : res.gates) {
+        std::cout << "EvalBinGateTime: " << gate.gate_time_ms << " milliseconds" << std::endl;
+        std::cout << "Gate: " << gate.name << std::endl;
+        std::cout << "Failures: " << gate.failures << std::endl;
     }
-    std::cout << "EvalBinGateTime: " << (TOC_MS(t)/num_of_runs) << " milliseconds" << std::endl;
-    std::cout << "Gate: " << gate << std::endl;
-    std::cout << "Failures: " << fcnt << std::endl;
-    std::cout << "ctmodq: " << cc.GetParams()->GetLWEParams()->Getq() << std::endl;
+    std::cout << "ctmodq: " << res.ctmodq << std::endl;
 
     return 0;
 }
@@ -0,0 +1,85 @@
+#!/usr/bin/python
+
+'''
+Tests of job_scheduler.py with jobs that measure noise on the pool of sampler processes of their worker process.
+
+The sampler is a stand-in script with the server protocol of boolean_noise_estimate_script that writes zeros as
+noise samples, so the tests need neither OpenFHE nor a build.
+
+usage:
+    > python3 -m unittest discover tests
+'''
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts", "paramsestimator"))
+
+import binfhe_params_helper as helperfncs
+import job_scheduler
+import noise_worker
+
+FAKE_SAMPLER = """#!{python}
+import json
+import numpy
+import sys
+
+for line in sys.stdin:
+    req = json.loads(line)
+    numpy.zeros(req["num_of_samples"], dtype="<f8").tofile(req["noise_file"])
+    print(json.dumps({{"noise_count": req["num_of_samples"]}}), flush=True)
+"""
+
+def measure_noise_job(index):
+    response = helperfncs.get_noise_worker().request({"n": 100 + index, "num_of_samples": 10})
+    return os.getpid(), len(response["noise"])
+
+def scratch_dir_job(index):
+    scratch_dir = job_scheduler.get_scratch_dir()
+    return tempfile.gettempdir(), scratch_dir, os.path.isdir(scratch_dir)
+
+class TestScratchDirs(unittest.TestCase):
+    # every job has its own scratch directory, the temporary directory of the worker process stays as it is
+    def test_scratch_dir_per_job(self):
+        results = job_scheduler.run_jobs([(scratch_dir_job, (i,)) for i in range(4)], 2, raise_errors=True)
+        self.assertEqual({tempdir for tempdir, scratch_dir, exists in results}, {tempfile.gettempdir()})
+        self.assertEqual(len({scratch_dir for tempdir, scratch_dir, exists in results}), 4)
+        self.assertTrue(all(exists for tempdir, scratch_dir, exists in results))
+        self.assertFalse(any(os.path.exists(scratch_dir) for tempdir, scratch_dir, exists in results))
+
+class TestNoiseJobs(unittest.TestCase):
+    def setUp(self):
+        self.build_dir = tempfile.mkdtemp(prefix="fake_build_")
+        os.makedirs(os.path.join(self.build_dir, "bin"))
+        binary = os.path.join(self.build_dir, "bin", noise_worker.BINARY)
+        with open(binary, "w") as f:
+            f.write(FAKE_SAMPLER.format(python=sys.executable))
+        os.chmod(binary, 0o755)
+        helperfncs.configure_noise_worker(build_dir=self.build_dir)
+        # the worker processes inherit the directory for the noise files
+        self.temp_dir, noise_worker.TEMP_DIR = noise_worker.TEMP_DIR, os.path.join(self.build_dir, "tmp")
+        os.makedirs(noise_worker.TEMP_DIR)
+
+    def tearDown(self):
+        helperfncs.configure_noise_worker()
+        noise_worker.TEMP_DIR = self.temp_dir
+        shutil.rmtree(self.build_dir, ignore_errors=True)
+
+    # the sampler pool of a worker process outlives the scratch directory of the job that started it
+    def test_several_noise_jobs_per_worker(self):
+        jobs = [(measure_noise_job, (i,)) for i in range(6)]
+        results = job_scheduler.run_jobs(jobs, 2, raise_errors=True)
+        self.assertEqual([count for pid, count in results], [10]*len(jobs))
+        pids = [pid for pid, count in results]
+        self.assertTrue(any(pids.count(pid) >= 2 for pid in pids))
+
+    # worker processes exit without running atexit, their sampler pools are closed all the same
+    def test_workers_remove_noise_files(self):
+        job_scheduler.run_jobs([(measure_noise_job, (i,)) for i in range(4)], 2, raise_errors=True)
+        self.assertEqual(os.listdir(noise_worker.TEMP_DIR), [])
+
+if __name__ == '__main__':
+    unittest.main()
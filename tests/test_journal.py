@@ -0,0 +1,47 @@
+#!/usr/bin/python
+
+'''
+Tests of journal.py: resuming replays the recorded jobs and probes, an existing journal is never overwritten by accident.
+
+usage:
+    > python3 -m unittest discover tests
+'''
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts", "paramsestimator"))
+
+import journal
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="journal_")
+        self.path = os.path.join(self.dir, "journal.jsonl")
+        j = journal.Journal(self.path)
+        j.record_job("search_d_g[2]", "output\n")
+        j.record_probe({"n": 500}, 10.5, 9.8, None)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_resume(self):
+        j = journal.Journal(self.path, resume=True)
+        self.assertEqual(j.finished_job("search_d_g[2]"), "output\n")
+        self.assertEqual(j.lookup_probe({"n": 500}, 10.5), (9.8, None))
+        self.assertIsNone(j.lookup_probe({"n": 501}, 10.5))
+
+    def test_existing_journal_is_kept(self):
+        with self.assertRaises(FileExistsError):
+            journal.Journal(self.path)
+        self.assertEqual(journal.Journal(self.path, resume=True).finished_job("search_d_g[2]"), "output\n")
+
+    def test_overwrite(self):
+        journal.Journal(self.path, overwrite=True)
+        self.assertEqual(os.path.getsize(self.path), 0)
+
+if __name__ == '__main__':
+    unittest.main()